@@ -0,0 +1,111 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    key       TEXT PRIMARY KEY,
+    agent     TEXT NOT NULL,
+    reply     TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replies_last_used ON replies(last_used);
+"""
+
+
+def cache_key(agent_name, system_message, messages, model, temperature):
+    sys_hash = hashlib.sha256((system_message or "").encode("utf-8")).hexdigest()
+    payload = json.dumps(
+        [agent_name, sys_hash, messages, model, temperature],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# 以內容雜湊為 key 的 LLM 回覆快取（SQLite），超過 max_entries 依 LRU 淘汰
+class LLMCache:
+    def __init__(self, path, max_entries=10000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # 多個分片行程可能共用同一個快取檔
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def get(self, key, agent):
+        with self._lock:
+            row = self._db.execute("SELECT reply FROM replies WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses[agent] += 1
+                return None
+            self._db.execute("UPDATE replies SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits[agent] += 1
+            return json.loads(row[0])
+
+    def put(self, key, agent, reply):
+        blob = json.dumps(reply, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO replies (key, agent, reply, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, agent, blob, len(blob), time.time()),
+            )
+            (count,) = self._db.execute("SELECT COUNT(*) FROM replies").fetchone()
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._db.execute(
+                    "DELETE FROM replies WHERE key IN "
+                    "(SELECT key FROM replies ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._db.commit()
+
+    def report(self):
+        lines = ["[LLM cache]"]
+        for agent in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits[agent], self.misses[agent]
+            rate = hits / (hits + misses) if hits + misses else 0.0
+            lines.append(f"  {agent}: hit={hits} miss={misses} hit_rate={rate:.1%}")
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM replies").fetchone()
+        lines.append(f"  entries={count}/{self.max_entries} bytes={size} evicted={self.evictions}")
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# 包裝 AssistantAgent：generate_reply(messages=...) 先查快取，未命中才呼叫 LLM
+class CachedAgent:
+    def __init__(self, agent, cache, llm_config):
+        self._agent = agent
+        self._cache = cache
+        self._model = llm_config.get("model")
+        self._temperature = llm_config.get("temperature")
+
+    def __getattr__(self, name):
+        return getattr(self._agent, name)
+
+    def generate_reply(self, messages=None, **kwargs):
+        if messages is None or kwargs:
+            return self._agent.generate_reply(messages=messages, **kwargs)
+        key = cache_key(self._agent.name, self._agent.system_message, messages,
+                        self._model, self._temperature)
+        reply = self._cache.get(key, self._agent.name)
+        if reply is not None:
+            return reply
+        reply = self._agent.generate_reply(messages=messages)
+        if reply is not None:
+            self._cache.put(key, self._agent.name, reply)
+        return reply
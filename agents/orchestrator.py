@@ -3,15 +3,25 @@ from .statute_parser import make_statute_parser
 from .case_mapper import make_case_mapper
 from .smt_encoder import make_smt_encoder
 from .solver import build_solver
+from .cache import CachedAgent
+from .stub import make_stub_team
 
-def build_team(llm_config):
-    return {
-        "parser": make_statute_parser(llm_config),
-        "mapper": make_case_mapper(llm_config),
-        "solver": build_solver(llm_config),
-        "orchestrator": AssistantAgent(
-            name="Orchestrator",
-            system_message="你是總控：依序呼叫 StatuteParser 與 CaseMapper，最後交給 solver。",
-            llm_config=llm_config,
-        )
-    }
+def build_team(llm_config, cache=None, backend="openai", stub_config=None):
+    if backend in ("stub", "replay"):
+        team = make_stub_team(backend, **(stub_config or {}))
+        # 快取 key 帶上 backend，避免離線回覆混進真實 LLM 的快取
+        llm_config = dict(llm_config, model=f"{backend}:{llm_config.get('model')}")
+    else:
+        team = {
+            "parser": make_statute_parser(llm_config),
+            "mapper": make_case_mapper(llm_config),
+            "solver": build_solver(llm_config),
+            "orchestrator": AssistantAgent(
+                name="Orchestrator",
+                system_message="你是總控：依序呼叫 StatuteParser 與 CaseMapper，最後交給 solver。",
+                llm_config=llm_config,
+            )
+        }
+    if cache is not None:
+        team = {role: CachedAgent(agent, cache, llm_config) for role, agent in team.items()}
+    return team
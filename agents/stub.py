@@ -0,0 +1,166 @@
+import re
+import json
+import time
+import random
+import hashlib
+from pathlib import Path
+from .statute_parser import PARSER_SYS_PROMPT
+from .case_mapper import MAPPER_SYS_PROMPT
+from .solver import GENERATE_Z3CODE_PROMPT
+
+# 離線 LLM 後端：replay 重播 outputs/ 下錄到的對話，stub 依提示內容產生固定格式的合成回覆。
+# 兩者都提供與 AssistantAgent 相同的 generate_reply(messages=...) 介面，並可設定延遲，
+# 用於在無網路環境下量測 pipeline 自身的開銷。
+
+STUB_CONSTRAINTS = [
+    {
+        "id": "insurance:capital_adequate_ok",
+        "desc": "CAR≥200 且 近二期NWR至少一期≥3%",
+        "expr": ["AND", ["GE", "CAR", 200.0], ["OR", ["GE", "NWR", 3.0], ["GE", "NWR_prev", 3.0]]],
+        "weight": 1,
+        "domain": "insurance",
+    },
+    {
+        "id": "insurance:plan_complete_ok",
+        "desc": "改善計畫具體完整（布林原子）",
+        "expr": ["VAR", "plan_complete"],
+        "weight": 1,
+        "domain": "insurance",
+    },
+    {
+        "id": "insurance:article_143_6_ok",
+        "desc": "§143-6 遵循 = NOT( 未達資本適足 AND 計畫未完備 )",
+        "expr": ["NOT", ["AND", ["NOT", ["VAR", "insurance:capital_adequate_ok"]],
+                         ["NOT", ["VAR", "insurance:plan_complete_ok"]]]],
+        "weight": 1,
+        "domain": "insurance",
+    },
+    {
+        "id": "meta:penalty_default_false",
+        "desc": "預設不處罰",
+        "expr": ["EQ", "penalty", False],
+        "weight": 0,
+        "domain": "meta",
+    },
+    {
+        "id": "meta:no_penalty_if_all_pass",
+        "desc": "若所有 constraint 成立則 penalty 為 false",
+        "expr": ["EQ", "penalty", ["NOT", ["OR",
+                 ["NOT", ["VAR", "insurance:capital_adequate_ok"]],
+                 ["NOT", ["VAR", "insurance:article_143_6_ok"]]]]],
+        "weight": 0,
+        "domain": "meta",
+    },
+]
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def estimate_tokens(text):
+    # 中英混合文字的粗估：約 2 字元 1 token
+    return max(1, len(text) // 2)
+
+def synthetic_constraints(messages):
+    return json.dumps(STUB_CONSTRAINTS, ensure_ascii=False)
+
+def synthetic_mapping(messages):
+    prompt = messages[-1]["content"]
+    m = re.search(r"【需用到的變數】\n(.*?)\n", prompt)
+    names = [n.strip() for n in m.group(1).split(",") if n.strip()] if m else []
+    varspecs, facts = [], {}
+    for name in names:
+        if name == "penalty":
+            continue
+        # 以案例文字 + 變數名稱的雜湊決定值，同一案例每次都得到相同 facts
+        h = int(_digest(prompt + name)[:8], 16)
+        varspecs.append({"name": name, "type": "Real", "source": "default"})
+        facts[name] = round((h % 40000) / 100.0, 2)
+    varspecs.append({"name": "penalty", "type": "Bool", "source": "default"})
+    facts["penalty"] = False
+    return json.dumps({"varspecs": varspecs, "facts": facts}, ensure_ascii=False)
+
+def synthetic_z3_code(messages):
+    from generate_z3_code_from_constraints import generate_z3_solver_code
+    prompt = messages[-1]["content"]
+    m = re.search(r"constraint_spec\.json：\n(.*?)\n\n\n2\. varspec_facts\.json：\n(.*?)\n\n\n", prompt, re.S)
+    try:
+        return generate_z3_solver_code(json.loads(m.group(1)), json.loads(m.group(2)))
+    except (AttributeError, ValueError, KeyError):
+        return "from z3 import *\nprint('Result:', 'unknown')"
+
+SYNTHETIC = {
+    "StatuteParser": synthetic_constraints,
+    "CaseMapper": synthetic_mapping,
+    "solver": synthetic_z3_code,
+    "Orchestrator": lambda messages: "",
+}
+
+def parse_dialog_log(text):
+    # outputs/case_*.{parser,mapper}_log.txt："ROLE: content" 以空行串接
+    parts = re.split(r"(?:^|\n\n)(USER|ASSISTANT): ", text)
+    return [{"role": role.lower(), "content": content} for role, content in zip(parts[1::2], parts[2::2])]
+
+def load_recordings(root):
+    # 最後一則 user 訊息的雜湊 → 錄到的 assistant 回覆
+    recordings = {}
+    root = Path(root)
+    dialogs = [parse_dialog_log(p.read_text(encoding="utf-8")) for p in root.glob("*_log.txt")]
+    for p in root.glob("statute_*.parse.json"):
+        dialogs.append(json.loads(p.read_text(encoding="utf-8"))["parser_messages"])
+    for messages in dialogs:
+        for prev, msg in zip(messages, messages[1:]):
+            if prev["role"] == "user" and msg["role"] == "assistant":
+                recordings[_digest(prev["content"])] = msg["content"]
+    return recordings
+
+class StubAgent:
+    def __init__(self, name, system_message, backend="stub", recordings=None, latency=0.0, jitter=0.0):
+        self.name = name
+        self.system_message = system_message
+        self.backend = backend
+        self.recordings = recordings or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.replayed = 0
+        self.synthesized = 0
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+    def generate_reply(self, messages=None, **kwargs):
+        messages = messages or []
+        delay = self.latency + random.uniform(0, self.jitter) if self.jitter else self.latency
+        if delay:
+            time.sleep(delay)
+        key = _digest(messages[-1]["content"]) if messages else None
+        if self.backend == "replay" and key in self.recordings:
+            self.replayed += 1
+            reply = self.recordings[key]
+        else:
+            self.synthesized += 1
+            reply = SYNTHETIC[self.name](messages)
+        self.usage["prompt_tokens"] += sum(estimate_tokens(m["content"]) for m in messages) \
+            + estimate_tokens(self.system_message)
+        self.usage["completion_tokens"] += estimate_tokens(reply)
+        return {"content": reply, "role": "assistant"}
+
+    def get_actual_usage(self):
+        total = self.usage["prompt_tokens"] + self.usage["completion_tokens"]
+        return {"total_cost": 0.0, self.backend: {"cost": 0.0, "total_tokens": total, **self.usage}}
+
+_RECORDINGS = {}
+
+def make_stub_team(backend="stub", replay_dir="outputs", latency=0.0, jitter=0.0):
+    recordings = {}
+    if backend == "replay":
+        if replay_dir not in _RECORDINGS:
+            _RECORDINGS[replay_dir] = load_recordings(replay_dir)
+        recordings = _RECORDINGS[replay_dir]
+    agents = [
+        ("parser", "StatuteParser", PARSER_SYS_PROMPT),
+        ("mapper", "CaseMapper", MAPPER_SYS_PROMPT),
+        ("solver", "solver", GENERATE_Z3CODE_PROMPT),
+        ("orchestrator", "Orchestrator", "你是總控：依序呼叫 StatuteParser 與 CaseMapper，最後交給 solver。"),
+    ]
+    return {
+        role: StubAgent(name, system_message, backend, recordings, latency, jitter)
+        for role, name, system_message in agents
+    }
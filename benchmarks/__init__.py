@@ -0,0 +1,12 @@
+import subprocess
+from pathlib import Path
+
+def git_commit():
+    # 報告附上目前的 commit，方便比對前後版本
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,87 @@
+import sys
+import json
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import LLM_BACKEND, stub_config
+from core.metrics import summarize
+from benchmarks import git_commit
+import main as pipeline
+
+# 端到端基準：以固定樣本跑完整 pipeline（解析 → 對應 → 求解 → 寫檔），
+# 輸出各階段耗時分位數、token 用量與吞吐量（JSON），供前後版本比較。
+# 建議搭配 LLM_BACKEND=stub / replay，量測的就是 pipeline 自身的開銷。
+
+def run_benchmark(argv):
+    args = pipeline.parse_args(argv)
+    parse_metrics = {}
+    case_metrics = []
+    status = {}
+    t0 = time.perf_counter()
+    for _, _, _, _, result, metrics in pipeline.run_pipeline(args, parse_metrics=parse_metrics):
+        case_metrics.append(metrics)
+        if result is not None:
+            status[result["status"]] = status.get(result["status"], 0) + 1
+    wall = time.perf_counter() - t0
+
+    stages = summarize(list(parse_metrics.values()) + case_metrics)
+    return {
+        "commit": git_commit(),
+        "config": {
+            "backend": LLM_BACKEND,
+            "stub_latency": stub_config["latency"] if LLM_BACKEND in ("stub", "replay") else None,
+            "data": str(args.data),
+            "start": args.start,
+            "limit": args.limit,
+            "workers": args.workers,
+            "llm_codegen": args.llm_codegen,
+            "cache": not args.no_cache,
+            "rule_cache": not args.no_rule_cache,
+        },
+        "cases": len(case_metrics),
+        "statutes": len(parse_metrics),
+        "status": status,
+        "wall_time": wall,
+        "cases_per_minute": 60.0 * len(case_metrics) / wall if wall > 0 else None,
+        "stages": stages,
+        "tokens": {
+            "prompt": sum(s["prompt_tokens"] for s in stages.values()),
+            "completion": sum(s["completion_tokens"] for s in stages.values()),
+        },
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="端到端基準（其餘參數原樣傳給 main.py，如 --data、--workers、--llm-codegen）")
+    ap.add_argument("--limit", type=int, default=20, help="固定樣本：處理幾列")
+    ap.add_argument("--start", type=int, default=0)
+    ap.add_argument("--output", type=Path, default=None, help="JSON 報告路徑（預設印到 stdout）")
+    ap.add_argument("--keep-cache", action="store_true",
+                    help="沿用 LLM / 規則庫快取（預設停用，量測冷啟動）")
+    args, passthrough = ap.parse_known_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as out:
+        # 每次都寫到暫存目錄並忽略 manifest，避免 resume 讓各階段被跳過
+        argv = ["--start", str(args.start), "--limit", str(args.limit),
+                "--out", out, "--no-resume", *passthrough]
+        if not args.keep_cache:
+            argv += ["--no-cache", "--no-rule-cache"]
+        # pipeline 本身的進度輸出導到 stderr，stdout 只留 JSON 報告
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            report = run_benchmark(argv)
+        finally:
+            sys.stdout = stdout
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import statistics
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import z3
+from z3 import Optimize, Solver, unsat
+from core.dsl import RuleBase, RULE_LABEL, FACT_LABEL
+from core.vectorize import VectorRules
+from generate_z3_code_from_constraints import generate_z3_solver_code
+from benchmarks import git_commit
+
+# Z3 微基準：合成規模（規則數）與深度（AND/OR、巢狀 CASE）遞增的 ConstraintSpec[]，
+# 分別經 generate_z3_solver_code（產生程式碼 + exec）與 core/dsl（直接建構 AST）編譯，
+# 量測編譯、求解（Optimize + soft facts 與 plain Solver 對照）、記憶體與 unsat core 擷取時間；
+# vector 為 core/vectorize 不經 Z3 直接求值（單一案例與 --rows 列的整批）。
+
+def _leaf(rng, n_vars):
+    a = f"x{rng.randrange(n_vars)}"
+    if rng.random() < 0.5:
+        return ["GE", a, round(rng.uniform(0, 100), 2)]
+    # 比率：a / (b + 1) ≤ k
+    b = f"x{rng.randrange(n_vars)}"
+    return ["LE", ["DIV", a, ["ADD", b, 1.0]], round(rng.uniform(0.5, 2.0), 2)]
+
+def _cond(rng, n_vars, depth):
+    if depth <= 1:
+        return _leaf(rng, n_vars)
+    return [rng.choice(["AND", "OR"]), _cond(rng, n_vars, depth - 1), _cond(rng, n_vars, depth - 1)]
+
+def _case(rng, n_vars, depth):
+    # 巢狀 CASE：內層 CASE 的值出現在外層 CASE 的條件裡
+    if depth <= 1:
+        return ["CASE", _leaf(rng, n_vars), 2.0, _leaf(rng, n_vars), 1.0, 0.0]
+    inner = ["ADD", _case(rng, n_vars, depth - 1), f"x{rng.randrange(n_vars)}"]
+    return ["CASE", ["GE", inner, round(rng.uniform(0, 100), 2)], 2.0, _leaf(rng, n_vars), 1.0, 0.0]
+
+def synth_spec(n_rules, depth, facts_per_rule=2, violations=0, seed=0):
+    # 回傳 (constraints, varspec_facts)；violations > 0 時讓前幾個 fact 違反 guard，產生 unsat 案例
+    rng = random.Random(seed * 1000003 + n_rules * 101 + depth)
+    n_vars = max(1, n_rules * facts_per_rule)
+    constraints = []
+    for i in range(n_rules):
+        if i % 3 == 2:
+            expr = ["GE", _case(rng, n_vars, depth), 1.0]
+        else:
+            expr = _cond(rng, n_vars, depth)
+        constraints.append({"id": f"bench:rule_{i}", "desc": "", "expr": expr, "weight": 1, "domain": "bench"})
+    for j in range(n_vars):
+        constraints.append({"id": f"bench:guard_{j}", "desc": "", "expr": ["GE", f"x{j}", 0.0],
+                            "weight": 1, "domain": "bench"})
+    constraints.append({
+        "id": "bench:penalty", "desc": "", "weight": 0, "domain": "meta",
+        "expr": ["EQ", "penalty", ["NOT", ["AND", *[["VAR", f"bench:rule_{i}"] for i in range(n_rules)]]]],
+    })
+    varspecs = [{"name": f"x{j}", "type": "Real", "source": "default"} for j in range(n_vars)]
+    varspecs.append({"name": "penalty", "type": "Bool", "source": "default"})
+    facts = {f"x{j}": (-1.0 if j < violations else round(rng.uniform(0, 100), 2)) for j in range(n_vars)}
+    facts["penalty"] = False
+    return constraints, {"varspecs": varspecs, "facts": facts}
+
+def _z3_memory(s):
+    st = s.statistics()
+    return st.get_key_value("max memory") if "max memory" in st.keys() else None
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - t0
+
+### === DSL：直接建構 Z3 AST ===
+def bench_dsl(constraints, varspec_facts, unsat_facts):
+    out = {}
+    tracemalloc.start()
+    def build():
+        rb = RuleBase(constraints, varspec_facts["varspecs"])
+        s = Optimize()
+        for name, value in varspec_facts["facts"].items():
+            s.add_soft(rb.fact(name, value))
+        for cid, term in rb.assertions:
+            s.assert_and_track(term, RULE_LABEL + cid)
+        return rb, s
+    (rb, s), out["compile_time"] = _timed(build)
+    out["py_peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    result, out["check_time"] = _timed(s.check)
+    out["status"] = str(result)
+    out["z3_max_memory_mb"] = _z3_memory(s)
+
+    # 對照：facts 直接 assert 的 plain Solver
+    plain = Solver()
+    for cid, term in rb.assertions:
+        plain.add(term)
+    for name, value in varspec_facts["facts"].items():
+        plain.add(rb.fact(name, value))
+    _, out["plain_check_time"] = _timed(plain.check)
+
+    # unsat core：規則與 facts 皆以標籤追蹤
+    core = Solver()
+    for cid, term in rb.assertions:
+        core.assert_and_track(term, RULE_LABEL + cid)
+    for name, value in unsat_facts.items():
+        core.assert_and_track(rb.fact(name, value), FACT_LABEL + name)
+    def extract():
+        return core.unsat_core() if core.check() == unsat else []
+    labels, out["core_time"] = _timed(extract)
+    out["core_size"] = len(labels)
+    return out
+
+### === Codegen：generate_z3_solver_code 產生的程式碼 ===
+SOFT_FACT = re.compile(r"^s\.add_soft\((\w+) == (.*)\)$", re.M)
+
+def _exec(code):
+    ns = {}
+    exec(compile(code, "<z3_bench>", "exec"), ns)
+    return ns["s"]
+
+def bench_codegen(constraints, varspec_facts, unsat_facts):
+    out = {}
+    # 產生的程式把被 VAR 引用的 constraint id 宣告為變數，預設 Real；補上 Bool 型別才能編譯
+    extra = [{"name": c["id"], "type": "Bool", "source": "default"}
+             for c in constraints if c["id"].startswith("bench:rule_")]
+    spec = {"varspecs": varspec_facts["varspecs"] + extra, "facts": varspec_facts["facts"]}
+    tracemalloc.start()
+    def build():
+        code = generate_z3_solver_code(constraints, spec)
+        return _exec(code.split("\n# === Solve ===")[0])
+    s, out["compile_time"] = _timed(build)
+    out["py_peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    result, out["check_time"] = _timed(s.check)
+    out["status"] = str(result)
+    out["z3_max_memory_mb"] = _z3_memory(s)
+
+    code = generate_z3_solver_code(constraints, {"varspecs": spec["varspecs"], "facts": unsat_facts})
+    code = code.split("\n# === Solve ===")[0].replace("s = Optimize()", "s = Solver()")
+    code = SOFT_FACT.sub(lambda m: f's.assert_and_track({m.group(1)} == {m.group(2)}, "{FACT_LABEL}{m.group(1)}")', code)
+    core = _exec(code)
+    def extract():
+        return core.unsat_core() if core.check() == unsat else []
+    labels, out["core_time"] = _timed(extract)
+    out["core_size"] = len(labels)
+    return out
+
+### === Vector：facts 齊全時以 NumPy 直接求值 ===
+def bench_vector(constraints, varspec_facts, unsat_facts, rows=1000):
+    out = {}
+    vector, out["compile_time"] = _timed(lambda: VectorRules(constraints, varspec_facts["varspecs"]))
+    result, out["check_time"] = _timed(lambda: vector.evaluate_cases([varspec_facts])[0])
+    out["status"] = "z3" if result is None else result["status"]
+    table = {name: [value] * rows for name, value in varspec_facts["facts"].items()}
+    _, out["batch_time"] = _timed(lambda: vector.evaluate(table))
+    out["batch_rows"] = rows
+    out["row_us"] = out["batch_time"] / rows * 1e6
+    return out
+
+BACKENDS = {"dsl": bench_dsl, "codegen": bench_codegen, "vector": bench_vector}
+TIMING_KEYS = ("compile_time", "check_time", "plain_check_time", "core_time", "batch_time")
+
+def run_config(backend, n_rules, depth, facts_per_rule, violations, repeat, seed):
+    constraints, varspec_facts = synth_spec(n_rules, depth, facts_per_rule, seed=seed)
+    _, unsat_spec = synth_spec(n_rules, depth, facts_per_rule, violations=violations, seed=seed)
+    row = {"backend": backend, "rules": n_rules, "depth": depth,
+           "facts": len(varspec_facts["facts"]), "constraints": len(constraints)}
+    runs = []
+    for _ in range(repeat):
+        try:
+            runs.append(BACKENDS[backend](constraints, varspec_facts, unsat_spec["facts"]))
+        except (ValueError, KeyError, SyntaxError, NameError, z3.Z3Exception) as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+            return row
+    # 時間取各次的中位數，其餘取最後一次
+    row.update(runs[-1])
+    for key in TIMING_KEYS:
+        if key in runs[-1]:
+            row[key] = statistics.median(r[key] for r in runs)
+    return row
+
+def parse_ints(spec):
+    return [int(x) for x in spec.split(",")]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Z3 規則庫微基準（JSON 報告）")
+    ap.add_argument("--sizes", type=parse_ints, default=[10, 50, 100], help="規則數，逗號分隔")
+    ap.add_argument("--depths", type=parse_ints, default=[1, 2, 3], help="AND/OR 與 CASE 巢狀深度")
+    ap.add_argument("--facts-per-rule", type=int, default=2, help="每條規則對應的 soft fact 數")
+    ap.add_argument("--violations", type=int, default=3, help="unsat 案例中違反 guard 的 fact 數")
+    ap.add_argument("--backends", default="dsl,codegen", help="dsl、codegen、vector，逗號分隔")
+    ap.add_argument("--rows", type=int, default=1000, help="vector 整批求值的列數")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=int, default=60000, help="每次 check 的上限（毫秒），逾時回報 unknown")
+    ap.add_argument("--output", type=Path, default=None, help="JSON 報告路徑（預設印到 stdout）")
+    args = ap.parse_args(argv)
+    z3.set_param("timeout", args.timeout)
+    BACKENDS["vector"] = partial(bench_vector, rows=args.rows)
+
+    results = []
+    for n_rules in args.sizes:
+        for depth in args.depths:
+            for backend in args.backends.split(","):
+                row = run_config(backend, n_rules, depth, args.facts_per_rule,
+                                 args.violations, args.repeat, args.seed)
+                print(f"[z3_bench] {backend} rules={n_rules} depth={depth} "
+                      f"compile={row.get('compile_time', 0):.4f}s check={row.get('check_time', 0):.4f}s "
+                      f"core={row.get('core_time', 0):.4f}s {row.get('error', '')}", file=sys.stderr)
+                results.append(row)
+
+    report = {
+        "commit": git_commit(),
+        "z3_version": z3.get_version_string(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,49 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# LLM 後端：openai（預設）、replay（重播 STUB_REPLAY_DIR 錄到的對話）、stub（合成回覆）
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
 llm_config = {
     "model": OPENAI_MODEL,
     "api_key": OPENAI_API_KEY,
     "base_url": OPENAI_BASE_URL,
     "temperature": 0.2,
 }
+
+# replay / stub 後端設定；latency 為每次呼叫的固定延遲（秒），jitter 為額外的隨機延遲上限
+stub_config = {
+    "replay_dir": os.getenv("STUB_REPLAY_DIR", "outputs"),
+    "latency": float(os.getenv("STUB_LATENCY", "0")),
+    "jitter": float(os.getenv("STUB_JITTER", "0")),
+}
+
+# LLM 回覆快取（agents/cache.py）；LLM_CACHE_PATH 設為空字串即停用
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+# 已編譯規則庫快取（core/rulecache.py）；RULEBASE_CACHE_DIR 設為空字串即停用
+RULEBASE_CACHE_DIR = os.getenv("RULEBASE_CACHE_DIR", ".cache/rulebases")
+RULEBASE_CACHE_MAX_ENTRIES = int(os.getenv("RULEBASE_CACHE_MAX_ENTRIES", "512"))
+
+# 行程內求解模式（core/solve.py）：auto（先 Solver 快速路徑，衝突才 Optimize）或 optimize
+SOLVE_MODE = os.getenv("SOLVE_MODE", "auto")
+
+# 行程池求解（core/executor.py，--solve-workers）：SOLVE_TIMEOUT 為每次 Z3 check() 的秒數上限
+# （行程內求解也適用，逾時回傳 unknown），子行程另有 wall-clock 與 SOLVE_MEMORY_MB 位址空間上限；
+# SOLVE_RLIMIT 為 Z3 的 deterministic 資源上限，0 為不限
+SOLVE_WORKERS = int(os.getenv("SOLVE_WORKERS", "0"))
+SOLVE_TIMEOUT = float(os.getenv("SOLVE_TIMEOUT", "30"))
+SOLVE_MEMORY_MB = int(os.getenv("SOLVE_MEMORY_MB", "2048"))
+SOLVE_RLIMIT = int(os.getenv("SOLVE_RLIMIT", "0"))
+
+# 向量化求值（core/vectorize.py）：每對應完 VECTOR_CHUNK 個案例，同一規則庫的案例整批以 NumPy 求值一次；
+# 越大每次 NumPy 呼叫攤提越多，但案例結果要等整批對應完才開始輸出
+VECTOR_CHUNK = int(os.getenv("VECTOR_CHUNK", "256"))
+
+# 違規診斷（core/diagnose.py，--diagnose）每個案例的時間預算（秒）
+DIAGNOSE_BUDGET = float(os.getenv("DIAGNOSE_BUDGET", "5"))
+
+# ConstraintSpec / varspec_facts 靜態檢查（core/validate.py）未通過時，附上錯誤重新請 LLM 修正的次數；
+# 用盡仍有錯誤的案例不求解，結果記為 error
+SPEC_RETRIES = int(os.getenv("SPEC_RETRIES", "1"))
@@ -0,0 +1,402 @@
+import json
+import math
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from .dsl import derived_defs
+from .rulecache import rulebase_key
+from .validate import Checker, format_errors
+
+# 規則與 penalty 的布林結構編成 ROBDD：每個算術比較（CAR ≥ 200、NWR ≥ 3 …）與布林原始變數
+# 抽象成一個述詞原子，被 VAR 引用的布林 constraint 直接展開。新案例只要以精確分數算出各原子的
+# 真假，再沿 BDD 走一條路徑即得每條規則與 penalty 的值，不需要求解器。
+# 原子依第一次出現的順序排序；同一組規則（rulebase_key）編好的 BDD 以 BDDCache 共用。
+# flips() 回答「改變哪一個原子（及其變數）會讓結果翻轉」：每個原子只需再走一次路徑。
+# 求得的是規則在 facts 下的真值，不含 Z3 放寬 facts 的語意（見 core/solve）。
+
+FALSE, TRUE = 0, 1
+CMP = {"GE": ">=", "LE": "<=", "GT": ">", "LT": "<", "EQ": "=="}
+
+class BDD:
+    # 節點 0 / 1 為終端；其餘為 (原子 index, low, high)，low 為原子為假的分支
+    def __init__(self, max_nodes=200000):
+        self.nodes = [None, None]
+        self.unique = {}
+        self.memo = {}
+        self.max_nodes = max_nodes
+
+    def node(self, var, lo, hi):
+        if lo == hi:
+            return lo
+        key = (var, lo, hi)
+        nid = self.unique.get(key)
+        if nid is None:
+            if len(self.nodes) >= self.max_nodes:
+                raise ValueError(f"BDD exceeds {self.max_nodes} nodes")
+            nid = self.unique[key] = len(self.nodes)
+            self.nodes.append(key)
+        return nid
+
+    def var(self, i):
+        return self.node(i, FALSE, TRUE)
+
+    def _top(self, f):
+        return self.nodes[f][0] if f > TRUE else math.inf
+
+    def _cofactors(self, f, var):
+        if f > TRUE and self.nodes[f][0] == var:
+            return self.nodes[f][1], self.nodes[f][2]
+        return f, f
+
+    def ite(self, f, g, h):
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+        key = (f, g, h)
+        if key not in self.memo:
+            var = min(self._top(f), self._top(g), self._top(h))
+            f0, f1 = self._cofactors(f, var)
+            g0, g1 = self._cofactors(g, var)
+            h0, h1 = self._cofactors(h, var)
+            self.memo[key] = self.node(var, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+        return self.memo[key]
+
+    def neg(self, f):
+        return self.ite(f, FALSE, TRUE)
+
+    def conj(self, f, g):
+        return self.ite(f, g, FALSE)
+
+    def disj(self, f, g):
+        return self.ite(f, TRUE, g)
+
+    def iff(self, f, g):
+        return self.ite(f, g, self.neg(g))
+
+    def eval(self, f, values):
+        # 三值求值：原子值為 None 時兩個分支都走，結果相同才確定
+        while f > TRUE:
+            var, lo, hi = self.nodes[f]
+            v = values[var]
+            if v is None:
+                a, b = self.eval(lo, values), self.eval(hi, values)
+                return a if a == b else None
+            f = hi if v else lo
+        return f == TRUE
+
+    def support(self, f):
+        seen, stack, atoms = set(), [f], set()
+        while stack:
+            g = stack.pop()
+            if g > TRUE and g not in seen:
+                seen.add(g)
+                var, lo, hi = self.nodes[g]
+                atoms.add(var)
+                stack += [lo, hi]
+        return sorted(atoms)
+
+    def size(self, f):
+        seen, stack = set(), [f]
+        while stack:
+            g = stack.pop()
+            if g > TRUE and g not in seen:
+                seen.add(g)
+                stack += self.nodes[g][1:]
+        return len(seen)
+
+def _frac(x):
+    # NaN / ±inf 沒有對應的有理數 → None（同缺值）
+    if isinstance(x, bool):
+        return Fraction(int(x))
+    if isinstance(x, float):
+        return Fraction(repr(x)) if math.isfinite(x) else None
+    return Fraction(x)
+
+def _key(expr):
+    return json.dumps(expr, ensure_ascii=False, sort_keys=True)
+
+def atom_text(expr):
+    if isinstance(expr, str):
+        return expr
+    if isinstance(expr, list) and len(expr) == 3 and expr[0] in CMP:
+        side = [a if not isinstance(a, list) else _key(a) for a in expr[1:]]
+        return f"{side[0]} {CMP[expr[0]]} {side[1]}"
+    return _key(expr)
+
+def _names(expr, out):
+    if isinstance(expr, str):
+        out.append(expr)
+    elif isinstance(expr, list) and expr:
+        for e in expr[1:]:
+            _names(e, out)
+    return out
+
+class RuleBDD:
+    def __init__(self, constraints, varspecs=(), max_nodes=200000):
+        self.constraints = [c if isinstance(c, dict) else c.model_dump() for c in constraints]
+        varspecs = [v if isinstance(v, dict) else v.model_dump() for v in varspecs]
+        self.defs = {c["id"]: c["expr"] for c in self.constraints}
+        self.checker = Checker(self.constraints, {"varspecs": varspecs, "facts": {}})
+        self.sorts = {cid: self.checker.constraint_sort(cid) for cid in self.defs}
+        self.bdd = BDD(max_nodes)
+        self.atoms = []
+        self.atom_index = {}
+        self.funcs = {}
+        self.error = format_errors(self.checker.errors) if self.checker.errors else None
+        # 結論型變數與 core/solve、core/vectorize 相同（core/dsl.derived_defs）；右側為字面值者仍以 fact 為準
+        self.derived = {name: expr for name, expr in derived_defs(self.constraints).items() if isinstance(expr, list)}
+        if self.error is None:
+            try:
+                self._build()
+            except (ValueError, RecursionError) as e:
+                self.error = str(e)
+
+    def _build(self):
+        self._compiling = set()
+        for cid, sort in self.sorts.items():
+            if sort == "Bool":
+                self.function(cid)
+        for name, expr in self.derived.items():
+            if self.checker.name_sort(name, "Real") == "Bool":
+                self.function(name)
+
+    def function(self, name):
+        if name not in self.funcs:
+            if name in self._compiling:
+                raise ValueError(f"Cyclic definition: {name}")
+            self._compiling.add(name)
+            try:
+                expr = self.defs[name] if name in self.defs else self.derived[name]
+                self.funcs[name] = self.compile(expr)
+            finally:
+                self._compiling.discard(name)
+        return self.funcs[name]
+
+    def atom(self, expr):
+        k = _key(expr)
+        if k not in self.atom_index:
+            self.atom_index[k] = len(self.atoms)
+            self.atoms.append(expr)
+        return self.bdd.var(self.atom_index[k])
+
+    def _sort(self, expr):
+        n = len(self.checker.errors)
+        sort = self.checker.expr(expr, "", ())
+        del self.checker.errors[n:]
+        return sort
+
+    def compile(self, expr):
+        b = self.bdd
+        if isinstance(expr, bool):
+            return TRUE if expr else FALSE
+        if isinstance(expr, str) or (isinstance(expr, list) and expr and expr[0] == "VAR"):
+            name = expr if isinstance(expr, str) else expr[1]
+            if name in self.defs or name in self.derived:
+                return self.function(name)
+            return self.atom(name)
+        if not isinstance(expr, list) or not expr:
+            raise ValueError(f"Malformed expression: {expr!r}")
+        op, args = expr[0], expr[1:]
+        if op == "IFNULL":
+            return self.compile(args[1] if args[0] is None else args[0])
+        if op in ("AND", "OR"):
+            combine, f = (b.conj, TRUE) if op == "AND" else (b.disj, FALSE)
+            for a in args:
+                f = combine(f, self.compile(a))
+            return f
+        if op == "NOT":
+            return b.neg(self.compile(args[0]))
+        if op == "IMPLIES":
+            return b.disj(b.neg(self.compile(args[0])), self.compile(args[1]))
+        if op == "EQ" and self._sort(args[0]) == "Bool":
+            return b.iff(self.compile(args[0]), self.compile(args[1]))
+        if op in CMP:
+            return self.atom(expr)
+        if op == "CASE":
+            f = self.compile(args[-1])
+            for i in range(len(args) - 3, -1, -2):
+                f = b.ite(self.compile(args[i]), self.compile(args[i + 1]), f)
+            return f
+        raise ValueError(f"{op} is not a Boolean expression")
+
+    ### === 原子求值（精確分數，只算路徑上用到的原子） ===
+    def values(self, facts):
+        return _Values(self, facts)
+
+    def evaluate(self, facts, names=None):
+        # {constraint id / 結論型變數: True / False / None（缺值無法確定）}
+        if self.error is not None:
+            raise ValueError(self.error)
+        values = self.values(facts)
+        return {name: self.bdd.eval(f, values) for name, f in self.funcs.items()
+                if names is None or name in names}
+
+    def flips(self, facts, target="penalty"):
+        # 單獨改變哪個原子會讓 target 的值翻轉；回傳 [{atom, value, vars}]
+        if self.error is not None:
+            raise ValueError(self.error)
+        f = self.funcs.get(target)
+        if f is None:
+            return []
+        values = self.values(facts)
+        base = self.bdd.eval(f, values)
+        if base is None:
+            return []
+        out = []
+        for i in self.bdd.support(f):
+            if values[i] is None:
+                continue
+            if self.bdd.eval(f, _Flipped(values, i)) != base:
+                atom = self.atoms[i]
+                out.append({"atom": atom_text(atom), "value": values[i],
+                            "vars": sorted(set(_names(atom, [])) - set(self.defs))})
+        return out
+
+    def stats(self):
+        nodes = set()
+        for f in self.funcs.values():
+            stack = [f]
+            while stack:
+                g = stack.pop()
+                if g > TRUE and g not in nodes:
+                    nodes.add(g)
+                    stack += self.bdd.nodes[g][1:]
+        return {"atoms": len(self.atoms), "functions": len(self.funcs), "nodes": len(nodes)}
+
+class _Flipped:
+    def __init__(self, values, i):
+        self.values = values
+        self.i = i
+
+    def __getitem__(self, i):
+        return not self.values[i] if i == self.i else self.values[i]
+
+class _Values:
+    # values[i] 為第 i 個原子的真假，第一次讀取時才以 Fraction 精確計算；缺值、字串、NaN、除以 0 → None
+    def __init__(self, rules, facts):
+        self.rules = rules
+        self.facts = facts
+        self.memo = {}
+        self.atoms = {}
+
+    def __getitem__(self, i):
+        if i not in self.atoms:
+            self.atoms[i] = self.boolean(self.rules.atoms[i])
+        return self.atoms[i]
+
+    def name(self, name):
+        if name not in self.memo:
+            self.memo[name] = None  # 循環引用視為缺值
+            if name in self.rules.defs:
+                value = self.value(self.rules.defs[name])
+            elif name in self.rules.derived:
+                value = self.value(self.rules.derived[name])
+            else:
+                value = self.facts.get(name)
+                if isinstance(value, (bool, int, float)):
+                    value = bool(value) if self.rules.checker.name_sort(name, "Real") == "Bool" else _frac(value)
+                else:
+                    value = None
+            self.memo[name] = value
+        return self.memo[name]
+
+    def boolean(self, expr):
+        value = self.value(expr)
+        return None if value is None else bool(value)
+
+    def value(self, expr):
+        if isinstance(expr, bool):
+            return expr
+        if isinstance(expr, (int, float)):
+            return _frac(expr)
+        if isinstance(expr, str):
+            return self.name(expr)
+        op, args = expr[0], expr[1:]
+        if op == "VAR":
+            return self.name(args[0])
+        if op == "IFNULL":
+            return self.value(args[1] if args[0] is None else args[0])
+        if op == "AND":
+            xs = [self.boolean(a) for a in args]
+            return False if False in xs else None if None in xs else True
+        if op == "OR":
+            xs = [self.boolean(a) for a in args]
+            return True if True in xs else None if None in xs else False
+        if op == "NOT":
+            x = self.boolean(args[0])
+            return None if x is None else not x
+        if op == "IMPLIES":
+            a, b = self.boolean(args[0]), self.boolean(args[1])
+            return True if a is False or b is True else None if a is None or b is None else False
+        if op == "CASE":
+            for i in range(0, len(args) - 1, 2):
+                cond = self.boolean(args[i])
+                if cond is None:
+                    return None
+                if cond:
+                    return self.value(args[i + 1])
+            return self.value(args[-1])
+        xs = [self.value(a) for a in args]
+        if any(x is None for x in xs):
+            return None
+        if op in CMP:
+            a, b = xs
+            return {"GE": a >= b, "LE": a <= b, "GT": a > b, "LT": a < b, "EQ": a == b}[op]
+        if op in ("ADD", "SUM"):
+            return sum(xs, Fraction(0))
+        if op == "SUB":
+            return -xs[0] if len(xs) == 1 else xs[0] - sum(xs[1:], Fraction(0))
+        if op == "MUL":
+            return math.prod(xs)
+        if op == "DIV":
+            if any(x == 0 for x in xs[1:]):
+                return None
+            value = xs[0]
+            for x in xs[1:]:
+                value /= x
+            return value
+        if op == "AVG":
+            return sum(xs, Fraction(0)) / len(xs)
+        if op == "MIN":
+            return min(xs)
+        if op == "MAX":
+            return max(xs)
+        if op == "ABS":
+            return abs(xs[0])
+        if op == "POW":
+            if xs[1].denominator != 1 or (xs[0] == 0 and xs[1] < 0):
+                return None
+            return xs[0] ** int(xs[1])
+        if op == "FLOOR":
+            return Fraction(math.floor(xs[0]))
+        if op == "CEIL":
+            return Fraction(math.ceil(xs[0]))
+        if op == "ROUND":
+            scale = Fraction(10) ** int(xs[1] if len(xs) > 1 else 0)
+            return Fraction(math.floor(xs[0] * scale + Fraction(1, 2))) / scale
+        if op == "PERCENT":
+            return xs[0] * 100
+        return None
+
+class BDDCache:
+    # 記憶體內 LRU：同一組規則（與變數型別）只編一次 BDD
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, constraints, varspecs=()):
+        key = rulebase_key(constraints, varspecs)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            rules = self.entries[key] = RuleBDD(constraints, varspecs)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return rules
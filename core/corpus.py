@@ -0,0 +1,43 @@
+import re
+import csv
+import hashlib
+import unicodedata
+from pathlib import Path
+
+# 判決全文動輒數十 KB，預設的 131072 上限不夠
+csv.field_size_limit(2**31 - 1)
+
+CASE_COLUMN = "法律案例"
+STATUTE_COLUMN = "相關法條"
+
+def statute_key(statute_text):
+    # 正規化（NFKC、空白折疊）後取雜湊，同一組法條只解析一次
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", statute_text)).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+def shard_of(idx, statute_text, n, shard_by="index"):
+    if shard_by == "statute":
+        return int(statute_key(statute_text), 16) % n
+    return idx % n
+
+def parse_shard(spec):
+    # "i/n" → (i, n)，i 從 0 起算
+    i, n = (int(x) for x in spec.split("/"))
+    if not 0 <= i < n:
+        raise ValueError(f"Invalid shard {spec!r}: expected 0 <= i < n")
+    return i, n
+
+def iter_cases(path, start=0, limit=None, shard=None, shard_by="index"):
+    # 逐列串流讀取 CSV（容忍 BOM 與欄位內換行），產出 (idx, case_text, statute_text)；
+    # idx 為原始列號，與 outputs/case_{idx}.* 對應
+    stop = None if limit is None else start + limit
+    with Path(path).open(encoding="utf-8-sig", newline="") as f:
+        for idx, row in enumerate(csv.DictReader(f)):
+            if idx < start:
+                continue
+            if stop is not None and idx >= stop:
+                break
+            statute_text = row[STATUTE_COLUMN] or ""
+            if shard is not None and shard_of(idx, statute_text, shard[1], shard_by) != shard[0]:
+                continue
+            yield idx, row[CASE_COLUMN] or "", statute_text
@@ -0,0 +1,53 @@
+# S-expression 的 hash-consing：結構相同的子式（不論出現在哪個 constraint）共用同一個節點 id，
+# 節點依後序編號（子節點的 id 一定比父節點小），可直接當作拓樸順序。
+# core/dsl 以節點 id 快取已編譯的 Z3 term；generate_z3_solver_code 把被多處引用的節點
+# 輸出成共用的暫存變數。
+
+class ExprDAG:
+    def __init__(self):
+        self.index = {}    # 結構鍵 → node id
+        self.nodes = []    # node id → 第一次出現的 expr
+        self.parents = []  # node id → 引用此節點的相異父節點數（含 root）
+        self.terms = {}    # node id → 編譯後的 Z3 term（由 core/dsl 填入）
+        self.occurrences = 0
+        self._by_obj = {}  # id(list) → (list, node id)；保留參照避免 id 被重用
+
+    def intern(self, expr):
+        if not isinstance(expr, list):
+            return self._node(("leaf", type(expr).__name__, expr), expr, ())
+        seen = self._by_obj.get(id(expr))
+        if seen is not None:
+            return seen[1]
+        if not expr or not isinstance(expr[0], str):
+            raise ValueError(f"Malformed expression: {expr!r}")
+        children = tuple(self.intern(a) for a in expr[1:])
+        self.occurrences += 1
+        nid = self._node(("op", expr[0], children), expr, children)
+        self._by_obj[id(expr)] = (expr, nid)
+        return nid
+
+    def _node(self, key, expr, children):
+        nid = self.index.get(key)
+        if nid is None:
+            nid = self.index[key] = len(self.nodes)
+            self.nodes.append(expr)
+            self.parents.append(0)
+            for child in set(children):
+                self.parents[child] += 1
+        return nid
+
+    def root(self, expr):
+        nid = self.intern(expr)
+        self.parents[nid] += 1
+        return nid
+
+    def shared(self, min_parents=2):
+        # 被至少 min_parents 個相異父節點引用、且值得命名的子式（不含葉節點與 VAR），依拓樸順序
+        return [
+            nid for nid, expr in enumerate(self.nodes)
+            if isinstance(expr, list) and expr[0] != "VAR" and self.parents[nid] >= min_parents
+        ]
+
+    def stats(self):
+        distinct = sum(1 for expr in self.nodes if isinstance(expr, list))
+        return {"occurrences": self.occurrences, "distinct": distinct, "shared": len(self.shared())}
@@ -0,0 +1,152 @@
+import time
+from z3 import Solver, Bool, Implies, Or, Not, is_true, sat, unsat
+from .dsl import RULE_LABEL, FACT_LABEL
+from .solve import Z3_LOCK, COMPILE_ERRORS, _compile
+
+# 違規診斷：規則與 facts 各自掛一個假設字面值（rule!<id> / fact!<name>），
+# 在同一個 Solver 上以不同假設組合反覆 check()，計算最小 unsat core（MUS），
+# 並可列舉所有 MUS 與最小修正集合（MCS，放寬哪些項目即可滿足）。
+# 每個案例有時間預算，逾時回傳目前為止的結果並標記 complete=False。
+
+class Budget:
+    def __init__(self, seconds):
+        self.deadline = time.perf_counter() + seconds if seconds else None
+
+    def remaining_ms(self):
+        return max(1, int((self.deadline - time.perf_counter()) * 1000))
+
+    def expired(self):
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+class Diagnoser:
+    def __init__(self, rule_base, varspec_facts, budget=5.0):
+        self.rule_base = rule_base
+        self.budget = Budget(budget)
+        self.solver = Solver()
+        self.literals = []
+        self.items = {}
+        desc = {c["id"]: c.get("desc", "") for c in rule_base.constraints}
+        for cid, term in rule_base.assertions:
+            self._track(RULE_LABEL + cid, term, {"kind": "rule", "id": cid, "desc": desc.get(cid, "")})
+        for name, value in varspec_facts.get("facts", {}).items():
+            fact = rule_base.fact(name, value)
+            if fact is not None:
+                self._track(FACT_LABEL + name, fact, {"kind": "fact", "name": name, "value": value})
+        self.complete = True
+
+    def _track(self, label, term, item):
+        literal = Bool(label)
+        self.solver.add(Implies(literal, term))
+        self.literals.append(literal)
+        self.items[label] = item
+
+    def check(self, literals):
+        # 回傳 sat / unsat；逾時或 unknown 時回傳 None 並標記結果不完整
+        if self.budget.expired():
+            self.complete = False
+            return None
+        if self.budget.deadline is not None:
+            self.solver.set("timeout", self.budget.remaining_ms())
+        result = self.solver.check(*literals)
+        if result == sat or result == unsat:
+            return result
+        self.complete = False
+        return None
+
+    def core(self, literals):
+        # 目前假設集合的 unsat core（只保留仍在 literals 中的項目，順序不變）
+        labels = {str(c) for c in self.solver.unsat_core()}
+        return [lit for lit in literals if str(lit) in labels]
+
+    def shrink(self, core):
+        # 逐一刪除：拿掉某項仍 unsat 就永久拿掉，並以新的 core 縮小剩餘候選
+        i = 0
+        while i < len(core):
+            candidate = core[:i] + core[i + 1:]
+            result = self.check(candidate)
+            if result is None:
+                return core, False
+            if result == unsat:
+                core = self.core(candidate)
+                i = min(i, len(core))
+            else:
+                i += 1
+        return core, True
+
+    def grow(self, seed):
+        # 由可滿足的 seed 擴成極大可滿足集合（MSS）；補集即為一個 MCS
+        seed = list(seed)
+        for lit in self.literals:
+            if any(lit.eq(s) for s in seed):
+                continue
+            result = self.check(seed + [lit])
+            if result is None:
+                return None
+            if result == sat:
+                seed.append(lit)
+        return [lit for lit in self.literals if not any(lit.eq(s) for s in seed)]
+
+    def describe(self, literals):
+        return [self.items[str(lit)] for lit in literals]
+
+    def minimal_core(self):
+        result = self.check(self.literals)
+        if result is None:
+            return {"status": "unknown"}
+        if result == sat:
+            return {"status": "sat"}
+        core, minimal = self.shrink(self.core(self.literals))
+        return {"status": "unsat", "core": self.describe(core), "minimal": minimal}
+
+    def enumerate(self, limit=10):
+        # MARCO：以 map solver 挑尚未涵蓋的假設子集，unsat 則縮成 MUS、sat 則擴成 MSS，
+        # 兩者分別以阻擋子句排除，直到 map solver 無解、兩者皆達上限或時間用盡
+        muses, mcses = [], []
+        seen = Solver()
+        while len(muses) < limit or len(mcses) < limit:
+            if self.budget.expired():
+                self.complete = False
+                break
+            if seen.check() != sat:
+                break
+            model = seen.model()
+            seed = [lit for lit in self.literals
+                    if not (model[lit] is not None and not is_true(model[lit]))]
+            result = self.check(seed)
+            if result is None:
+                break
+            if result == sat:
+                mcs = self.grow(seed)
+                if mcs is None:
+                    break
+                if len(mcses) < limit:
+                    mcses.append(self.describe(mcs))
+                seen.add(Or(*mcs))
+            else:
+                mus, minimal = self.shrink(self.core(seed))
+                if not minimal:
+                    break
+                if len(muses) < limit:
+                    muses.append(self.describe(mus))
+                seen.add(Or(*[Not(lit) for lit in mus]))
+        return muses, mcses
+
+def diagnose(constraints, varspec_facts, rule_base=None, rule_cache=None, budget=5.0, enumerate_limit=0):
+    # facts 與規則都當成可刪除的假設；sat 表示 facts 與規則一致，無違規可診斷
+    t0 = time.perf_counter()
+    with Z3_LOCK:
+        try:
+            rb = rule_base or _compile(constraints, varspec_facts.get("varspecs", []), rule_cache)
+            d = Diagnoser(rb, varspec_facts, budget)
+        except COMPILE_ERRORS as e:
+            return {"status": "error", "error": str(e)}
+        out = d.minimal_core()
+        if out["status"] == "unsat" and enumerate_limit:
+            out["muses"], out["mcses"] = d.enumerate(enumerate_limit)
+    out["complete"] = d.complete
+    out["time"] = time.perf_counter() - t0
+    return out
+
+def violated_rules(diagnosis):
+    # 最小 core 中的規則 id（即此案例 facts 違反的法條）
+    return [item["id"] for item in diagnosis.get("core", []) if item["kind"] == "rule"]
@@ -1,17 +1,194 @@
-from z3 import Real, Int, Bool, And, Or, Not
+from functools import reduce
+from z3 import (
+    Real, Int, Bool, And, Or, Not, Implies, If, Sum, ToReal, ToInt,
+    RealVal, IntVal, BoolVal, is_bool, is_int,
+)
+from .dag import ExprDAG
+
+OPS = {
+    "AND", "OR", "NOT", "IMPLIES", "EQ", "GE", "LE", "GT", "LT", "VAR", "CASE",
+    "ADD", "SUB", "MUL", "DIV",
+    "SUM", "AVG", "MIN", "MAX",
+    "ABS", "POW", "ROUND", "FLOOR", "CEIL", "IFNULL", "PERCENT",
+}
+
+# assert_and_track 的追蹤標籤；不可與 constraint id 本身的符號同名
+RULE_LABEL = "rule!"
+FACT_LABEL = "fact!"
 
 def z3_var(vtype, name):
     return {"Real": Real, "Int": Int, "Bool": Bool}[vtype](name)
 
+def z3_const(value):
+    if isinstance(value, bool): return BoolVal(value)
+    if isinstance(value, int): return IntVal(value)
+    if isinstance(value, float): return RealVal(value)
+    raise ValueError(f"Unsupported literal: {value!r}")
+
+def sort_name(term):
+    if is_bool(term): return "Bool"
+    if is_int(term): return "Int"
+    return "Real"
+
+def _real(term):
+    return ToReal(term) if is_int(term) else term
+
+def _lookup(env, name, default):
+    resolve = getattr(env, "resolve", None)
+    return resolve(name, default) if resolve else env[name]
+
+def _min(a, b): return If(a <= b, a, b)
+def _max(a, b): return If(a >= b, a, b)
+
 def compile_s_expr(ast, env):
-    op = ast[0]
-    if op == "AND": return And(*[compile_s_expr(x, env) for x in ast[1:]])
-    if op == "OR":  return Or(*[compile_s_expr(x, env) for x in ast[1:]])
-    if op == "NOT": return Not(compile_s_expr(ast[1], env))
-    if op == "GE":  return env[ast[1]] >= ast[2]
-    if op == "LE":  return env[ast[1]] <= ast[2]
-    if op == "GT":  return env[ast[1]] >  ast[2]
-    if op == "LT":  return env[ast[1]] <  ast[2]
-    if op == "EQ":  return env[ast[1]] == ast[2]
-    if op == "VAR": return env[ast[1]]
+    if isinstance(ast, (bool, int, float)): return z3_const(ast)
+    if isinstance(ast, str): return _lookup(env, ast, "Real")
+    if not isinstance(ast, list) or not ast:
+        raise ValueError(f"Malformed expression: {ast!r}")
+
+    # 結構相同的子式只編譯一次（Env 帶有 ExprDAG 時）
+    dag = getattr(env, "dag", None)
+    if dag is None:
+        return _compile_op(ast, env)
+    nid = dag.intern(ast)
+    if nid not in dag.terms:
+        dag.terms[nid] = _compile_op(ast, env)
+    return dag.terms[nid]
+
+def _compile_op(ast, env):
+    op, args = ast[0], ast[1:]
+    if op == "VAR": return _lookup(env, args[0], "Bool")
+    if op == "IFNULL":
+        # S-expression 中只有字面 null 算空值；變數一律視為已賦值
+        return compile_s_expr(args[1] if args[0] is None else args[0], env)
+    if op == "ROUND":
+        digits = args[1] if len(args) > 1 else 0
+        scale = RealVal(10 ** digits)
+        x = _real(compile_s_expr(args[0], env))
+        return ToReal(ToInt(x * scale + RealVal(0.5))) / scale
+
+    xs = [compile_s_expr(x, env) for x in args]
+    if op == "AND": return And(*xs)
+    if op == "OR":  return Or(*xs)
+    if op == "NOT":
+        if not is_bool(xs[0]):
+            raise ValueError(f"NOT expects a Bool operand: {args[0]!r}")
+        return Not(xs[0])
+    if op == "IMPLIES": return Implies(xs[0], xs[1])
+    if op == "GE":  return xs[0] >= xs[1]
+    if op == "LE":  return xs[0] <= xs[1]
+    if op == "GT":  return xs[0] >  xs[1]
+    if op == "LT":  return xs[0] <  xs[1]
+    if op == "EQ":  return xs[0] == xs[1]
+    if op == "CASE":
+        if len(xs) % 2 == 0:
+            raise ValueError("CASE expects cond/value pairs followed by a default")
+        result = xs[-1]
+        for i in range(len(xs) - 3, -1, -2):
+            result = If(xs[i], xs[i + 1], result)
+        return result
+    if op in ("ADD", "SUM"): return Sum(*xs) if len(xs) > 1 else xs[0]
+    if op == "SUB": return -xs[0] if len(xs) == 1 else reduce(lambda a, b: a - b, xs)
+    if op == "MUL": return reduce(lambda a, b: a * b, xs)
+    if op == "DIV": return reduce(lambda a, b: a / b, [_real(x) for x in xs])
+    if op == "AVG": return _real(Sum(*xs) if len(xs) > 1 else xs[0]) / len(xs)
+    if op == "MIN": return reduce(_min, xs)
+    if op == "MAX": return reduce(_max, xs)
+    if op == "ABS": return If(xs[0] >= 0, xs[0], -xs[0])
+    if op == "POW": return xs[0] ** xs[1]
+    if op == "FLOOR": return xs[0] if is_int(xs[0]) else ToInt(xs[0])
+    if op == "CEIL":  return xs[0] if is_int(xs[0]) else -ToInt(-xs[0])
+    if op == "PERCENT": return xs[0] * 100.0
     raise ValueError(f"Unknown op: {op}")
+
+def referenced_ids(constraints):
+    # 以 ["VAR", id] 或直接寫 id 字串引用到的 constraint id（兩者都解析為該 constraint 的定義）
+    ids = {c["id"] for c in constraints}
+    found = set()
+
+    def walk(expr):
+        if isinstance(expr, str) and expr in ids:
+            found.add(expr)
+        elif isinstance(expr, list) and expr:
+            if expr[0] == "VAR" and len(expr) > 1 and expr[1] in ids:
+                found.add(expr[1])
+            for e in expr[1:]:
+                walk(e)
+
+    for c in constraints:
+        walk(c["expr"])
+    return found
+
+def derived_defs(constraints):
+    # 結論型變數（如 penalty）：規則（未被引用的 constraint）以頂層 ["EQ", name, expr] 定義的 name，
+    # name 不是 constraint id。多個定義時取第一個右側不是字面值者（其餘仍是要成立的規則）。
+    # core/solve 放寬 facts 的順序、core/vectorize 與 core/bdd 的求值都以此為準
+    ids = {c["id"] for c in constraints}
+    referenced = referenced_ids(constraints)
+    out = {}
+    for c in constraints:
+        expr = c["expr"]
+        if (c["id"] not in referenced and isinstance(expr, list) and len(expr) == 3 and expr[0] == "EQ"
+                and isinstance(expr[1], str) and expr[1] not in ids):
+            if expr[1] not in out or (not isinstance(out[expr[1]], list) and isinstance(expr[2], list)):
+                out[expr[1]] = expr[2]
+    return out
+
+class Env(dict):
+    # name -> Z3 term；變數與被 VAR 引用的 constraint id 在第一次使用時才宣告
+    def __init__(self, varspecs=(), constraints=()):
+        super().__init__()
+        self.types = {}
+        for v in varspecs:
+            v = v if isinstance(v, dict) else v.model_dump()
+            self.types[v["name"]] = v["type"]
+        self.defs = {c["id"]: c["expr"] for c in constraints}
+        self.terms = {}
+        self.dag = ExprDAG()
+        self._compiling = set()
+
+    def resolve(self, name, default="Real"):
+        if name in self:
+            return self[name]
+        if name in self.defs:
+            self[name] = z3_var(sort_name(self.define(name)), name)
+        else:
+            self[name] = z3_var(self.types.get(name, default), name)
+        return self[name]
+
+    def define(self, cid):
+        if cid not in self.terms:
+            if cid in self._compiling:
+                raise ValueError(f"Cyclic VAR reference: {cid}")
+            self._compiling.add(cid)
+            try:
+                self.terms[cid] = compile_s_expr(self.defs[cid], self)
+            finally:
+                self._compiling.discard(cid)
+        return self.terms[cid]
+
+class RuleBase:
+    # 一組 ConstraintSpec 的 Z3 編譯結果：
+    # 被其他 constraint 引用（VAR 或直接寫 id）、或非布林的 constraint 綁定為 `id == expr`（定義），
+    # 其餘布林 constraint 直接作為規則；assertions 依原順序為 (id, BoolRef)
+    def __init__(self, constraints, varspecs=()):
+        self.constraints = [c if isinstance(c, dict) else c.model_dump() for c in constraints]
+        self.env = Env(varspecs, self.constraints)
+        referenced = referenced_ids(self.constraints)
+        self.assertions = []
+        for c in self.constraints:
+            term = self.env.define(c["id"])
+            if c["id"] in referenced or not is_bool(term):
+                term = self.env.resolve(c["id"]) == term
+            self.assertions.append((c["id"], term))
+
+    def var(self, name):
+        return self.env.resolve(name, self.env.types.get(name, "Real"))
+
+    def fact(self, name, value):
+        if value is None or isinstance(value, str):
+            return None
+        var = self.var(name)
+        if is_bool(var):
+            return var == BoolVal(bool(value))
+        return var == z3_const(int(value) if isinstance(value, bool) else value)
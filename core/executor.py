@@ -0,0 +1,181 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # 非 Unix 平台沒有 setrlimit，只剩 wall-clock 限制
+    resource = None
+
+# 行程池執行器：每個 worker 是常駐的子行程，一次只做一個工作，父行程以 Pipe 派工。
+# - wall-clock：從派工起算，超過 timeout 即殺掉該 worker 並補一個新的，結果為 status "timeout"
+# - 記憶體：worker 啟動時以 setrlimit(RLIMIT_AS) 限制位址空間，超過時工作拋 MemoryError（Z3 則拋
+#   Z3Exception "out of memory"），或工作自己回傳 status "memout" 的 dict → status "memout"，同樣換新 worker
+# - worker 意外結束（segfault、被 OOM killer 殺掉）→ status "crash"，同樣換新 worker
+# - 每個 worker 做滿 max_tasks 個工作後回收，避免長時間執行累積記憶體
+# 工作函式須可 pickle（模組層級函式），回傳 dict；執行器本身的失敗也以
+# {"status", "error", "elapsed"} 的 dict 回傳，不拋例外。call() 為 thread-safe。
+
+# C 擴充配置失敗時拋出的例外訊息（Z3：RLIMIT_AS 下為 "out of memory"，memory_max_size 為 "max. memory exceeded"）
+MEMOUT_MESSAGES = ("out of memory", "max. memory exceeded")
+
+def is_memout(e):
+    return isinstance(e, MemoryError) or any(m in str(e).lower() for m in MEMOUT_MESSAGES)
+
+def _set_limits(memory_mb):
+    if memory_mb and resource is not None:
+        limit = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _serve(conn, memory_mb, initializer, initargs):
+    _set_limits(memory_mb)
+    if initializer is not None:
+        initializer(*initargs)
+    conn.send(("ready", None))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        fn, args, kwargs = task
+        try:
+            out = ("ok", fn(*args, **kwargs))
+        except Exception as e:
+            if is_memout(e):
+                out = ("memout", f"exceeded memory limit ({memory_mb} MB): {e}")
+            else:
+                out = ("error", f"{type(e).__name__}: {e}")
+        try:
+            conn.send(out)
+        except MemoryError:
+            conn.send(("memout", f"exceeded memory limit ({memory_mb} MB)"))
+
+class _Worker:
+    def __init__(self, ctx, memory_mb, initializer, initargs):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child, memory_mb, initializer, initargs), daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+        self.ready = False
+
+    def wait_ready(self):
+        # 第一次派工前等 worker 完成 import 與 initializer
+        if not self.ready:
+            self.conn.recv()
+            self.ready = True
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            else:
+                self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class ProcessExecutor:
+    def __init__(self, workers=None, timeout=None, memory_mb=None, initializer=None, initargs=(),
+                 max_tasks=None, start_method="spawn"):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_tasks = max_tasks
+        self._ctx = mp.get_context(start_method)
+        self._spawn_args = (memory_mb, initializer, initargs)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._all = set()
+        self.closed = False
+        self.stats = {"ok": 0, "error": 0, "timeout": 0, "memout": 0, "crash": 0, "recycled": 0}
+        # 預先啟動所有 worker，第一個工作不必等 import
+        for _ in range(self.workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, *self._spawn_args)
+        with self._lock:
+            self._all.add(worker)
+        return worker
+
+    def _retire(self, worker, kill=False):
+        with self._lock:
+            self._all.discard(worker)
+        worker.stop(kill=kill)
+
+    def _count(self, status):
+        with self._lock:
+            self.stats[status] += 1
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        # 阻塞到有閒置 worker，派工並等結果；timeout 未給時用建構時的預設
+        if self.closed:
+            raise RuntimeError("executor is closed")
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._idle.get()
+        t0 = None
+        try:
+            worker.wait_ready()
+            t0 = time.perf_counter()
+            worker.conn.send((fn, args, kwargs))
+            done = worker.conn.poll(timeout)
+            kind, value = worker.conn.recv() if done else ("timeout", None)
+        except (EOFError, OSError):
+            worker.process.join(1)
+            kind, value = "crash", f"worker exited with code {worker.process.exitcode}"
+        if kind == "ok" and isinstance(value, dict) and value.get("status") == "memout":
+            # 工作自己攔下了配置失敗（如 core/solve 把 Z3 的 out of memory 記為 memout）
+            kind, value = "memout", value.get("error")
+        elapsed = time.perf_counter() - t0 if t0 is not None else 0.0
+        self._count(kind)
+
+        if kind in ("timeout", "crash", "memout"):
+            # 逾時的 worker 還在跑，記憶體超限的 worker 狀態不可信：一律換新
+            self._retire(worker, kill=True)
+            worker = self._spawn()
+        else:
+            worker.tasks += 1
+            if self.max_tasks and worker.tasks >= self.max_tasks:
+                self._count("recycled")
+                self._retire(worker)
+                worker = self._spawn()
+        self._idle.put(worker)
+
+        if kind == "ok":
+            return value
+        if kind == "timeout":
+            value = f"exceeded wall-clock limit ({timeout:g} s)"
+        return {"status": kind, "error": value, "elapsed": elapsed}
+
+    def map(self, fn, items):
+        # items 為參數 tuple；最多同時 workers 個在途，結果依輸入順序回傳
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            yield from pool.map(lambda args: self.call(fn, *args), items)
+
+    def report(self):
+        s = self.stats
+        return (f"[Executor] workers={self.workers} ok={s['ok']} error={s['error']} timeout={s['timeout']} "
+                f"memout={s['memout']} crash={s['crash']} recycled={s['recycled']}")
+
+    def close(self):
+        self.closed = True
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,72 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    case_id    TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    artifacts  TEXT NOT NULL,
+    updated    REAL NOT NULL,
+    PRIMARY KEY (case_id, stage)
+);
+"""
+
+def content_hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, (str, bytes)):
+            part = json.dumps(part, ensure_ascii=False, sort_keys=True)
+        h.update(part.encode("utf-8") if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+def file_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+class Manifest:
+    # 每個案例各階段的完成紀錄：輸入雜湊 + 產出檔的雜湊；
+    # 輸入改變、產出檔遺失或被改動都視為過期，需重算
+    def __init__(self, path, resume=True):
+        self.path = Path(path)
+        self.resume = resume
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def is_done(self, case_id, stage, input_hash):
+        if not self.resume:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                "SELECT input_hash, artifacts FROM stages WHERE case_id = ? AND stage = ?",
+                (case_id, stage),
+            ).fetchone()
+        if row is None or row[0] != input_hash:
+            return False
+        for path, digest in json.loads(row[1]).items():
+            try:
+                if file_hash(path) != digest:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def record(self, case_id, stage, input_hash, artifacts):
+        digests = {str(p): file_hash(p) for p in artifacts}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stages (case_id, stage, input_hash, artifacts, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (case_id, stage, input_hash, json.dumps(digests, ensure_ascii=False), time.time()),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
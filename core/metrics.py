@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+from collections import defaultdict
+
+def agent_usage(agent):
+    # autogen 的 get_actual_usage()：{"total_cost":..., "<model>": {"prompt_tokens", "completion_tokens", ...}}
+    usage = agent.get_actual_usage() if agent is not None and hasattr(agent, "get_actual_usage") else None
+    prompt = completion = 0
+    for entry in (usage or {}).values():
+        if isinstance(entry, dict):
+            prompt += entry.get("prompt_tokens", 0)
+            completion += entry.get("completion_tokens", 0)
+    return prompt, completion
+
+class StageMetrics:
+    # 單一案例（或單一法條解析）各階段的耗時與 token 用量。
+    # "io" 為案例執行緒上的 I/O（讀 manifest / 既有產出、送進寫入佇列、store）；
+    # "write" 為 core/writer 背景執行緒實際序列化與寫檔的時間，在 writer.close() 後才完整
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.tokens = defaultdict(lambda: [0, 0])
+
+    def add(self, name, seconds):
+        self.timings[name] += seconds
+
+    @contextmanager
+    def stage(self, name, agent=None):
+        p0, c0 = agent_usage(agent)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+            if agent is not None:
+                p1, c1 = agent_usage(agent)
+                self.tokens[name][0] += p1 - p0
+                self.tokens[name][1] += c1 - c0
+
+    def as_dict(self):
+        return {
+            "timings": dict(self.timings),
+            "tokens": {k: {"prompt": p, "completion": c} for k, (p, c) in self.tokens.items()},
+        }
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize(metrics):
+    timings = defaultdict(list)
+    tokens = defaultdict(lambda: [0, 0])
+    for m in metrics:
+        for name, seconds in m.timings.items():
+            timings[name].append(seconds)
+        for name, (p, c) in m.tokens.items():
+            tokens[name][0] += p
+            tokens[name][1] += c
+    return {
+        name: {
+            "count": len(values),
+            "total": sum(values),
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "prompt_tokens": tokens[name][0],
+            "completion_tokens": tokens[name][1],
+        }
+        for name, values in sorted(timings.items())
+    }
@@ -0,0 +1,154 @@
+import time
+import queue
+import threading
+from z3 import (
+    Context, Solver, SolverFor, Tactic, Then, is_app, is_const, is_int, is_real, is_bool,
+    is_int_value, is_rational_value, Z3_OP_MUL, Z3_OP_DIV, Z3_OP_IDIV, Z3_OP_MOD, Z3_OP_POWER,
+    Z3_OP_TO_INT, Z3_OP_TO_REAL,
+)
+from .executor import is_memout
+
+# 組合（portfolio）求解：依已編譯規則庫用到的理論分類（BOOL / LRA / LIA / LIRA / NRA / NIA / NIRA），
+# 同時以幾種求解設定各跑一次，取第一個得到 sat / unsat 的結果，其餘以 Context.interrupt() 中止。
+# Z3 的 Context 不能跨執行緒共用：每個策略把規則與 facts translate 到自己的 Context；
+# translate 需要讀原本的 Context，呼叫端要持有 core/solve 的 Z3_LOCK，競賽本身不需要。
+
+def _numeral(e):
+    if is_app(e) and e.decl().kind() == Z3_OP_TO_REAL:
+        return _numeral(e.arg(0))
+    return is_int_value(e) or is_rational_value(e)
+
+def classify(rule_base):
+    sorts, nonlinear, seen = set(), False, set()
+    stack = [term for _, term in rule_base.assertions]
+    while stack:
+        e = stack.pop()
+        if e.get_id() in seen:
+            continue
+        seen.add(e.get_id())
+        if is_const(e) and not _numeral(e):
+            sorts.add("Int" if is_int(e) else "Real" if is_real(e) else "Bool" if is_bool(e) else "Other")
+        if is_app(e):
+            kind = e.decl().kind()
+            args = e.children()
+            if kind == Z3_OP_TO_INT:
+                sorts.add("Int")
+            if kind == Z3_OP_MUL:
+                nonlinear |= sum(not _numeral(a) for a in args) > 1
+            elif kind == Z3_OP_POWER:
+                nonlinear |= not _numeral(args[0])
+            elif kind in (Z3_OP_DIV, Z3_OP_IDIV, Z3_OP_MOD):
+                nonlinear |= not _numeral(args[1])
+            stack.extend(args)
+    arith = "IR" if {"Int", "Real"} <= sorts else "I" if "Int" in sorts else "R" if "Real" in sorts else ""
+    if not arith:
+        return "BOOL"
+    return ("N" if nonlinear else "L") + {"IR": "IRA", "I": "IA", "R": "RA"}[arith]
+
+def _tactic_solver(*names):
+    def make(ctx):
+        tactics = [Tactic(name, ctx) for name in names]
+        s = (Then(*tactics) if len(tactics) > 1 else tactics[0]).solver()
+        s.set(unsat_core=True)
+        return s
+    return make
+
+def _solver_for(logic):
+    return lambda ctx: SolverFor(logic, ctx=ctx)
+
+def _seeded(seed):
+    def make(ctx):
+        s = Solver(ctx=ctx)
+        s.set(random_seed=seed)
+        return s
+    return make
+
+# 名稱 → (fast path 的 Solver 工廠, 放寬 facts 時 Optimize 的 maxsat_engine)
+STRATEGIES = {
+    "default": (lambda ctx: Solver(ctx=ctx), "maxres"),
+    "simplify-smt": (_tactic_solver("simplify", "solve-eqs", "smt"), "wmax"),
+    "seed-7": (_seeded(7), "rc2"),
+    "fd": (_solver_for("QF_FD"), "maxres"),
+    "lra": (_solver_for("QF_LRA"), "wmax"),
+    "lia": (_solver_for("QF_LIA"), "wmax"),
+    "lira": (_solver_for("QF_LIRA"), "wmax"),
+    "nlsat": (_tactic_solver("simplify", "qfnra-nlsat"), "wmax"),
+    "nia": (_solver_for("QF_NIA"), "wmax"),
+    "nira": (_solver_for("QF_NIRA"), "wmax"),
+}
+PORTFOLIOS = {
+    "BOOL": ["default", "fd", "simplify-smt"],
+    "LRA": ["default", "lra", "simplify-smt"],
+    "LIA": ["default", "lia", "simplify-smt"],
+    "LIRA": ["default", "lira", "seed-7"],
+    "NRA": ["default", "nlsat", "simplify-smt"],
+    "NIA": ["default", "nia", "seed-7"],
+    "NIRA": ["default", "nira", "seed-7"],
+}
+
+class TranslatedRules:
+    # RuleBase 的 assertions / env / facts 複製到另一個 Context；介面與 RuleBase 相同，可直接交給 core/solve
+    def __init__(self, rule_base, facts, ctx):
+        self.ctx = ctx
+        self.constraints = rule_base.constraints
+        self.assertions = [(cid, term.translate(ctx)) for cid, term in rule_base.assertions]
+        self.env = {name: term.translate(ctx) for name, term in rule_base.env.items()}
+        self.facts = {name: term.translate(ctx) for name, term in facts.items()}
+
+    def fact(self, name, value):
+        return self.facts.get(name)
+
+class Race:
+    def __init__(self, jobs, logic):
+        self.jobs = jobs      # [(策略名稱, TranslatedRules)]
+        self.logic = logic
+
+    def run(self, attempt):
+        # attempt(rules, make_solver, engine) → 結果 dict；第一個 sat / unsat 勝出，
+        # 全部都是 unknown / error 時取最先完成的
+        done = queue.Queue()
+
+        def work(name, rules):
+            make, engine = STRATEGIES[name]
+            try:
+                out = attempt(rules, make, engine)
+            except Exception as e:  # 個別策略失敗不影響其他策略
+                out = {"status": "memout" if is_memout(e) else "error", "error": f"{type(e).__name__}: {e}"}
+            done.put((name, out))
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=work, args=job, daemon=True) for job in self.jobs]
+        for t in threads:
+            t.start()
+        winner, first = None, None
+        for _ in threads:
+            name, out = done.get()
+            first = first or (name, out)
+            if out["status"] in ("sat", "unsat"):
+                winner = (name, out)
+                break
+        elapsed = time.perf_counter() - t0
+        # 落敗的策略可能還沒進入 check()，持續 interrupt 直到執行緒結束
+        for t, (_, rules) in zip(threads, self.jobs):
+            while t.is_alive():
+                rules.ctx.interrupt()
+                t.join(0.01)
+        name, out = winner or first
+        return {**out, "portfolio": {"logic": self.logic, "winner": name if winner else None,
+                                     "strategies": [n for n, _ in self.jobs], "time": elapsed}}
+
+class Portfolio:
+    def __init__(self, rule_base, strategies=None):
+        self.rule_base = rule_base
+        self.logic = classify(rule_base)
+        self.strategies = strategies or PORTFOLIOS[self.logic]
+
+    def prepare(self, varspec_facts):
+        # 需持有 Z3_LOCK；rb.fact() 可能宣告新變數，先建好 facts 再複製 env
+        facts = {}
+        for name, value in varspec_facts.get("facts", {}).items():
+            fact = self.rule_base.fact(name, value)
+            if fact is not None:
+                facts[name] = fact
+        return Race([(name, TranslatedRules(self.rule_base, facts, Context())) for name in self.strategies],
+                    self.logic)
@@ -0,0 +1,83 @@
+import json
+from fractions import Fraction
+from z3 import is_true, is_false, is_int_value, is_rational_value, is_algebraic_value
+
+# 求解階段的結構化結果：每個案例一筆 dict（case_N.result.json），
+# 整批另寫成 results.jsonl（一行一案例），可直接 pandas.read_json(..., lines=True) 載入彙整。
+
+def py_value(v):
+    # Z3 model 值 → Python 值（Bool → bool、Int → int、Real → float）
+    if is_true(v):
+        return True
+    if is_false(v):
+        return False
+    if is_int_value(v):
+        return v.as_long()
+    if is_rational_value(v):
+        return float(Fraction(v.numerator_as_long(), v.denominator_as_long()))
+    if is_algebraic_value(v):
+        return float(v.approx(20).as_fraction())
+    return str(v)
+
+def _same(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return bool(a) == bool(b)
+    return abs(float(a) - float(b)) <= 1e-9 * max(1.0, abs(float(b)))
+
+def _model_value(model, name, inlined):
+    # 化簡時被內聯的定義不在 model 中：沿 inlined（字面值或 ["VAR", 代替者]）找到其值
+    seen = set()
+    while name not in model and name in inlined and name not in seen:
+        seen.add(name)
+        value = inlined[name]
+        if not isinstance(value, list):
+            return value
+        name = value[1]
+    return model.get(name)
+
+def case_record(case_id, result, constraints, varspec_facts, inlined=None):
+    # model 只留變數；constraint id 的真假值放 rules，值為 False 的即 violated；
+    # relaxed 為 model 中與 mapper 所填 fact 不一致（被放寬）的變數。
+    # constraints 為化簡前的原始規則，inlined 為 core/simplify 報告中被內聯的定義
+    ids = [c["id"] for c in constraints]
+    id_set = set(ids)
+    model = result.get("model", {})
+    facts = varspec_facts.get("facts", {})
+    values = {cid: _model_value(model, cid, inlined or {}) for cid in ids}
+    record = {
+        "case_id": case_id,
+        "status": result["status"],
+        "path": result.get("path"),
+        "penalty": result.get("penalty"),
+        "solve_time": result.get("solve_time"),
+        "model": {k: v for k, v in model.items() if k not in id_set},
+        "rules": {cid: value for cid, value in values.items() if isinstance(value, bool)},
+    }
+    if result["status"] == "sat":
+        record["violated"] = [cid for cid, value in record["rules"].items() if value is False]
+        record["relaxed"] = sorted(
+            name for name, value in facts.items()
+            if name in model and isinstance(value, (bool, int, float)) and not _same(model[name], value)
+        )
+    elif result["status"] == "unsat":
+        record["violated"] = result.get("unsat_core", [])
+    for key in ("error", "reason", "unsat_core", "diagnosis", "portfolio"):
+        if key in result:
+            record[key] = result[key]
+    return record
+
+class ResultsLog:
+    # 一次執行的 results.jsonl；由主執行緒依序寫入
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, "w", encoding="utf-8")
+
+    def append(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.f.close()
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
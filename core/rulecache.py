@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from z3 import Solver, parse_smt2_string, Z3Exception
+from .dsl import RuleBase, Env, z3_var, sort_name
+
+def _names(expr, out):
+    if isinstance(expr, str):
+        out.add(expr)
+    elif isinstance(expr, list):
+        for e in expr[1:]:
+            _names(e, out)
+    return out
+
+def rulebase_key(constraints, varspecs=()):
+    # constraint 清單 + 實際被引用變數的型別 → 正規化 JSON 的 sha256
+    constraints = [c if isinstance(c, dict) else c.model_dump() for c in constraints]
+    used = set()
+    for c in constraints:
+        _names(c["expr"], used)
+    types = {}
+    for v in varspecs:
+        v = v if isinstance(v, dict) else v.model_dump()
+        if v["name"] in used:
+            types[v["name"]] = v["type"]
+    payload = json.dumps(
+        [[[c["id"], c["expr"]] for c in constraints], sorted(types.items())],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def dump_rulebase(rb):
+    s = Solver()
+    for _, term in rb.assertions:
+        s.add(term)
+    return {
+        "ids": [cid for cid, _ in rb.assertions],
+        "vars": {name: sort_name(term) for name, term in rb.env.items()},
+        "types": rb.env.types,
+        "smt2": s.sexpr(),
+    }
+
+def load_rulebase(constraints, data):
+    terms = parse_smt2_string(data["smt2"])
+    if len(terms) != len(data["ids"]):
+        raise ValueError("Cached rule base does not match its constraint ids")
+    rb = RuleBase.__new__(RuleBase)
+    rb.constraints = [c if isinstance(c, dict) else c.model_dump() for c in constraints]
+    rb.env = Env((), rb.constraints)
+    rb.env.types = dict(data["types"])
+    for name, vtype in data["vars"].items():
+        rb.env[name] = z3_var(vtype, name)
+    rb.assertions = list(zip(data["ids"], terms))
+    return rb
+
+class RuleBaseCache:
+    # 已編譯規則庫的磁碟快取：每個 key 一個 JSON（SMT-LIB2 + 變數 sort），依 mtime 做 LRU 淘汰
+    def __init__(self, root, max_entries=512):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.root / f"{key}.json"
+
+    def get(self, constraints, varspecs=()):
+        path = self._path(rulebase_key(constraints, varspecs))
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            rb = load_rulebase(constraints, data)
+        except (OSError, ValueError, KeyError, Z3Exception):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return rb
+
+    def put(self, constraints, varspecs, rb):
+        path = self._path(rulebase_key(constraints, varspecs))
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(dump_rulebase(rb), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self.root.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for p in entries[:max(0, len(entries) - self.max_entries)]:
+                p.unlink(missing_ok=True)
+
+    def load_or_compile(self, constraints, varspecs=()):
+        rb = self.get(constraints, varspecs)
+        if rb is None:
+            rb = RuleBase(constraints, varspecs)
+            self.put(constraints, varspecs, rb)
+        return rb
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"[RuleBase cache] hit={self.hits} miss={self.misses} hit_rate={rate:.1%}"
@@ -0,0 +1,132 @@
+import io
+import os
+import time
+import types
+import signal
+import tempfile
+import builtins
+import traceback
+from pathlib import Path
+from contextlib import redirect_stdout, redirect_stderr
+import z3
+from .results import py_value
+from .solve import z3_limits
+from .executor import ProcessExecutor, is_memout, resource
+
+# LLM 產生的 .z3.py（--llm-codegen）的批次執行：腳本在 core/executor 的常駐 worker 裡 exec，
+# worker 啟動時就已 import z3，不必每個腳本開一次直譯器。
+# - builtins 拿掉 open / exec / eval / compile / input 等，import 只允許 ALLOWED_MODULES
+# - worker 在空的暫存目錄執行，RLIMIT_FSIZE = 0：寫任何一般檔案都會失敗
+# - 腳本拿到的 z3 是代理模組：Solver / Optimize 會記錄每次 check() 的結果，
+#   不必解析腳本自己印的格式；stdout / stderr 另外截取
+# 受限的 builtins 只防誤用、不防刻意逃逸（Python 內省可以繞過），真正的邊界是子行程與 OS 限制。
+
+ALLOWED_MODULES = {
+    "z3", "math", "fractions", "decimal", "itertools", "functools", "operator",
+    "collections", "re", "json", "typing", "dataclasses", "enum", "time",
+}
+BLOCKED_BUILTINS = {
+    "open", "exec", "eval", "compile", "input", "breakpoint", "help", "exit", "quit", "__import__",
+}
+OUTPUT_LIMIT = 20000
+
+_sandbox = {}
+
+def _record(solver, result):
+    out = {"status": str(result)}
+    if result == z3.sat:
+        m = solver.model()
+        out["model"] = {d.name(): py_value(m[d]) for d in m.decls() if d.arity() == 0}
+        out["penalty"] = out["model"].get("penalty")
+    elif result == z3.unsat:
+        out["unsat_core"] = [str(c) for c in solver.unsat_core()]
+    else:
+        out["reason"] = solver.reason_unknown()
+    _sandbox["checks"].append(out)
+
+class _Recorded:
+    def check(self, *assumptions):
+        result = super().check(*assumptions)
+        _record(self, result)
+        return result
+
+class _Solver(_Recorded, z3.Solver):
+    pass
+
+class _Optimize(_Recorded, z3.Optimize):
+    pass
+
+def _z3_module():
+    module = types.ModuleType("z3")
+    module.__dict__.update({k: v for k, v in vars(z3).items() if not k.startswith("__")})
+    module.Solver, module.Optimize = _Solver, _Optimize
+    return module
+
+def _import(name, globals=None, locals=None, fromlist=(), level=0):
+    root = name.split(".")[0]
+    if level or root not in ALLOWED_MODULES:
+        raise ImportError(f"import of {name!r} is not allowed in the sandbox")
+    if name == "z3":
+        return _sandbox["z3"]
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+def _blocked(name):
+    def blocked(*args, **kwargs):
+        raise PermissionError(f"{name}() is not allowed in the sandbox")
+    return blocked
+
+def _init_sandbox(timeout=None, rlimit=None):
+    z3_limits(timeout, rlimit)
+    os.chdir(tempfile.mkdtemp(prefix="z3sandbox-"))
+    if resource is not None:
+        # 寫檔超過上限時改為 OSError，而不是 SIGXFSZ 殺掉 worker
+        signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    safe = {k: v for k, v in vars(builtins).items() if k not in BLOCKED_BUILTINS}
+    safe.update({name: _blocked(name) for name in BLOCKED_BUILTINS - {"__import__"}})
+    safe["__import__"] = _import
+    _sandbox.update(builtins=safe, z3=_z3_module())
+
+def _clip(text):
+    return text if len(text) <= OUTPUT_LIMIT else text[:OUTPUT_LIMIT] + f"\n... ({len(text) - OUTPUT_LIMIT} chars truncated)"
+
+def run_script(code, name="<z3 script>"):
+    # 在 worker 內執行；status 取最後一次 check() 的結果，沒有呼叫 check() 為 "no-check"
+    _sandbox["checks"] = []
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    t0 = time.perf_counter()
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exec(compile(code, name, "exec"), {"__builtins__": _sandbox["builtins"], "__name__": "__main__"})
+    except SystemExit as e:
+        error = None if e.code in (None, 0) else f"SystemExit: {e.code}"
+    except BaseException as e:
+        if is_memout(e):
+            raise  # core/executor 記為 memout 並換掉 worker
+        frames = [f for f in traceback.extract_tb(e.__traceback__) if f.filename == name]
+        line = f" (line {frames[-1].lineno})" if frames else ""
+        error = f"{type(e).__name__}: {e}{line}"
+    elapsed = time.perf_counter() - t0
+    checks = _sandbox["checks"]
+    out = dict(checks[-1]) if checks else {"status": "no-check"}
+    if error is not None:
+        out["status"], out["error"] = "error", error
+    out.update(checks=len(checks), elapsed=elapsed, stdout=_clip(stdout.getvalue()))
+    if stderr.getvalue():
+        out["stderr"] = _clip(stderr.getvalue())
+    return out
+
+def script_executor(workers=None, timeout=None, memory_mb=None, rlimit=None, max_tasks=200):
+    # timeout 同 core/solve.solve_executor：每次 check() 的 Z3 上限，整個腳本的 wall-clock 為兩倍再加 1 秒
+    wall = timeout * 2 + 1 if timeout else None
+    return ProcessExecutor(workers, timeout=wall, memory_mb=memory_mb, max_tasks=max_tasks,
+                           initializer=_init_sandbox, initargs=(timeout, rlimit))
+
+def run_scripts(paths, executor):
+    # paths 依序產出 {"script", "status", ...}；檔案由父行程讀取，worker 不需要檔案系統
+    paths = [Path(p) for p in paths]
+    def job(path):
+        return (path.read_text(encoding="utf-8"), str(path))
+    for path, out in zip(paths, executor.map(run_script, map(job, paths))):
+        yield {"script": str(path), **out}
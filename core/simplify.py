@@ -0,0 +1,275 @@
+import json
+import math
+from fractions import Fraction
+from .dsl import referenced_ids
+
+# 編譯前的 ConstraintSpec[] 化簡（不改變 RuleBase 的語意）：
+# - 常數折疊：算術、比較、布林運算的運算元皆為字面值時直接求值（以分數精確計算，
+#   結果無法以 float 精確表示時保留原式，避免與 Z3 的有理數語意不一致）
+# - 內聯：expr 為字面值的 constraint、以及只是 ["VAR", 其他] 的轉接，直接代入引用處（VAR 或直接寫 id）
+# - 攤平巢狀 AND/OR、去除重複子式；比率包裝 k·x ⋈ c 改寫為 x ⋈ c/k
+# - 刪除：被內聯 / 折疊後不再被引用的定義、恆真的規則、重複的 constraint。
+#   原本被引用的定義一律不留成規則：RuleBase 會把未被引用的布林 constraint 當成必須成立的規則 assert
+# - prune_facts：刪除 constraint 中沒有出現的變數的 varspecs / facts
+
+CMP = {
+    "GE": lambda a, b: a >= b, "LE": lambda a, b: a <= b,
+    "GT": lambda a, b: a > b, "LT": lambda a, b: a < b, "EQ": lambda a, b: a == b,
+}
+# k·x ⋈ c ⇒ x ⋈ c/k（k > 0）時，把比較移到另一側的對應運算子
+MIRROR = {"GE": "LE", "LE": "GE", "GT": "LT", "LT": "GT", "EQ": "EQ"}
+
+def _is_num(x):
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+def _is_lit(x):
+    return isinstance(x, (bool, int, float))
+
+def _frac(x):
+    return Fraction(repr(x)) if isinstance(x, float) else Fraction(x)
+
+def _emit(value, as_int):
+    # 分數 → DSL 字面值；Int 運算保持 int，其餘須能以 float 精確表示
+    if as_int and value.denominator == 1:
+        return int(value)
+    f = float(value)
+    return f if Fraction(repr(f)) == value else None
+
+def _key(expr):
+    return json.dumps(expr, ensure_ascii=False, sort_keys=True)
+
+def size(expr):
+    if isinstance(expr, list):
+        return 1 + sum(size(e) for e in expr[1:])
+    return 1
+
+def _fold_arith(op, args):
+    if not all(_is_num(a) for a in args) or not args:
+        return None
+    xs = [_frac(a) for a in args]
+    ints = all(isinstance(a, int) for a in args)
+    if op in ("ADD", "SUM"):
+        return _emit(sum(xs), ints)
+    if op == "SUB":
+        return _emit(-xs[0] if len(xs) == 1 else xs[0] - sum(xs[1:]), ints)
+    if op == "MUL":
+        return _emit(math.prod(xs), ints)
+    if op == "DIV":
+        if any(x == 0 for x in xs[1:]):
+            return None
+        value = xs[0]
+        for x in xs[1:]:
+            value /= x
+        return _emit(value, False)
+    if op == "AVG":
+        return _emit(sum(xs) / len(xs), False)
+    if op == "MIN":
+        return _emit(min(xs), ints)
+    if op == "MAX":
+        return _emit(max(xs), ints)
+    if op == "ABS":
+        return _emit(abs(xs[0]), ints)
+    if op == "PERCENT":
+        return _emit(xs[0] * 100, False)
+    if op == "FLOOR":
+        return math.floor(xs[0])
+    if op == "CEIL":
+        return math.ceil(xs[0])
+    if op == "ROUND":
+        scale = Fraction(10) ** (args[1] if len(args) > 1 else 0)
+        return _emit(Fraction(math.floor(xs[0] * scale + Fraction(1, 2))) / scale, False)
+    return None
+
+def _scaled(expr):
+    # MUL(x, k) / MUL(k, x) / PERCENT(x) → (x, k)，k 為正的數值字面值
+    if not isinstance(expr, list) or not expr:
+        return None
+    if expr[0] == "PERCENT" and len(expr) == 2:
+        return expr[1], Fraction(100)
+    if expr[0] == "MUL" and len(expr) == 3:
+        a, b = expr[1], expr[2]
+        if _is_num(b) and not _is_num(a) and b > 0:
+            return a, _frac(b)
+        if _is_num(a) and not _is_num(b) and a > 0:
+            return b, _frac(a)
+    return None
+
+def _fold_cmp(op, a, b):
+    if _is_num(a) and _is_num(b):
+        return CMP[op](_frac(a), _frac(b))
+    if isinstance(a, bool) and isinstance(b, bool) and op == "EQ":
+        return a == b
+    for lhs, rhs, o in ((a, b, op), (b, a, MIRROR[op])):
+        scaled = _scaled(lhs)
+        if scaled is not None and _is_num(rhs):
+            c = _emit(_frac(rhs) / scaled[1], False)
+            if c is not None:
+                return [o, scaled[0], c]
+    return [op, a, b]
+
+def _fold_junction(op, args):
+    # AND/OR：攤平同類子式、去除單位元與重複項，遇到吸收元直接回傳
+    unit, absorb = (True, False) if op == "AND" else (False, True)
+    out, seen = [], set()
+    for a in args:
+        parts = a[1:] if isinstance(a, list) and a and a[0] == op else [a]
+        for p in parts:
+            if p is absorb:
+                return absorb
+            if p is unit:
+                continue
+            k = _key(p)
+            if k not in seen:
+                seen.add(k)
+                out.append(p)
+    if not out:
+        return unit
+    return out[0] if len(out) == 1 and isinstance(out[0], list) else [op, *out]
+
+def _fold_case(args):
+    if len(args) % 2 == 0:
+        return ["CASE", *args]
+    pairs, default = list(zip(args[0:-1:2], args[1:-1:2])), args[-1]
+    kept = []
+    for cond, value in pairs:
+        if cond is False:
+            continue
+        if cond is True:
+            if not kept:
+                return value
+            default = value
+            break
+        kept.append((cond, value))
+    if not kept:
+        return default
+    return ["CASE", *[x for pair in kept for x in pair], default]
+
+def fold(expr, subst=None):
+    subst = subst or {}
+    if isinstance(expr, str):
+        return subst.get(expr, expr)
+    if not isinstance(expr, list) or not expr:
+        return expr
+    op = expr[0]
+    if op == "VAR":
+        return subst.get(expr[1], expr) if len(expr) > 1 else expr
+    if op == "IFNULL" and len(expr) == 3:
+        return fold(expr[2] if expr[1] is None else expr[1], subst)
+    args = [fold(a, subst) for a in expr[1:]]
+    if op in ("AND", "OR"):
+        return _fold_junction(op, args)
+    if op == "NOT" and len(args) == 1:
+        a = args[0]
+        if isinstance(a, bool):
+            return not a
+        if isinstance(a, list) and a and a[0] == "NOT" and len(a) == 2:
+            return a[1]
+        return ["NOT", a]
+    if op == "IMPLIES" and len(args) == 2:
+        a, b = args
+        if a is False or b is True:
+            return True
+        if a is True:
+            return b
+        return ["IMPLIES", a, b]
+    if op in CMP and len(args) == 2:
+        return _fold_cmp(op, *args)
+    if op == "CASE":
+        return _fold_case(args)
+    folded = _fold_arith(op, args)
+    return folded if folded is not None else [op, *args]
+
+def _substitutions(constraints, referenced, keep):
+    # 可代入的定義：字面值，或只是 ["VAR", 其他] 的轉接（沿鏈解到底）
+    subst = {}
+    for c in constraints:
+        if c["id"] in referenced and c["id"] not in keep and (_is_lit(c["expr"]) or
+                                      (isinstance(c["expr"], list) and len(c["expr"]) == 2 and c["expr"][0] == "VAR")):
+            subst[c["id"]] = c["expr"]
+    for cid in list(subst):
+        value, seen = subst[cid], {cid}
+        while isinstance(value, list) and value[1] in subst and value[1] not in seen:
+            seen.add(value[1])
+            value = subst[value[1]]
+        if isinstance(value, list) and value[1] in seen:
+            del subst[cid]  # 循環引用留給編譯時報錯
+        else:
+            subst[cid] = value
+    return subst
+
+def simplify(constraints, keep=()):
+    # 回傳 (化簡後的 constraints, 報告)；keep 中的 id 保留，已不再被引用的定義除外（留下會變成規則）。
+    # 報告的 inlined：被內聯 / 合併而刪除的定義 → 字面值或 ["VAR", 代替者]，結果仍可回報其真假（見 core/results）
+    constraints = [dict(c if isinstance(c, dict) else c.model_dump()) for c in constraints]
+    keep = set(keep)
+    defined = referenced_ids(constraints)
+    before = {"constraints": len(constraints), "nodes": sum(size(c["expr"]) for c in constraints)}
+    dropped, inlined = [], {}
+    for _ in range(len(constraints) + 1):
+        referenced = referenced_ids(constraints)
+        subst = _substitutions(constraints, referenced, keep)
+        for c in constraints:
+            c["expr"] = fold(c["expr"], subst)
+
+        # 重複：同為規則（皆未被引用）刪後者；同為定義則把引用改指向保留者
+        alias, first = {}, {}
+        for c in constraints:
+            k = (c["id"] in referenced, _key(c["expr"]))
+            if k in first and c["id"] not in keep:
+                alias[c["id"]] = first[k]
+            else:
+                first.setdefault(k, c["id"])
+        if alias:
+            redirect = {cid: ["VAR", target] for cid, target in alias.items() if cid in referenced}
+            for c in constraints:
+                if c["id"] not in alias:
+                    c["expr"] = fold(c["expr"], redirect)
+
+        now = referenced_ids([c for c in constraints if c["id"] not in alias])
+        kept = []
+        for c in constraints:
+            cid, expr = c["id"], c["expr"]
+            # 不再被引用的定義、未被引用的數值定義、恆真規則 → 刪除
+            orphan = cid in defined and cid not in now
+            drop = cid in alias or (cid not in now and (orphan or cid in subst or _is_num(expr) or expr is True))
+            if drop and (cid not in keep or orphan):
+                dropped.append(cid)
+                if cid in alias and cid in referenced:
+                    inlined[cid] = ["VAR", alias[cid]]
+                elif cid in subst:
+                    inlined[cid] = subst[cid]
+                elif orphan and _is_lit(expr):
+                    inlined[cid] = expr
+            else:
+                kept.append(c)
+        changed = len(kept) != len(constraints) or subst or alias
+        constraints = kept
+        if not changed:
+            break
+    after = {"constraints": len(constraints), "nodes": sum(size(c["expr"]) for c in constraints)}
+    return constraints, {"before": before, "after": after, "dropped": dropped, "inlined": inlined}
+
+def used_names(constraints):
+    # constraint 中以字串或 VAR 出現的名稱
+    used = set()
+
+    def walk(expr):
+        if isinstance(expr, str):
+            used.add(expr)
+        elif isinstance(expr, list) and expr:
+            if expr[0] == "VAR" and len(expr) > 1:
+                used.add(expr[1])
+            else:
+                for e in expr[1:]:
+                    walk(e)
+
+    for c in constraints:
+        walk(c["expr"])
+    return used
+
+def prune_facts(constraints, varspec_facts):
+    used = used_names(constraints)
+    varspecs = [v for v in varspec_facts.get("varspecs", [])
+                if (v if isinstance(v, dict) else v.model_dump())["name"] in used]
+    facts = {k: v for k, v in varspec_facts.get("facts", {}).items() if k in used}
+    return {**varspec_facts, "varspecs": varspecs, "facts": facts}
@@ -0,0 +1,289 @@
+import time
+import threading
+from functools import partial
+from z3 import Optimize, Solver, Bool, Implies, Z3Exception, set_param, sat, unsat
+from .dsl import RuleBase, RULE_LABEL, FACT_LABEL, derived_defs
+from .results import py_value
+from .vectorize import VectorRules
+from .simplify import used_names
+from .rulecache import RuleBaseCache, rulebase_key
+from .executor import ProcessExecutor, is_memout
+from .portfolio import Portfolio, Race
+
+# Z3 的預設 context 不是 thread-safe；--workers 並行時求解需序列化
+Z3_LOCK = threading.Lock()
+
+COMPILE_ERRORS = (ValueError, KeyError, IndexError, Z3Exception)
+
+def _failed(e):
+    # Z3 配置失敗（RLIMIT_AS 下的 "out of memory"）不是規則的錯：記為 memout，core/executor 會換掉該 worker
+    return {"status": "memout" if is_memout(e) else "error", "error": str(e)}
+
+# auto：先以 plain Solver 把 facts 當作假設（assumption）檢查，facts 與規則衝突（unsat）
+#       時才改用 Optimize 把 facts 視為 soft 放寬；optimize：一律 Optimize（舊行為）；
+# portfolio：與 auto 相同的流程，依規則的理論同時跑幾種求解設定，取最先完成者（core/portfolio）
+SOLVE_MODES = ("auto", "optimize", "portfolio")
+
+def _compile(constraints, varspecs, rule_cache=None):
+    if rule_cache is not None:
+        return rule_cache.load_or_compile(constraints, varspecs)
+    return RuleBase(constraints, varspecs)
+
+def solve_case(constraints, varspec_facts, rule_base=None, rule_cache=None, mode="auto"):
+    with Z3_LOCK:
+        return _solve_case(constraints, varspec_facts, rule_base, rule_cache, mode)
+
+def _solve_case(constraints, varspec_facts, rule_base=None, rule_cache=None, mode="auto"):
+    # 與 generate_z3_solver_code 相同的語意（facts 為 soft、constraint 以 id 追蹤），
+    # 但直接在行程內建構 Z3 AST 求解，不產生、不 exec Python 程式碼
+    try:
+        rb = rule_base or _compile(constraints, varspec_facts.get("varspecs", []), rule_cache)
+        if mode == "portfolio":
+            return Portfolio(rb).prepare(varspec_facts).run(partial(_attempt, varspec_facts=varspec_facts))
+        fast = None
+        if mode == "auto":
+            fast = _fast_check(_assert_rules(Solver(), rb), rb, varspec_facts)
+            if "fact_core" not in fast:
+                return {**fast, "path": "fast"}
+        s = _assert_rules(Optimize(), rb)
+        _add_facts(s, rb, varspec_facts)
+        return _relaxed(_check(s, rb), fast)
+    except COMPILE_ERRORS as e:
+        return _failed(e)
+
+def _assert_rules(s, rb):
+    for cid, term in rb.assertions:
+        s.assert_and_track(term, RULE_LABEL + cid)
+    return s
+
+def _add_facts(s, rb, varspec_facts):
+    for name, value in varspec_facts.get("facts", {}).items():
+        fact = rb.fact(name, value)
+        if fact is not None:
+            s.add_soft(fact)
+
+def _fact_literals(s, rb, varspec_facts):
+    # 每個 fact 以 `fact!<name> → fact` 加入，check() 時以假設字面值啟用
+    literals = []
+    for name, value in varspec_facts.get("facts", {}).items():
+        fact = rb.fact(name, value)
+        if fact is not None:
+            literal = Bool(FACT_LABEL + name, fact.ctx)
+            s.add(Implies(literal, fact))
+            literals.append(literal)
+    return literals
+
+def _fast_check(s, rb, varspec_facts):
+    # facts 全部當假設檢查；衝突時依 unsat core 逐一試著只放寬一個 fact（結論型變數優先），
+    # 任一可滿足即為代價 1 的最佳解（與 Optimize 的最佳值相同）；都不行才回傳帶 fact_core 的 unsat
+    literals = _fact_literals(s, rb, varspec_facts)
+    out = _check(s, rb, literals)
+    if "fact_core" not in out:
+        return out
+    elapsed = out["solve_time"]
+    derived = derived_defs(rb.constraints)
+    # 同一優先順序內依名稱排序：放寬哪個 fact 不取決於 unsat core 的順序
+    for name in sorted(out["fact_core"], key=lambda n: (n not in derived, n)):
+        retry = _check(s, rb, [lit for lit in literals if str(lit) != FACT_LABEL + name])
+        elapsed += retry["solve_time"]
+        if retry["status"] == "sat":
+            return {**retry, "solve_time": elapsed, "relaxed": [name]}
+    out["solve_time"] = elapsed
+    return out
+
+def _attempt(rb, make_solver, engine, varspec_facts):
+    # portfolio 的一個策略：auto 流程，但 Solver 與 Optimize 的設定由策略決定
+    fast = _fast_check(_assert_rules(make_solver(rb.ctx), rb), rb, varspec_facts)
+    if "fact_core" not in fast:
+        return {**fast, "path": "fast"}
+    s = Optimize(ctx=rb.ctx)
+    s.set(maxsat_engine=engine)
+    _assert_rules(s, rb)
+    _add_facts(s, rb, varspec_facts)
+    return _relaxed(_check(s, rb), fast)
+
+def _relaxed(out, fast=None):
+    # Optimize 路徑的結果；solve_time 含先前 fast path 失敗的時間
+    if fast is not None:
+        out["solve_time"] += fast["solve_time"]
+    out["path"] = "optimize"
+    return out
+
+def _check(s, rb, assumptions=()):
+    t0 = time.perf_counter()
+    result = s.check(*assumptions)
+    out = {"status": str(result), "solve_time": time.perf_counter() - t0}
+    if result == sat:
+        m = s.model()
+        out["model"] = {name: py_value(m.eval(term, model_completion=True)) for name, term in rb.env.items()}
+        out["penalty"] = out["model"].get("penalty")
+    elif result == unsat:
+        core = [str(c) for c in s.unsat_core()]
+        out["unsat_core"] = [c[len(RULE_LABEL):] for c in core if c.startswith(RULE_LABEL)]
+        facts = [c[len(FACT_LABEL):] for c in core if c.startswith(FACT_LABEL)]
+        if facts:
+            out["fact_core"] = facts
+    else:
+        # timeout / rlimit / 記憶體上限：Z3 放棄，原因如 "canceled"、"max. resource limit exceeded"
+        out["reason"] = s.reason_unknown()
+    return out
+
+class _Compiled:
+    # 一組變數型別下編譯好的規則庫，與其上常駐的 Solver（auto）/ Optimize（第一次需要放寬時才建立）
+    def __init__(self, constraints, varspecs, rule_cache, mode):
+        self.rule_base = self.solver = self.optimizer = self.portfolio = self.error = None
+        try:
+            self.rule_base = _compile(constraints, varspecs, rule_cache)
+            if mode == "portfolio":
+                self.portfolio = Portfolio(self.rule_base)
+            elif mode == "auto":
+                self.solver = _assert_rules(Solver(), self.rule_base)
+        except COMPILE_ERRORS as e:
+            self.error = _failed(e)
+
+    def _optimizer(self):
+        if self.optimizer is None:
+            self.optimizer = _assert_rules(Optimize(), self.rule_base)
+        return self.optimizer
+
+    def solve(self, varspec_facts):
+        fast = None
+        try:
+            if self.solver is not None:
+                self.solver.push()
+                try:
+                    fast = _fast_check(self.solver, self.rule_base, varspec_facts)
+                finally:
+                    self.solver.pop()
+                if "fact_core" not in fast:
+                    return {**fast, "path": "fast"}
+            s = self._optimizer()
+            s.push()
+            try:
+                _add_facts(s, self.rule_base, varspec_facts)
+                return _relaxed(_check(s, self.rule_base), fast)
+            finally:
+                s.pop()
+        except COMPILE_ERRORS as e:
+            return _failed(e)
+
+class BatchSolver:
+    # 共用同一組 ConstraintSpec[] 的案例只編譯、assert 一次規則，
+    # 每個案例的 facts 在 push()/pop() 之間換入。規則依案例對「規則用到的變數」宣告的型別分別編譯，
+    # 型別相同的案例共用同一份，結果不取決於哪個案例先到（--workers 並行時也一樣）。
+    # vectorize 時 facts 齊全的案例先以 core/vectorize 直接求值，確定不了的才進 Z3；
+    # main 以 evaluate() 一次送進一整批案例，solve() 則只算單一案例
+    # executor（solve_executor()）給定時，需要 Z3 的案例改送到子行程求解，不佔 Z3_LOCK
+    def __init__(self, constraints, rule_cache=None, mode="auto", vectorize=True, executor=None):
+        self.constraints = constraints
+        self.rule_cache = rule_cache
+        self.mode = mode
+        self.vectorize = vectorize
+        self.executor = executor
+        self.used = used_names(constraints)
+        self.compiled = {}   # 型別 → _Compiled
+        self.vectors = {}    # 型別 → VectorRules
+        self.paths = {"vector": 0, "fast": 0, "optimize": 0}
+        self._lock = threading.Lock()
+
+    def _types(self, varspecs):
+        types = {}
+        for v in varspecs:
+            v = v if isinstance(v, dict) else v.model_dump()
+            if v["name"] in self.used:
+                types[v["name"]] = v["type"]
+        return tuple(sorted(types.items()))
+
+    def _vector(self, varspecs):
+        key = self._types(varspecs)
+        with self._lock:
+            if key not in self.vectors:
+                self.vectors[key] = VectorRules(self.constraints, varspecs)
+            return self.vectors[key]
+
+    def evaluate(self, cases):
+        # 整批案例一次以 NumPy 求值（純 NumPy，不碰 Z3，不需要 Z3_LOCK）；變數型別相同的案例同一次求值。
+        # 回傳與 cases 對應的結果，確定不了的為 None，之後以 solve(..., vectorize=False) 交給 Z3
+        out = [None] * len(cases)
+        if not self.vectorize:
+            return out
+        groups = {}
+        for i, varspec_facts in enumerate(cases):
+            groups.setdefault(self._types(varspec_facts.get("varspecs", [])), []).append(i)
+        for rows in groups.values():
+            vector = self._vector(cases[rows[0]].get("varspecs", []))
+            for i, result in zip(rows, vector.evaluate_cases([cases[i] for i in rows], self.mode)):
+                if result is not None:
+                    out[i] = self._count(result)
+        return out
+
+    def solve(self, varspec_facts, vectorize=True):
+        if self.vectorize and vectorize:
+            out = self.evaluate([varspec_facts])[0]
+            if out is not None:
+                return out
+        if self.executor is not None:
+            return self._count(self.executor.call(solve_pooled, self.constraints, varspec_facts, self.mode))
+        with Z3_LOCK:
+            out = self._solve_local(varspec_facts)
+        if isinstance(out, Race):
+            # 各策略已 translate 到自己的 Context，競賽不佔 Z3_LOCK
+            out = out.run(partial(_attempt, varspec_facts=varspec_facts))
+        return self._count(out)
+
+    def _count(self, out):
+        if out.get("path") in self.paths:
+            with self._lock:
+                self.paths[out["path"]] += 1
+        return out
+
+    def _solve_local(self, varspec_facts):
+        # 需持有 Z3_LOCK
+        varspecs = varspec_facts.get("varspecs", [])
+        key = self._types(varspecs)
+        if key not in self.compiled:
+            self.compiled[key] = _Compiled(self.constraints, varspecs, self.rule_cache, self.mode)
+        compiled = self.compiled[key]
+        if compiled.error is not None:
+            if compiled.error["status"] == "memout":
+                del self.compiled[key]  # 記憶體不足不是規則的錯，下次重新編譯
+            return compiled.error
+        if compiled.portfolio is not None:
+            return compiled.portfolio.prepare(varspec_facts)
+        return compiled.solve(varspec_facts)
+
+### === 行程池求解（core/executor）===
+# 每個 worker 子行程依規則集各保留一個 BatchSolver（規則只編譯一次）；Z3 的 timeout / rlimit
+# 是每次 check() 的上限，一個案例可能 check 數次，整個案例的 wall-clock 由 executor 強制
+_worker_state = {"batches": {}, "rule_cache": None}
+
+def z3_limits(timeout=None, rlimit=None, memory_mb=None):
+    # timeout 秒；逾時 / 超過 rlimit 的 check() 回傳 unknown 而不是一直跑下去
+    if timeout:
+        set_param("timeout", int(timeout * 1000))
+    if rlimit:
+        set_param("rlimit", int(rlimit))
+    if memory_mb:
+        set_param("memory_max_size", int(memory_mb))
+
+def _init_worker(timeout, rlimit, memory_mb, rule_cache_dir, rule_cache_max):
+    # Z3 自己的配置上限比 RLIMIT_AS 低一些，先以 Z3 例外收場
+    z3_limits(timeout, rlimit, memory_mb and int(memory_mb * 0.8))
+    if rule_cache_dir:
+        _worker_state["rule_cache"] = RuleBaseCache(rule_cache_dir, max_entries=rule_cache_max)
+
+def solve_pooled(constraints, varspec_facts, mode="auto"):
+    # 在 worker 子行程執行；向量化已在父行程做過
+    batches = _worker_state["batches"]
+    key = rulebase_key(constraints)
+    if key not in batches:
+        batches[key] = BatchSolver(constraints, _worker_state["rule_cache"], mode, vectorize=False)
+    return batches[key].solve(varspec_facts)
+
+def solve_executor(workers=None, timeout=None, memory_mb=None, rlimit=None, rule_cache=None, max_tasks=None):
+    # timeout 為每次 check() 的 Z3 上限；案例的 wall-clock 上限給到兩倍再加 1 秒，
+    # 讓 Z3 有機會先回 unknown，executor 只處理真的卡住（或 Z3 不檢查 timeout）的情況
+    wall = timeout * 2 + 1 if timeout else None
+    cache_args = (str(rule_cache.root), rule_cache.max_entries) if rule_cache is not None else (None, 0)
+    return ProcessExecutor(workers, timeout=wall, memory_mb=memory_mb, max_tasks=max_tasks,
+                           initializer=_init_worker, initargs=(timeout, rlimit, memory_mb, *cache_args))
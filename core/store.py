@@ -0,0 +1,154 @@
+import json
+import time
+import threading
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 選用相依：pip install 'compliance-case-automatic[store]'
+    pa = None
+
+# 彙整式產出：constraints / varspecs / facts / results / dialogs 五張 Parquet 表，
+# 以 run=<run_id> 分區（hive 目錄），每累積 batch_size 個案例整批寫出一個 part 檔。
+# 讀取端以 pyarrow.dataset 跨 run 掃描，不需逐案例開檔。
+
+TABLES = ("constraints", "varspecs", "facts", "results", "dialogs")
+
+def _schemas():
+    string, double, boolean = pa.string(), pa.float64(), pa.bool_()
+    return {
+        "constraints": pa.schema([
+            ("case_id", string), ("id", string), ("desc", string), ("expr", string),
+            ("weight", double), ("domain", string),
+        ]),
+        "varspecs": pa.schema([
+            ("case_id", string), ("name", string), ("type", string), ("source", string),
+        ]),
+        "facts": pa.schema([
+            ("case_id", string), ("name", string), ("value", string),
+            ("num", double), ("bool", boolean),
+        ]),
+        "results": pa.schema([
+            ("case_id", string), ("status", string), ("path", string), ("penalty", boolean),
+            ("solve_time", double), ("violated", pa.list_(string)), ("relaxed", pa.list_(string)),
+            ("model", string), ("rules", string), ("error", string),
+        ]),
+        "dialogs": pa.schema([
+            ("case_id", string), ("agent", string), ("turn", pa.int32()),
+            ("role", string), ("content", string),
+        ]),
+    }
+
+def _require():
+    if pa is None:
+        raise ImportError("Parquet store requires pyarrow: pip install 'compliance-case-automatic[store]'")
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False)
+
+def _fact_row(case_id, name, value):
+    is_bool = isinstance(value, bool)
+    return {
+        "case_id": case_id, "name": name, "value": _json(value),
+        "num": float(value) if isinstance(value, (int, float)) and not is_bool else None,
+        "bool": value if is_bool else None,
+    }
+
+def _penalty(value):
+    return value if isinstance(value, bool) else None
+
+class ParquetStore:
+    def __init__(self, root, run_id=None, batch_size=1000):
+        _require()
+        self.root = Path(root)
+        self.run_id = run_id or time.strftime("%Y%m%dT%H%M%S")
+        self.batch_size = batch_size
+        self.schemas = _schemas()
+        self.rows = {name: [] for name in TABLES}
+        self.pending = 0
+        self.parts = 0
+        # process_case 在多個 worker thread 中呼叫 add_case
+        self.lock = threading.Lock()
+
+    def add_case(self, case_id, constraints, varspec_facts, result=None,
+                 parser_messages=None, mapper_messages=None):
+        rows = {name: [] for name in TABLES}
+        for c in constraints:
+            rows["constraints"].append({
+                "case_id": case_id, "id": c["id"], "desc": c.get("desc"), "expr": _json(c["expr"]),
+                "weight": 1.0 if c.get("weight") is None else float(c["weight"]), "domain": c.get("domain"),
+            })
+        for v in varspec_facts.get("varspecs", []):
+            rows["varspecs"].append({"case_id": case_id, **{k: v.get(k) for k in ("name", "type", "source")}})
+        for name, value in varspec_facts.get("facts", {}).items():
+            rows["facts"].append(_fact_row(case_id, name, value))
+        if result is not None:
+            rows["results"].append({
+                "case_id": case_id, "status": result["status"], "path": result.get("path"),
+                "penalty": _penalty(result.get("penalty")), "solve_time": result.get("solve_time"),
+                "violated": result.get("violated", []), "relaxed": result.get("relaxed", []),
+                "model": _json(result.get("model", {})), "rules": _json(result.get("rules", {})),
+                "error": result.get("error"),
+            })
+        for agent, messages in (("parser", parser_messages), ("mapper", mapper_messages)):
+            for turn, m in enumerate(messages or []):
+                rows["dialogs"].append({
+                    "case_id": case_id, "agent": agent, "turn": turn, "role": m["role"], "content": m["content"],
+                })
+        with self.lock:
+            for name in TABLES:
+                self.rows[name].extend(rows[name])
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        for name in TABLES:
+            if not self.rows[name]:
+                continue
+            part = self.root / name / f"run={self.run_id}" / f"part-{self.parts:05d}.parquet"
+            part.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(pa.Table.from_pylist(self.rows[name], schema=self.schemas[name]), part)
+            self.rows[name] = []
+        self.parts += 1
+        self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+class StoreReader:
+    def __init__(self, root):
+        _require()
+        self.root = Path(root)
+
+    def runs(self):
+        return sorted(p.name.split("=", 1)[1] for p in (self.root / "results").glob("run=*"))
+
+    def table(self, name, columns=None, run=None, filter=None):
+        # 回傳 pyarrow.Table，含分區欄位 run；run 可為單一 run_id 或清單
+        dataset = ds.dataset(self.root / name, format="parquet", partitioning="hive")
+        expr = filter
+        if run is not None:
+            runs = [run] if isinstance(run, str) else list(run)
+            by_run = ds.field("run").isin(runs)
+            expr = by_run if expr is None else expr & by_run
+        return dataset.to_table(columns=columns, filter=expr)
+
+    def violating(self, rule_id, run=None, columns=None):
+        # 所有 violated 含 rule_id 的案例（results 表的列）
+        if columns is not None and "violated" not in columns:
+            columns = [*columns, "violated"]
+        t = self.table("results", columns=columns, run=run)
+        violated = t["violated"]
+        hits = pc.equal(pc.list_flatten(violated), rule_id)
+        rows = pc.unique(pc.filter(pc.list_parent_indices(violated), hits))
+        return t.take(rows)
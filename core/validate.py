@@ -0,0 +1,263 @@
+import math
+from pydantic import ValidationError
+from .dsl import OPS
+from .schema import VarSpec, ConstraintSpec
+
+# 求解前的靜態檢查：依 core/dsl 的編譯規則走訪 expr，檢查運算子、參數個數與型別（Bool / Int / Real），
+# 不建立任何 Z3 物件。錯誤為 {"kind", "where", "message"}，kind 為 constraint / varspec / fact；
+# where 指到出錯的子式，例如 `law:1 expr[2][1]`。
+# - 只有 constraints（法條解析階段）時，未宣告的變數型別視為未知，不報型別錯誤
+# - 給了 varspec_facts（案例解析後）時，未宣告的變數依 core/dsl 的預設：字串為 Real、VAR 為 Bool
+# - CASE 的值全是裸字串（例如 "inadequate"）且都不是 constraint id 時視為字串標籤：DSL 沒有 String sort，
+#   這些名稱會被當成互不相關的 Real 變數（即使 mapper 替它們填了 fact），分類比較失去意義
+
+NUM = ("Int", "Real")
+BOOL_OPS = {"AND", "OR"}
+CMP_OPS = {"GE", "LE", "GT", "LT"}
+# op → (最少, 最多) 參數個數；None 為不限
+ARITY = {
+    "AND": (1, None), "OR": (1, None), "NOT": (1, 1), "IMPLIES": (2, 2),
+    "EQ": (2, 2), "GE": (2, 2), "LE": (2, 2), "GT": (2, 2), "LT": (2, 2),
+    "VAR": (1, 1), "CASE": (3, None),
+    "ADD": (1, None), "SUB": (1, None), "MUL": (1, None), "DIV": (2, None),
+    "SUM": (1, None), "AVG": (1, None), "MIN": (1, None), "MAX": (1, None),
+    "ABS": (1, 1), "POW": (2, 2), "ROUND": (1, 2), "FLOOR": (1, 1), "CEIL": (1, 1),
+    "IFNULL": (2, 2), "PERCENT": (1, 1),
+}
+
+def format_errors(errors, limit=None):
+    lines = [f"{e['where']}: {e['message']}" for e in errors[:limit]]
+    if limit is not None and len(errors) > limit:
+        lines.append(f"... (+{len(errors) - limit} more)")
+    return "\n".join(lines)
+
+def _path(path):
+    return "expr" + "".join(f"[{i}]" for i in path)
+
+def _numeric(sort):
+    return sort is None or sort in NUM
+
+def _boolean(sort):
+    return sort is None or sort == "Bool"
+
+def _arith(sorts):
+    if any(s is None for s in sorts):
+        return None
+    return "Int" if all(s == "Int" for s in sorts) else "Real"
+
+def _desc(expr):
+    return expr[0] if isinstance(expr, list) and expr else repr(expr)
+
+class Checker:
+    def __init__(self, constraints, varspec_facts=None):
+        self.constraints = constraints
+        self.defs = {c["id"]: c["expr"] for c in constraints}
+        self.declared = varspec_facts is not None
+        self.types = {}
+        if varspec_facts is not None:
+            for v in varspec_facts.get("varspecs", []):
+                v = v if isinstance(v, dict) else v.model_dump()
+                if isinstance(v, dict) and isinstance(v.get("name"), str):
+                    self.types[v["name"]] = v.get("type")
+        self.labels = self._labels()
+        self.errors = []
+        self.sorts = {}        # constraint id → 推得的 sort
+        self._checking = []
+
+    def error(self, kind, where, message):
+        self.errors.append({"kind": kind, "where": where, "message": message})
+
+    def _labels(self):
+        # 所有分支值皆為裸字串、且都不是 constraint id 的 CASE 值
+        labels = set()
+
+        def walk(expr):
+            if not isinstance(expr, list) or not expr:
+                return
+            if expr[0] == "CASE" and len(expr) >= 4 and len(expr) % 2 == 0:
+                values = [*expr[2:-1:2], expr[-1]]
+                if all(isinstance(v, str) and v not in self.defs for v in values):
+                    labels.update(values)
+            for e in expr[1:]:
+                walk(e)
+
+        for c in self.constraints:
+            walk(c["expr"])
+        return labels
+
+    def name_sort(self, name, default):
+        if name in self.defs:
+            return self.constraint_sort(name)
+        if name in self.types:
+            return self.types[name] if self.types[name] in ("Bool", *NUM) else None
+        return default if self.declared else None
+
+    def constraint_sort(self, cid):
+        if cid in self.sorts:
+            return self.sorts[cid]
+        if cid in self._checking:
+            cycle = " → ".join([*self._checking[self._checking.index(cid):], cid])
+            self.error("constraint", cid, f"cyclic VAR reference: {cycle}")
+            return None
+        self._checking.append(cid)
+        try:
+            self.sorts[cid] = self.expr(self.defs[cid], cid, ())
+        finally:
+            self._checking.pop()
+        return self.sorts[cid]
+
+    def expr(self, expr, cid, path):
+        where = f"{cid} {_path(path)}"
+        if isinstance(expr, bool):
+            return "Bool"
+        if isinstance(expr, int):
+            return "Int"
+        if isinstance(expr, float):
+            return "Real"
+        if isinstance(expr, str):
+            return self.name_sort(expr, "Real")
+        if not isinstance(expr, list) or not expr:
+            self.error("constraint", where, f"malformed expression {expr!r}")
+            return None
+        op, args = expr[0], expr[1:]
+        if not isinstance(op, str) or op not in OPS:
+            self.error("constraint", where, f"unknown op {op!r}")
+            return None
+        lo, hi = ARITY[op]
+        if len(args) < lo or (hi is not None and len(args) > hi):
+            expected = f"{lo}" if lo == hi else f"at least {lo}" if hi is None else f"{lo}-{hi}"
+            self.error("constraint", where, f"{op} expects {expected} argument(s), got {len(args)}")
+            return None
+
+        if op == "VAR":
+            if not isinstance(args[0], str):
+                self.error("constraint", where, f"VAR expects a name, got {args[0]!r}")
+                return None
+            return self.name_sort(args[0], "Bool")
+        if op == "IFNULL":
+            chosen = 2 if args[0] is None else 1
+            return self.expr(expr[chosen], cid, (*path, chosen))
+        if op == "ROUND" and len(args) > 1 and (not isinstance(args[1], int) or isinstance(args[1], bool)):
+            self.error("constraint", f"{cid} {_path((*path, 2))}", f"ROUND digits must be an integer literal, got {args[1]!r}")
+            return None
+
+        sorts = [self.expr(a, cid, (*path, i)) for i, a in enumerate(args, 1)]
+
+        def need(test, i, what):
+            if not test(sorts[i - 1]):
+                self.error("constraint", f"{cid} {_path((*path, i))}",
+                           f"{op} expects {what} operand, got {sorts[i - 1]} ({_desc(args[i - 1])})")
+                return False
+            return True
+
+        if op in BOOL_OPS or op in ("NOT", "IMPLIES"):
+            for i in range(1, len(args) + 1):
+                need(_boolean, i, "a Bool")
+            return "Bool"
+        if op in CMP_OPS:
+            for i in (1, 2):
+                need(_numeric, i, "a numeric")
+            return "Bool"
+        if op == "EQ":
+            for i, a in enumerate(args, 1):
+                if isinstance(a, str) and a in self.labels:
+                    self.error("constraint", f"{cid} {_path((*path, i))}",
+                               f"EQ compares with string label {a!r}; the DSL has no String sort — "
+                               "encode each category as a Bool constraint and reference it with VAR")
+                    return "Bool"
+            a, b = sorts
+            if a is not None and b is not None and (a == "Bool") != (b == "Bool"):
+                self.error("constraint", where, f"EQ operands have incompatible sorts {a} and {b}")
+            return "Bool"
+        if op == "CASE":
+            if len(args) % 2 == 0:
+                self.error("constraint", where, "CASE expects cond/value pairs followed by a default")
+                return None
+            for i in range(1, len(args), 2):
+                need(_boolean, i, "a Bool condition")
+            values = [(i, sorts[i - 1]) for i in (*range(2, len(args), 2), len(args))]
+            if any(isinstance(args[i - 1], str) and args[i - 1] in self.labels for i, _ in values):
+                labels = ", ".join(repr(args[i - 1]) for i, _ in values)
+                self.error("constraint", where,
+                           f"CASE values {labels} are string labels; the DSL has no String sort — "
+                           "encode each category as a Bool constraint and reference it with VAR")
+                return None
+            known = [s for _, s in values if s is not None]
+            if any(s == "Bool" for s in known) and any(s in NUM for s in known):
+                self.error("constraint", where, f"CASE values mix Bool and numeric sorts: {', '.join(map(str, known))}")
+                return None
+            if any(s is None for _, s in values):
+                return None
+            return "Bool" if known[0] == "Bool" else _arith(known)
+
+        # 其餘皆為算術
+        for i in range(1, len(args) + 1):
+            need(_numeric, i, "a numeric")
+        if op in ("DIV", "AVG", "PERCENT", "ROUND"):
+            return "Real"
+        if op in ("FLOOR", "CEIL"):
+            return "Int"
+        if op == "POW":
+            return None
+        return _arith(sorts)
+
+def _schema_errors(kind, items, model, where):
+    errors, ok = [], []
+    for i, item in enumerate(items):
+        try:
+            ok.append(model(**item).model_dump() if isinstance(item, dict) else item.model_dump())
+        except (TypeError, AttributeError):
+            errors.append({"kind": kind, "where": where(i, item), "message": f"expected an object, got {item!r}"})
+        except ValidationError as e:
+            for err in e.errors():
+                field = ".".join(str(x) for x in err["loc"])
+                errors.append({"kind": kind, "where": where(i, item), "message": f"{field}: {err['msg']}"})
+    return errors, ok
+
+def _name(i, item, key):
+    return item[key] if isinstance(item, dict) and isinstance(item.get(key), str) else f"#{i}"
+
+def validate(constraints, varspec_facts=None):
+    # 回傳錯誤清單（空清單即通過）；varspec_facts 為 None 時只檢查 constraints
+    if not isinstance(constraints, list):
+        return [{"kind": "constraint", "where": "constraints", "message": f"expected a JSON array, got {type(constraints).__name__}"}]
+    errors, constraints = _schema_errors("constraint", constraints, ConstraintSpec, lambda i, c: _name(i, c, "id"))
+    seen = set()
+    for c in constraints:
+        if c["id"] in seen:
+            errors.append({"kind": "constraint", "where": c["id"], "message": "duplicate constraint id"})
+        seen.add(c["id"])
+
+    if varspec_facts is not None:
+        if not isinstance(varspec_facts, dict):
+            errors.append({"kind": "varspec", "where": "varspec_facts", "message": "expected a JSON object"})
+            varspec_facts = None
+        else:
+            varspec_facts, facts = dict(varspec_facts), varspec_facts.get("facts") or {}
+            spec_errors, varspec_facts["varspecs"] = _schema_errors(
+                "varspec", varspec_facts.get("varspecs") or [], VarSpec, lambda i, v: f"varspecs {_name(i, v, 'name')}")
+            errors += spec_errors
+            if not isinstance(facts, dict):
+                errors.append({"kind": "fact", "where": "facts", "message": "expected a JSON object"})
+                facts = {}
+            varspec_facts["facts"] = facts
+            types = {v["name"]: v["type"] for v in varspec_facts["varspecs"]}
+            for name, value in facts.items():
+                where = f"facts {name}"
+                if isinstance(value, str):
+                    errors.append({"kind": "fact", "where": where,
+                                   "message": f"string value {value!r}; facts must be Real, Int or Bool"})
+                elif value is not None and not isinstance(value, (bool, int, float)):
+                    errors.append({"kind": "fact", "where": where,
+                                   "message": f"unsupported value {value!r}; facts must be Real, Int or Bool"})
+                elif isinstance(value, float) and not math.isfinite(value):
+                    # json.loads 接受 NaN / Infinity，但 Z3 沒有對應的數值
+                    errors.append({"kind": "fact", "where": where, "message": f"non-finite value {value!r}"})
+                elif types.get(name) == "Bool" and not isinstance(value, bool) and value not in (0, 1, None):
+                    errors.append({"kind": "fact", "where": where, "message": f"Bool variable has value {value!r}"})
+
+    # 非布林的 constraint 會被綁定為定義（id == expr），頂層 sort 不限
+    checker = Checker(constraints, varspec_facts)
+    for c in constraints:
+        checker.constraint_sort(c["id"])
+    return errors + checker.errors
@@ -0,0 +1,309 @@
+import time
+import numpy as np
+from .dsl import referenced_ids, derived_defs
+from .validate import Checker, format_errors
+
+# facts 齊全的案例不需要 SMT 搜尋：把 ConstraintSpec[] 直接在 facts 表（一列一案例、一欄一變數）上
+# 以 NumPy 向量化求值，一次算完整批案例的每條 constraint 與 penalty。
+# 與 core/solve 的 auto 模式結果一致的列才直接回傳（path="vector"），其餘回傳 None 交給 Z3：
+# - 用到的原始變數缺值（沒有 fact、null 或字串）
+# - 有規則在這組 facts 下不成立（Z3 會放寬某個原始 fact 或判定 unsat）
+# - 結論型變數（頂層 ["EQ", name, expr] 規則定義的 name，如 penalty）與 mapper 所填的 fact
+#   有超過一個不一致（auto 模式只放寬一個；optimize 模式不允許任何放寬）
+# - 數值比較的兩側在浮點誤差內相等、除以 0 等浮點與 Z3 有理數語意可能不同的列
+# model 中計算出的數值以 float64 求得，與 Z3 的有理數結果可能差在最後一位。
+
+TOL = 1e-9
+EXACT_LIMIT = 2.0 ** 53
+
+def _is_value(v):
+    return isinstance(v, (bool, int, float, np.number, np.bool_)) and v == v
+
+def _column(values, n):
+    # 一欄 facts → (float64 值, 是否有值)
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        nums = values.astype(np.float64)
+        known = ~np.isnan(nums)
+        return np.where(known, nums, 0.0), known
+    values = np.asarray(values, dtype=object)
+    known = np.fromiter((_is_value(v) for v in values), dtype=bool, count=n)
+    return np.where(known, values, 0.0).astype(np.float64), known
+
+def _table(table):
+    # pandas.DataFrame 或 {name: 序列} → ({name: (值, 是否有值)}, 列數)
+    columns = getattr(table, "columns", None)
+    if columns is not None:
+        data = {name: table[name].to_numpy() for name in columns}
+        n = len(table)
+    else:
+        data = dict(table)
+        n = len(next(iter(data.values()))) if data else 0
+    return {name: _column(values, n) for name, values in data.items()}, n
+
+def facts_table(cases):
+    # varspec_facts 清單 → {name: [每案例的 fact 或 None]}
+    names = {}
+    for varspec_facts in cases:
+        names.update(dict.fromkeys(varspec_facts.get("facts", {})))
+    return {name: [vf.get("facts", {}).get(name) for vf in cases] for name in names}
+
+def _integral(x):
+    return (np.floor(x) == x) & (np.abs(x) < EXACT_LIMIT)
+
+def _cast(sort, value):
+    if sort == "Bool":
+        return bool(value)
+    if sort == "Int":
+        return int(value)
+    return float(value)
+
+class VectorRules:
+    def __init__(self, constraints, varspecs=()):
+        self.constraints = [c if isinstance(c, dict) else c.model_dump() for c in constraints]
+        self.varspecs = [v if isinstance(v, dict) else v.model_dump() for v in varspecs]
+        self.types = {v["name"]: v["type"] for v in self.varspecs}
+        self.defs = {c["id"]: c["expr"] for c in self.constraints}
+        self.checker = Checker(self.constraints, {"varspecs": self.varspecs, "facts": {}})
+        self.sorts = {cid: self.checker.constraint_sort(cid) for cid in self.defs}
+        self.error = format_errors(self.checker.errors) if self.checker.errors else None
+        if self.error is None and None in self.sorts.values():
+            self.error = "constraint sort cannot be inferred"
+
+        # 與 RuleBase 相同：未被引用的布林 constraint 為規則，其餘綁定為定義（出現在 model 中）
+        referenced = referenced_ids(self.constraints)
+        self.rules = [cid for cid in self.defs if cid not in referenced and self.sorts[cid] == "Bool"]
+        self.defined = [cid for cid in self.defs if cid not in self.rules]
+        self.derived = derived_defs(self.constraints)
+        self.names = set()
+        for c in self.constraints:
+            self._names(c["expr"])
+
+    def _names(self, expr):
+        if isinstance(expr, str):
+            if expr not in self.defs:
+                self.names.add(expr)
+        elif isinstance(expr, list) and expr:
+            if expr[0] == "VAR":
+                if len(expr) > 1 and expr[1] not in self.defs:
+                    self.names.add(expr[1])
+            else:
+                for e in expr[1:]:
+                    self._names(e)
+
+    def sort(self, name):
+        return self.checker.name_sort(name, "Real")
+
+    def evaluate(self, table, mode="auto"):
+        # 回傳每列的求解結果 dict（格式同 core/solve）；無法確定與 Z3 一致的列為 None
+        t0 = time.perf_counter()
+        columns, n = _table(table)
+        if self.error is not None or n == 0:
+            return [None] * n
+        run = _Pass(self, columns, n)
+        try:
+            with np.errstate(all="ignore"):
+                holds = np.ones(n, dtype=bool)
+                for cid in self.rules:
+                    holds &= run.constraint(cid)[0]
+                # 定義與 model 中的每個變數都先算過，缺值 / 不確定的列才完整
+                for cid in self.defined:
+                    run.constraint(cid)
+                for name in self.names:
+                    run.name(name, "Real")
+                # 結論型變數與定義的 fact 若與計算結果不同，Z3 會放寬該 fact
+                relaxable = [name for name in (*self.derived, *self.defined) if name in columns]
+                mismatch = {name: run.mismatch(name) for name in relaxable}
+        except ValueError:  # 結論型變數互相定義
+            return [None] * n
+        for cid in self.rules:
+            # 規則 id 的 fact 在 Z3 中是另一個自由變數，不在此處理
+            if cid in columns:
+                run.unsure |= columns[cid][1]
+        n_mismatch = sum((m.astype(int) for m in mismatch.values()), np.zeros(n, dtype=int))
+        ok = holds & ~run.missing & ~run.unsure & (n_mismatch <= (0 if mode == "optimize" else 1))
+        rows = np.flatnonzero(ok)
+        if not len(rows):
+            return [None] * n
+
+        # 逐列組 model：原始變數 + 定義 + 結論型變數 + 該列有值的 facts
+        values = {}
+        for name in self.names | set(self.derived):
+            values[name] = (run.sorts.get(name, self.sort(name)), run.name(name, "Real")[0].tolist())
+        for cid in self.defined:
+            values[cid] = (self.sorts[cid], run.constraint(cid)[0].tolist())
+        fact_columns = {
+            name: (self.types.get(name, "Real"), col[0].tolist(), col[1].tolist())
+            for name, col in columns.items() if name not in values
+        }
+        mismatch = {name: m.tolist() for name, m in mismatch.items()}
+        elapsed = (time.perf_counter() - t0) / n
+
+        out = [None] * n
+        for i in rows.tolist():
+            model = {name: _cast(sort, col[i]) for name, (sort, col) in values.items()}
+            for name, (sort, col, known) in fact_columns.items():
+                if known[i]:
+                    model[name] = _cast(sort, col[i])
+            result = {"status": "sat", "solve_time": elapsed, "model": model,
+                      "penalty": model.get("penalty"), "path": "vector"}
+            relaxed = [name for name, m in mismatch.items() if m[i]]
+            if relaxed:
+                result["relaxed"] = relaxed
+            out[i] = result
+        return out
+
+    def evaluate_cases(self, cases, mode="auto"):
+        table = facts_table(cases)
+        if not table:  # 沒有任何 fact 時表格沒有欄位、也就沒有列數，全部交給 Z3
+            return [None] * len(cases)
+        return self.evaluate(table, mode)
+
+class _Pass:
+    # 一次 evaluate 的狀態：各子式的 (值, 是否與有理數運算結果完全相同) 與各列的 missing / unsure
+    def __init__(self, rules, columns, n):
+        self.rules = rules
+        self.columns = columns
+        self.n = n
+        self.missing = np.zeros(n, dtype=bool)
+        self.unsure = np.zeros(n, dtype=bool)
+        self.memo = {}
+        self.done = {}
+        self.sorts = {}      # 原始變數 → 第一次解析時決定的 sort（同 core/dsl 的 Env）
+        self._computing = set()
+
+    def constraint(self, cid):
+        return self._defined(cid, self.rules.defs[cid])
+
+    def _defined(self, name, expr):
+        if name not in self.done:
+            if name in self._computing:
+                raise ValueError(f"Cyclic definition: {name}")
+            self._computing.add(name)
+            try:
+                self.done[name] = self.eval(expr)
+            finally:
+                self._computing.discard(name)
+        return self.done[name]
+
+    def name(self, name, default):
+        if name in self.rules.defs:
+            return self.constraint(name)
+        if name in self.rules.derived:
+            return self._defined(name, self.rules.derived[name])
+        if name not in self.done:
+            sort = self.sorts[name] = self.rules.checker.name_sort(name, default)
+            if name in self.columns:
+                values, known = self.columns[name]
+                self.missing |= ~known
+            else:
+                values, known = np.zeros(self.n), np.zeros(self.n, dtype=bool)
+                self.missing[:] = True
+            if sort == "Bool":
+                values = values != 0
+            elif sort == "Int":
+                self.unsure |= known & ~_integral(values)
+            self.done[name] = (values, np.True_)
+        return self.done[name]
+
+    def mismatch(self, name):
+        # 該列有填 fact 且與計算值不同
+        values, known = self.columns[name]
+        computed, exact = self.name(name, "Real")
+        if computed.dtype == bool:
+            return known & ((values != 0) != computed)
+        close = np.abs(values - computed) <= TOL * np.maximum(1.0, np.maximum(np.abs(values), np.abs(computed)))
+        self.unsure |= known & close & ~exact & (values != computed)
+        return known & (values != computed) & ~(close & ~exact)
+
+    def cmp(self, op, a, b):
+        (x, ex), (y, ey) = a, b
+        if op == "EQ" and x.dtype == bool:
+            return x == y
+        close = np.abs(x - y) <= TOL * np.maximum(1.0, np.maximum(np.abs(x), np.abs(y)))
+        self.unsure |= close & ~(ex & ey)
+        return {"GE": x >= y, "LE": x <= y, "GT": x > y, "LT": x < y, "EQ": x == y}[op]
+
+    def _near_integer(self, x, exact):
+        self.unsure |= ~exact & (np.abs(x - np.round(x)) <= TOL * np.maximum(1.0, np.abs(x)))
+
+    def eval(self, expr):
+        if isinstance(expr, bool):
+            return np.full(self.n, expr), np.True_
+        if isinstance(expr, (int, float)):
+            return np.full(self.n, float(expr)), np.True_
+        if isinstance(expr, str):
+            return self.name(expr, "Real")
+        key = id(expr)
+        if key not in self.memo:
+            self.memo[key] = (expr, self._eval(expr))
+        return self.memo[key][1]
+
+    def _eval(self, expr):
+        op, args = expr[0], expr[1:]
+        if op == "VAR":
+            return self.name(args[0], "Bool")
+        if op == "IFNULL":
+            return self.eval(args[1] if args[0] is None else args[0])
+        if op == "ROUND":
+            x, _ = self.eval(args[0])
+            scale = 10.0 ** (args[1] if len(args) > 1 else 0)
+            y = x * scale + 0.5
+            self._near_integer(y, np.False_)
+            return np.floor(y) / scale, np.False_
+
+        xs = [self.eval(a) for a in args]
+        vals = [x for x, _ in xs]
+        exact = np.logical_and.reduce([np.broadcast_to(e, (self.n,)) for _, e in xs])
+        if op == "AND":
+            return np.logical_and.reduce(vals), np.True_
+        if op == "OR":
+            return np.logical_or.reduce(vals), np.True_
+        if op == "NOT":
+            return ~vals[0], np.True_
+        if op == "IMPLIES":
+            return ~vals[0] | vals[1], np.True_
+        if op in ("GE", "LE", "GT", "LT", "EQ"):
+            return self.cmp(op, xs[0], xs[1]), np.True_
+        if op == "CASE":
+            value, ex = xs[-1]
+            ex = np.broadcast_to(ex, (self.n,))
+            for (cond, _), (v, e) in reversed(list(zip(xs[0:-1:2], xs[1:-1:2]))):
+                value = np.where(cond, v, value)
+                ex = np.where(cond, e, ex)
+            return value, ex
+        if op in ("ADD", "SUM"):
+            value = np.sum(vals, axis=0)
+            return value, exact & _integral(value)
+        if op == "SUB":
+            value = -vals[0] if len(vals) == 1 else vals[0] - np.sum(vals[1:], axis=0)
+            return value, exact & _integral(value)
+        if op == "MUL":
+            value = np.prod(vals, axis=0)
+            return value, exact & _integral(value)
+        if op == "DIV":
+            value = vals[0]
+            for d in vals[1:]:
+                self.unsure |= d == 0
+                value = value / d
+            return value, np.False_
+        if op == "AVG":
+            return np.sum(vals, axis=0) / len(vals), np.False_
+        if op == "MIN":
+            return np.minimum.reduce(vals), exact
+        if op == "MAX":
+            return np.maximum.reduce(vals), exact
+        if op == "ABS":
+            return np.abs(vals[0]), exact
+        if op == "POW":
+            self.unsure |= (vals[0] < 0) & ~_integral(vals[1])
+            return np.power(vals[0], vals[1]), np.False_
+        if op == "FLOOR":
+            self._near_integer(vals[0], exact)
+            return np.floor(vals[0]), exact
+        if op == "CEIL":
+            self._near_integer(vals[0], exact)
+            return np.ceil(vals[0]), exact
+        if op == "PERCENT":
+            value = vals[0] * 100
+            return value, exact & _integral(value)
+        raise ValueError(f"Unknown op: {op}")
@@ -0,0 +1,92 @@
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+
+# 背景產出寫入：案例流程只把 (路徑, 內容) 丟進佇列，序列化與寫檔在獨立執行緒整批完成，
+# 不佔用 LLM / 求解的關鍵路徑。同一個 job 內的檔案全部寫完後才呼叫 on_done
+# （例如 manifest.record 需要讀回檔案計算雜湊）。background=False 時就地同步寫入。
+# 給了 metrics（core/metrics.StageMetrics）時，序列化與寫檔的實際耗時記入其 "write" 階段。
+
+_STOP = object()
+
+class ArtifactWriter:
+    def __init__(self, pretty=False, background=True, batch_size=64, max_pending=1024):
+        self.pretty = pretty
+        self.batch_size = batch_size
+        self.errors = []
+        self.written = 0
+        self.queue = queue.Queue(maxsize=max_pending) if background else None
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+            self.thread.start()
+
+    def dumps(self, obj):
+        if self.pretty:
+            return json.dumps(obj, ensure_ascii=False, indent=2)
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def text(self, path, content):
+        return (Path(path), content)
+
+    def json(self, path, obj):
+        # 延後到寫入執行緒才序列化
+        return (Path(path), lambda: self.dumps(obj))
+
+    def submit(self, files, on_done=None, metrics=None):
+        # files 為 text()/json() 的清單；內容可為字串或回傳字串的函式
+        job = (files, on_done, metrics)
+        if self.queue is None:
+            self._write([job])
+        else:
+            self.queue.put(job)
+
+    def write_text(self, path, content, on_done=None, metrics=None):
+        self.submit([self.text(path, content)], on_done, metrics)
+
+    def write_json(self, path, obj, on_done=None, metrics=None):
+        self.submit([self.json(path, obj)], on_done, metrics)
+
+    def _write(self, jobs):
+        for files, on_done, metrics in jobs:
+            t0 = time.perf_counter()
+            try:
+                for path, content in files:
+                    path.write_text(content() if callable(content) else content, encoding="utf-8")
+                    self.written += 1
+                if on_done is not None:
+                    on_done()
+            except Exception as e:  # 寫入執行緒不能中斷；錯誤在 close() 時拋出
+                self.errors.append(e)
+            if metrics is not None:
+                metrics.add("write", time.perf_counter() - t0)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            jobs = [self.queue.get()]
+            while len(jobs) < self.batch_size:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in jobs:
+                stop = True
+                jobs = [j for j in jobs if j is not _STOP]
+            self._write(jobs)
+            for _ in range(len(jobs) + stop):
+                self.queue.task_done()
+
+    def flush(self):
+        if self.queue is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        if self.errors:
+            raise self.errors[0]
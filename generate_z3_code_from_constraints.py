@@ -1,4 +1,5 @@
-from typing import List, Dict, Any, Set, Union
+from typing import List, Dict, Any, Set, Union, Optional
+from core.dag import ExprDAG
 
 Z3_OP = {
     "AND": "And",
@@ -37,8 +38,30 @@ def collect_all_vars(constraints: List[Dict[str, Any]]) -> Set[str]:
     return vars_used
 
 
-def convert_expr(expr: Any) -> str:
+class SharedExprs:
+    # 被多個 constraint / 父節點共用的子式，輸出成 _e<id> 暫存變數後以名稱引用
+    def __init__(self, constraints: List[Dict[str, Any]]):
+        self.dag = ExprDAG()
+        for c in constraints:
+            self.dag.root(c["expr"])
+        self.names = {nid: f"_e{nid}" for nid in self.dag.shared()}
+
+    def name(self, expr: Any) -> Optional[str]:
+        return self.names.get(self.dag.intern(expr))
+
+    def definitions(self) -> List[str]:
+        return [
+            f"{name} = {convert_expr(self.dag.nodes[nid], self, inline=True)}"
+            for nid, name in self.names.items()
+        ]
+
+
+def convert_expr(expr: Any, shared: Optional[SharedExprs] = None, inline: bool = False) -> str:
     if isinstance(expr, list):
+        if shared is not None and not inline:
+            name = shared.name(expr)
+            if name is not None:
+                return name
         op = expr[0]
         if op == "VAR":
             return expr[1].replace(":", "_")
@@ -46,21 +69,21 @@ def convert_expr(expr: Any) -> str:
             parts = expr[1:]
             default = repr(parts[-1])
             for i in range(len(parts) - 2, 0, -2):
-                cond = convert_expr(parts[i - 1])
+                cond = convert_expr(parts[i - 1], shared)
                 val = repr(parts[i])
                 default = f"If({cond}, {val}, {default})"
             return default
         elif op in {"ADD", "SUB", "MUL", "DIV"}:
-            args = [convert_expr(a) for a in expr[1:]]
+            args = [convert_expr(a, shared) for a in expr[1:]]
             return f"({f' {Z3_OP[op]} '.join(args)})"
         elif op in {"AND", "OR"}:
-            args = ", ".join(convert_expr(a) for a in expr[1:])
+            args = ", ".join(convert_expr(a, shared) for a in expr[1:])
             return f"{Z3_OP[op]}({args})"
         elif op == "NOT":
-            return f"Not({convert_expr(expr[1])})"
+            return f"Not({convert_expr(expr[1], shared)})"
         elif op in {"EQ", "GE", "LE", "GT", "LT"}:
-            a = convert_expr(expr[1])
-            b = convert_expr(expr[2])
+            a = convert_expr(expr[1], shared)
+            b = convert_expr(expr[2], shared)
             return f"({a} {Z3_OP[op]} {b})"
         else:
             raise ValueError(f"Unknown operator: {op}")
@@ -108,6 +131,13 @@ def generate_z3_solver_code(
             code.append(f"# Unknown type for {z3name}, defaulting to Real")
             code.append(f"{z3name} = Real('{z3name}')")
 
+    # 跨 constraint 共用的子式只建一次
+    shared = SharedExprs(constraints)
+    definitions = shared.definitions()
+    if definitions:
+        code.append("\n# === Shared Subexpressions ===")
+        code.extend(definitions)
+
     # Solver
     code.append("\n# === Solver ===")
     code.append("s = Optimize()")
@@ -126,7 +156,7 @@ def generate_z3_solver_code(
     # Constraints
     code.append("\n# === Hard Constraints ===")
     for c in constraints:
-        expr_code = convert_expr(c["expr"])
+        expr_code = convert_expr(c["expr"], shared)
         if isinstance(c["expr"], list) and c["expr"][0] == "CASE":
             # 特殊處理 CASE：把結果綁定給變數（根據 constraint id）
             var_name = c["id"].replace(":", "_")
@@ -1,10 +1,32 @@
 import json
-import pandas as pd
+import os
+import time
+import argparse
+from itertools import islice
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from config import llm_config
+from functools import partial
+from config import (
+    llm_config, stub_config, LLM_BACKEND, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, SOLVE_MODE, DIAGNOSE_BUDGET,
+    RULEBASE_CACHE_DIR, RULEBASE_CACHE_MAX_ENTRIES, SPEC_RETRIES,
+    SOLVE_WORKERS, SOLVE_TIMEOUT, SOLVE_MEMORY_MB, SOLVE_RLIMIT, VECTOR_CHUNK,
+)
 from agents.orchestrator import build_team
-from core.schema import VarSpec, ConstraintSpec
+from agents.cache import LLMCache
 from core.renderer import render_z3_snippet
+from core.solve import solve_case, BatchSolver, SOLVE_MODES, solve_executor, z3_limits
+from core.diagnose import diagnose, violated_rules
+from core.bdd import BDDCache
+from core.results import case_record, ResultsLog
+from core.store import ParquetStore
+from core.writer import ArtifactWriter
+from core.simplify import simplify, prune_facts
+from core.validate import validate, format_errors
+from core.rulecache import RuleBaseCache
+from core.corpus import iter_cases, parse_shard, statute_key
+from core.manifest import Manifest, content_hash
+from core.metrics import StageMetrics
 from agents.prompt import COMPLETION_PROMPT_TEMPLATE
 
 
@@ -92,39 +114,109 @@ def print_dialog_log(title, messages):
         content = msg['content']
         print(f"{role}: {content}\n{'-'*40}")
 
-def main():
-    team = build_team(llm_config)
-    df = pd.read_csv(DATA)
-
-    for idx, row in df.iterrows():
-        case_id = f"case_{idx}"
-        case_text = str(row["法律案例"])
-        statute_text = str(row["相關法條"])
-
-        ### === 1) 法條解析 ===
-        # 第一輪解析
-        parser_prompt = f"【相關法條】\n{statute_text}\n——請輸出 ConstraintSpec[]（JSON 陣列）。"
-        parser_messages = [{"role": "user", "content": parser_prompt}]
-        parser_reply = team["parser"].generate_reply(messages=parser_messages)
-        parser_reply_content = parser_reply["content"] if isinstance(parser_reply, dict) else str(parser_reply)
-        parser_messages.append({"role": "assistant", "content": parser_reply_content})
-
-        # 第二輪補完解析
-        completion_prompt = COMPLETION_PROMPT_TEMPLATE.format(
-            statute_text=statute_text,
-            existing_constraints=parser_reply_content
+def dialog_text(messages):
+    return "\n\n".join([f"{m['role'].upper()}: {m['content']}" for m in messages])
+
+def reply_text(reply):
+    return reply["content"] if isinstance(reply, dict) else str(reply)
+
+def repair_prompt(errors, what):
+    return (
+        f"上面的 {what} 未通過靜態檢查：\n{format_errors(errors, limit=20)}\n"
+        f"——請修正以上錯誤，重新輸出完整的 {what}（只輸出 JSON）。"
+    )
+
+def load_json(content):
+    # LLM 回覆 → (物件, 錯誤清單)；JSON 本身壞掉也當成可重新提示的錯誤
+    try:
+        return json.loads(content), []
+    except json.JSONDecodeError as e:
+        return None, [{"kind": "json", "where": f"line {e.lineno} col {e.colno}", "message": e.msg}]
+
+def parse_statute(statute_text, key, cache=None, manifest=None, metrics=None, writer=None):
+    # 法條解析結果存成 outputs/statute_{key}.parse.json，續跑時由 manifest 判斷是否沿用
+    parse_path = OUT / f"statute_{key}.parse.json"
+    input_hash = content_hash(statute_text)
+    if manifest is not None and manifest.is_done(f"statute_{key}", "parse", input_hash):
+        done = json.loads(parse_path.read_text(encoding="utf-8"))
+        return done["constraints"], done["parser_messages"]
+
+    metrics = metrics if metrics is not None else StageMetrics()
+    writer = writer if writer is not None else ArtifactWriter(background=False)
+    team = build_team(llm_config, cache=cache, backend=LLM_BACKEND, stub_config=stub_config)
+
+    ### === 1) 法條解析 ===
+    # 第一輪解析
+    parser_prompt = f"【相關法條】\n{statute_text}\n——請輸出 ConstraintSpec[]（JSON 陣列）。"
+    parser_messages = [{"role": "user", "content": parser_prompt}]
+    with metrics.stage("parser", team["parser"]):
+        parser_reply_content = reply_text(team["parser"].generate_reply(messages=parser_messages))
+    parser_messages.append({"role": "assistant", "content": parser_reply_content})
+
+    # 第二輪補完解析
+    completion_prompt = COMPLETION_PROMPT_TEMPLATE.format(
+        statute_text=statute_text,
+        existing_constraints=parser_reply_content
+    )
+    parser_messages.append({"role": "user", "content": completion_prompt})
+    with metrics.stage("completion", team["parser"]):
+        completion_reply_content = reply_text(team["parser"].generate_reply(messages=parser_messages))
+    parser_messages.append({"role": "assistant", "content": completion_reply_content})
+
+    # 最終 constraint 使用補完結果；靜態檢查未過時附上錯誤請 parser 修正
+    constraints, errors = load_json(completion_reply_content)
+    if not errors:
+        errors = validate(constraints)
+    for _ in range(SPEC_RETRIES if errors else 0):
+        parser_messages.append({"role": "user", "content": repair_prompt(errors, "ConstraintSpec[]")})
+        with metrics.stage("repair", team["parser"]):
+            repair_reply_content = reply_text(team["parser"].generate_reply(messages=parser_messages))
+        parser_messages.append({"role": "assistant", "content": repair_reply_content})
+        repaired, errors = load_json(repair_reply_content)
+        if not errors:
+            constraints, errors = repaired, validate(repaired)
+        if not errors:
+            break
+
+    with metrics.stage("io"):
+        writer.write_json(
+            parse_path, {"constraints": constraints, "parser_messages": parser_messages, "errors": errors},
+            on_done=manifest and partial(manifest.record, f"statute_{key}", "parse", input_hash, [parse_path]),
+            metrics=metrics
         )
-        parser_messages.append({"role": "user", "content": completion_prompt})
-        completion_reply = team["parser"].generate_reply(messages=parser_messages)
-        completion_reply_content = completion_reply["content"] if isinstance(completion_reply, dict) else str(completion_reply)
-        parser_messages.append({"role": "assistant", "content": completion_reply_content})
-
-        # 最終 constraint 使用補完結果
-        constraints = json.loads(completion_reply_content)
-        constraints_obj = [ConstraintSpec(**c) for c in constraints]
-        used_vars = extract_atomic_vars(constraints)
-
-        ### === 2) 案例解析 ===
+    # 修正後仍不是合法 JSON 時 constraints 為 None；錯誤由 process_case 記為各案例的 error
+    return constraints, parser_messages
+
+def map_case(idx, case_text, parsed, batch=None, inlined=None, cache=None, manifest=None, writer=None):
+    # 案例的 1)～2)：寫出規則、對應 varspec_facts 並做靜態檢查；回傳交給 process_case 的案例狀態。
+    # 每個案例建立獨立的 agent team，避免並行時共用對話狀態
+    team = build_team(llm_config, cache=cache, backend=LLM_BACKEND, stub_config=stub_config)
+    metrics = StageMetrics()
+    writer = writer if writer is not None else ArtifactWriter(background=False)
+    case_id = f"case_{idx}"
+    constraints, parser_messages = parsed
+    used_vars = extract_atomic_vars(constraints) if constraints is not None else []
+
+    with metrics.stage("io"):
+        writer.submit([
+            writer.json(OUT / f"{case_id}.constraint_spec.json", constraints),
+            writer.text(OUT / f"{case_id}.parser_log.txt", partial(dialog_text, parser_messages)),
+        ], metrics=metrics)
+
+    ### === 2) 案例解析 ===
+    mapping_path = OUT / f"{case_id}.varspec_facts.json"
+    mapper_log_path = OUT / f"{case_id}.mapper_log.txt"
+    map_hash = content_hash(case_text, constraints)
+    mapper_messages = None
+    mapping, spec_errors = None, []
+    resumed = False  # 是否沿用 manifest 中先前完成的 varspec_facts
+    if constraints is None:
+        # 法條解析的 JSON 壞掉：沒有變數可對應，不呼叫 mapper
+        spec_errors = load_json(parser_messages[-1]["content"])[1]
+    elif manifest is not None and manifest.is_done(case_id, "map", map_hash):
+        mapping = json.loads(mapping_path.read_text(encoding="utf-8"))
+        resumed = True
+    else:
         used_vars_str = ", ".join(used_vars)
         mapper_prompt = (
             f"【法律案例】\n{case_text}\n"
@@ -132,45 +224,354 @@ def main():
             "——請輸出 varspecs+facts（JSON 物件）。"
         )
         mapper_messages = [{"role": "user", "content": mapper_prompt}]
-        mapper_reply = team["mapper"].generate_reply(messages=mapper_messages)
-        mapper_reply_content = mapper_reply["content"] if isinstance(mapper_reply, dict) else str(mapper_reply)
+        with metrics.stage("mapper", team["mapper"]):
+            mapper_reply_content = reply_text(team["mapper"].generate_reply(messages=mapper_messages))
         mapper_messages.append({"role": "assistant", "content": mapper_reply_content})
 
-        mapping = json.loads(mapper_reply_content)
-        varspecs = [VarSpec(**v) for v in mapping["varspecs"]]
-        facts = mapping["facts"]
+        # varspecs / facts 的錯誤才請 mapper 修正；constraint 本身的錯誤由法條解析負責
+        mapping, errors = load_json(mapper_reply_content)
+        if not errors:
+            errors = [e for e in validate(constraints, mapping) if e["kind"] != "constraint"]
+        for _ in range(SPEC_RETRIES if errors else 0):
+            mapper_messages.append({"role": "user", "content": repair_prompt(errors, "varspecs+facts")})
+            with metrics.stage("repair", team["mapper"]):
+                repair_reply_content = reply_text(team["mapper"].generate_reply(messages=mapper_messages))
+            mapper_messages.append({"role": "assistant", "content": repair_reply_content})
+            repaired, errors = load_json(repair_reply_content)
+            if not errors:
+                mapping = repaired
+                errors = [e for e in validate(constraints, mapping) if e["kind"] != "constraint"]
+            if not errors:
+                break
 
         ### === 4) 寫檔 ===
-        (OUT / f"{case_id}.constraint_spec.json").write_text(
-            json.dumps(constraints, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-        (OUT / f"{case_id}.varspec_facts.json").write_text(
-            json.dumps(mapping, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-        z3_prompt = GENERATE_Z3CODE_PROMPT.format(
-            constraint_spec=json.dumps(constraints, ensure_ascii=False, indent=2),
-            varspec_facts=json.dumps(mapping, ensure_ascii=False, indent=2)
-        )
-
-        z3_response = team["solver"].generate_reply(messages=[{"role": "user", "content": z3_prompt}])
-        z3_code = z3_response["content"] if isinstance(z3_response, dict) else str(z3_response)
-
-        (OUT / f"{case_id}.z3.py").write_text(z3_code, encoding="utf-8")
-
+        with metrics.stage("io"):
+            if mapping is None:
+                # JSON 壞掉：只留對話紀錄，不記入 manifest，續跑時重新對應
+                spec_errors = errors
+                writer.write_text(mapper_log_path, partial(dialog_text, mapper_messages), metrics=metrics)
+            else:
+                writer.submit(
+                    [writer.json(mapping_path, mapping), writer.text(mapper_log_path, partial(dialog_text, mapper_messages))],
+                    on_done=manifest and partial(manifest.record, case_id, "map", map_hash, [mapping_path, mapper_log_path]),
+                    metrics=metrics
+                )
+
+    # 修正後仍未通過靜態檢查的規則 / facts 不送進 Z3，也不產碼，直接記為 error
+    if not spec_errors:
+        spec_errors = validate(constraints, mapping)
+    # batch 的規則可能已經 core/simplify 化簡；求解與診斷都用同一組，facts 只留有用到的變數
+    solve_mapping = None
+    if not spec_errors:
+        solve_constraints = batch.constraints if batch is not None else constraints
+        solve_mapping = prune_facts(solve_constraints, mapping) if solve_constraints is not constraints else mapping
+    return {
+        "case_id": case_id, "team": team, "metrics": metrics, "constraints": constraints,
+        "parser_messages": parser_messages, "mapper_messages": mapper_messages, "resumed": resumed,
+        "mapping": mapping, "spec_errors": spec_errors, "solve_mapping": solve_mapping,
+        "batch": batch, "inlined": inlined,
+    }
 
-        # 寫入對話 log
-        (OUT / f"{case_id}.parser_log.txt").write_text(
-            "\n\n".join([f"{m['role'].upper()}: {m['content']}" for m in parser_messages]), encoding="utf-8"
+def vectorize_cases(cases):
+    # 同一規則庫的案例整批交給 BatchSolver.evaluate，一次 NumPy 求值；回傳與 cases 對應的結果（或 None）
+    vectors = [None] * len(cases)
+    groups = {}
+    for i, case in enumerate(cases):
+        if case["batch"] is not None and case["solve_mapping"] is not None:
+            groups.setdefault(id(case["batch"]), []).append(i)
+    for rows in groups.values():
+        t0 = time.perf_counter()
+        out = cases[rows[0]]["batch"].evaluate([cases[i]["solve_mapping"] for i in rows])
+        elapsed = (time.perf_counter() - t0) / len(rows)
+        for i, result in zip(rows, out):
+            vectors[i] = result
+            cases[i]["metrics"].add("solve", elapsed)
+    return vectors
+
+def process_case(case, vector=None, llm_codegen=False, rule_cache=None, manifest=None, solve_mode=SOLVE_MODE,
+                 diagnosis=None, store=None, writer=None, explain=None):
+    # 案例的 3)～5)：case 為 map_case 的回傳值；vector 為 vectorize_cases 已求得的結果
+    writer = writer if writer is not None else ArtifactWriter(background=False)
+    case_id, team, metrics = case["case_id"], case["team"], case["metrics"]
+    constraints, mapping, spec_errors = case["constraints"], case["mapping"], case["spec_errors"]
+    batch, inlined, solve_mapping = case["batch"], case["inlined"], case["solve_mapping"]
+
+    ### === 3) 求解 ===
+    # 預設以 core/dsl 直接編譯 Z3 AST 並於行程內求解；--llm-codegen 保留舊的 LLM 產碼流程
+    result = None
+    if spec_errors:
+        result = case_record(
+            case_id, {"status": "error", "error": f"invalid spec ({len(spec_errors)} errors): {format_errors(spec_errors[:1])}"},
+            constraints or [], {}
         )
-        (OUT / f"{case_id}.mapper_log.txt").write_text(
-            "\n\n".join([f"{m['role'].upper()}: {m['content']}" for m in mapper_messages]), encoding="utf-8"
+        result["spec_errors"] = spec_errors
+        with metrics.stage("io"):
+            writer.write_json(OUT / f"{case_id}.result.json", result, metrics=metrics)
+    elif llm_codegen:
+        z3_path = OUT / f"{case_id}.z3.py"
+        codegen_hash = content_hash(constraints, mapping)
+        if manifest is None or not manifest.is_done(case_id, "codegen", codegen_hash):
+            z3_prompt = GENERATE_Z3CODE_PROMPT.format(
+                constraint_spec=json.dumps(constraints, ensure_ascii=False, indent=2),
+                varspec_facts=json.dumps(mapping, ensure_ascii=False, indent=2)
+            )
+            with metrics.stage("codegen", team["solver"]):
+                z3_code = reply_text(team["solver"].generate_reply(messages=[{"role": "user", "content": z3_prompt}]))
+            with metrics.stage("io"):
+                writer.write_text(
+                    z3_path, z3_code,
+                    on_done=manifest and partial(manifest.record, case_id, "codegen", codegen_hash, [z3_path]),
+                    metrics=metrics
+                )
+    else:
+        solve_constraints = batch.constraints if batch is not None else constraints
+        with metrics.stage("solve"):
+            if vector is not None:
+                result = vector
+            elif batch is not None:
+                # NumPy 求值已在 vectorize_cases 整批做過，確定不了的才到這裡
+                result = batch.solve(solve_mapping, vectorize=False)
+            else:
+                result = solve_case(constraints, mapping, rule_cache=rule_cache, mode=solve_mode)
+
+        ### === 4) 違規診斷 ===
+        # facts 與規則衝突時（fast path 放寬了 fact、改走 Optimize 或 unsat）才計算最小 core；
+        # unknown / timeout 的案例不診斷
+        conflict = result["status"] in ("sat", "unsat") and (result.get("path") not in ("fast", "vector") or "relaxed" in result)
+        if diagnosis is not None and conflict:
+            with metrics.stage("diagnose"):
+                result["diagnosis"] = diagnose(solve_constraints, solve_mapping, rule_cache=rule_cache, **diagnosis)
+            with metrics.stage("io"):
+                writer.write_json(OUT / f"{case_id}.diagnosis.json", result["diagnosis"], metrics=metrics)
+
+        ### === 5) 結構化結果 ===
+        # rules / violated 以原始規則回報：化簡時內聯掉的 constraint id 由 inlined 取值
+        result = case_record(case_id, result, constraints, solve_mapping, inlined)
+        # --explain：以規則集的 BDD 列出單獨改變就會讓 penalty 翻轉的述詞
+        if explain is not None and result["status"] != "error":
+            rules_bdd = explain.get(solve_constraints, solve_mapping.get("varspecs", []))
+            if rules_bdd.error is None:
+                # 求值失敗只影響 flips，不影響已求得的結果
+                try:
+                    result["flips"] = rules_bdd.flips(solve_mapping.get("facts", {}))
+                except (ValueError, ArithmeticError, RecursionError) as e:
+                    result["flips_error"] = f"{type(e).__name__}: {e}"
+        with metrics.stage("io"):
+            writer.write_json(OUT / f"{case_id}.result.json", result, metrics=metrics)
+
+    if store is not None:
+        with metrics.stage("io"):
+            store.add_case(case_id, constraints or [], mapping if isinstance(mapping, dict) else {}, result,
+                           case["parser_messages"], case["mapper_messages"])
+
+    return case_id, case["parser_messages"], case["mapper_messages"], case["resumed"], result, metrics
+
+def run_ordered(fn, items, workers):
+    # 最多同時 workers 個案例在途，結果依輸入順序回傳
+    if workers <= 1:
+        for args in items:
+            yield fn(*args)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for args in items:
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(fn, *args))
+        while pending:
+            yield pending.popleft().result()
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="法條 + 案例 → ConstraintSpec / VarSpec / Z3")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="同時處理的案例數（受 LLM endpoint 併發上限約束）")
+    ap.add_argument("--cache-path", default=LLM_CACHE_PATH,
+                    help="LLM 回覆快取 SQLite 路徑")
+    ap.add_argument("--cache-size", type=int, default=LLM_CACHE_MAX_ENTRIES,
+                    help="快取最多保留筆數（LRU 淘汰）")
+    ap.add_argument("--no-cache", action="store_true", help="停用 LLM 回覆快取")
+    ap.add_argument("--no-rule-cache", action="store_true", help="停用已編譯規則庫快取")
+    ap.add_argument("--llm-codegen", action="store_true",
+                    help="改由 solver agent 產生 .z3.py（舊流程），不在行程內求解")
+    ap.add_argument("--solve-mode", choices=SOLVE_MODES, default=SOLVE_MODE,
+                    help="auto：facts 先當硬性假設以 Solver 求解，衝突時才以 Optimize 放寬；optimize：一律 Optimize；"
+                         "portfolio：同 auto，依規則的理論並行數種求解設定，取最先完成者")
+    ap.add_argument("--solve-workers", type=int, nargs="?", const=os.cpu_count(), default=SOLVE_WORKERS, metavar="N",
+                    help="Z3 求解改在 N 個子行程執行（不給 N 為 CPU 核心數；0 為行程內求解）")
+    ap.add_argument("--solve-timeout", type=float, default=SOLVE_TIMEOUT,
+                    help="每次 Z3 check() 的秒數上限，逾時為 unknown；子行程整個案例超過兩倍即強制結束（timeout）")
+    ap.add_argument("--solve-memory", type=int, default=SOLVE_MEMORY_MB, metavar="MB",
+                    help="每個求解子行程的記憶體上限（MB），超過為 memout")
+    ap.add_argument("--solve-rlimit", type=int, default=SOLVE_RLIMIT,
+                    help="Z3 rlimit（與機器快慢無關的資源上限），0 為不限")
+    ap.add_argument("--diagnose", action="store_true",
+                    help="facts 與規則衝突時計算最小 unsat core，寫入 case_N.diagnosis.json")
+    ap.add_argument("--diagnose-budget", type=float, default=DIAGNOSE_BUDGET,
+                    help="每個案例診斷的時間預算（秒）")
+    ap.add_argument("--enumerate", type=int, default=0, metavar="N",
+                    help="另列舉至多 N 個 MUS 與 N 個最小修正集合（MCS）")
+    ap.add_argument("--explain", action="store_true",
+                    help="結果附上 flips：單獨改變就會讓 penalty 翻轉的述詞（規則集編成 BDD）")
+    ap.add_argument("--no-simplify", action="store_true", help="求解前不做 ConstraintSpec 化簡")
+    ap.add_argument("--no-vectorize", action="store_true",
+                    help="facts 齊全的案例也一律交給 Z3（預設先以 NumPy 直接求值）")
+    ap.add_argument("--vector-chunk", type=int, default=VECTOR_CHUNK, metavar="N",
+                    help="每對應完 N 個案例，同一規則庫的案例整批以 NumPy 求值一次")
+    ap.add_argument("--no-resume", action="store_true",
+                    help="忽略 outputs/manifest.sqlite 的完成紀錄，所有階段重算")
+    ap.add_argument("--data", type=Path, default=DATA, help="案例 CSV（法律案例, 相關法條）")
+    ap.add_argument("--start", type=int, default=0, help="從第幾列開始（0 起算）")
+    ap.add_argument("--limit", type=int, default=None, help="最多處理幾列")
+    ap.add_argument("--shard", type=parse_shard, default=None, metavar="i/n",
+                    help="只處理第 i 個分片（共 n 片）的案例")
+    ap.add_argument("--shard-by", choices=["index", "statute"], default="index",
+                    help="分片依據：列號，或相關法條雜湊（同法條的案例落在同一片）")
+    ap.add_argument("--out", type=Path, default=OUT, help="產出目錄")
+    ap.add_argument("--pretty-json", action="store_true", help="JSON 產出縮排（預設為精簡格式）")
+    ap.add_argument("--print-dialogs", action="store_true", help="在終端印出 Parser / Mapper 完整對話")
+    ap.add_argument("--store", choices=["files", "parquet"], default="files",
+                    help="parquet：另將各表整批寫入 <out>/store/（需 pyarrow）")
+    ap.add_argument("--run-id", default=None, help="Parquet store 的分區名稱（預設為啟動時間）")
+    return ap.parse_args(argv)
+
+def run_pipeline(args, parse_metrics=None):
+    # 產出 (case_id, parser_messages, mapper_messages, resumed, result, metrics)，依輸入順序；
+    # parse_metrics 若給定（dict），會填入每組法條解析的 StageMetrics
+    global OUT
+    OUT = args.out
+    OUT.mkdir(parents=True, exist_ok=True)
+    select = dict(start=args.start, limit=args.limit, shard=args.shard, shard_by=args.shard_by)
+    manifest = Manifest(OUT / "manifest.sqlite", resume=not args.no_resume)
+    cache = None
+    if args.cache_path and not args.no_cache:
+        cache = LLMCache(args.cache_path, max_entries=args.cache_size)
+    rule_cache = None
+    if RULEBASE_CACHE_DIR and not args.no_rule_cache:
+        rule_cache = RuleBaseCache(RULEBASE_CACHE_DIR, max_entries=RULEBASE_CACHE_MAX_ENTRIES)
+    parse_metrics = parse_metrics if parse_metrics is not None else {}
+    results = ResultsLog(OUT / "results.jsonl")
+    writer = ArtifactWriter(pretty=args.pretty_json)
+    store = ParquetStore(OUT / "store", run_id=args.run_id) if args.store == "parquet" else None
+    executor = None
+
+    try:
+        ### === 0) 法條去重：每組相異的相關法條只跑一次兩輪解析 ===
+        # 先串流掃過一次語料，只保留每組相異法條的原文；案例本文在第二次串流時才讀入
+        distinct = {}
+        n_cases = 0
+        for _, _, statute_text in iter_cases(args.data, **select):
+            distinct.setdefault(statute_key(statute_text), statute_text)
+            n_cases += 1
+        parse_jobs = ((text, key) for key, text in distinct.items())
+        parse_worker = lambda text, key: parse_statute(
+            text, key, cache=cache, manifest=manifest, metrics=parse_metrics.setdefault(key, StageMetrics()),
+            writer=writer)
+        parsed = dict(zip(distinct, run_ordered(parse_worker, parse_jobs, args.workers)))
+        saved = 2 * (n_cases - len(distinct))
+        print(f"[Statute dedup] cases={n_cases} distinct={len(distinct)} parser_calls_saved={saved}")
+
+        # 同一組法條的案例共用一個已編譯的規則庫，只換入各自的 facts；編譯前先化簡
+        # JSON 壞掉的法條（constraints 為 None）沒有規則庫，其案例在 process_case 記為 error
+        rule_sets = {key: constraints for key, (constraints, _) in parsed.items() if constraints is not None}
+        inlined = {}
+        if not args.no_simplify:
+            before = after = 0
+            for key, constraints in rule_sets.items():
+                rule_sets[key], report = simplify(constraints)
+                inlined[key] = report["inlined"]
+                before += report["before"]["nodes"]
+                after += report["after"]["nodes"]
+            print(f"[Simplify] constraints={sum(len(parsed[key][0]) for key in rule_sets)}"
+                  f"→{sum(len(c) for c in rule_sets.values())} nodes={before}→{after}")
+        # 求解子行程在法條解析後才啟動：worker 需要的 import 與規則快取都已就緒
+        if args.solve_workers and not args.llm_codegen:
+            executor = solve_executor(args.solve_workers, timeout=args.solve_timeout, memory_mb=args.solve_memory,
+                                      rlimit=args.solve_rlimit, rule_cache=rule_cache)
+        else:
+            z3_limits(args.solve_timeout, args.solve_rlimit)
+        batches = {key: BatchSolver(constraints, rule_cache, args.solve_mode, vectorize=not args.no_vectorize,
+                                    executor=executor)
+                   for key, constraints in rule_sets.items()}
+        rows = (
+            (idx, case_text, parsed[key], batches.get(key), inlined.get(key))
+            for idx, case_text, statute_text in iter_cases(args.data, **select)
+            for key in (statute_key(statute_text),)
         )
-
-        ### === 印出對話 log ===
-        print_dialog_log(f"{case_id} / Parser 對話 Log", parser_messages)
-        print_dialog_log(f"{case_id} / Mapper 對話 Log", mapper_messages)
-
-        print(f"[OK] {case_id} → outputs/{case_id}.*")
+        mapper = partial(map_case, cache=cache, manifest=manifest, writer=writer)
+        worker = partial(process_case, llm_codegen=args.llm_codegen,
+                         rule_cache=rule_cache, manifest=manifest, solve_mode=args.solve_mode,
+                         diagnosis=dict(budget=args.diagnose_budget, enumerate_limit=args.enumerate)
+                         if args.diagnose else None, store=store, writer=writer,
+                         explain=BDDCache() if args.explain else None)
+        # 每對應完 vector_chunk 個案例，同規則庫的一起以 NumPy 求值，再各自求解、寫檔
+        chunk = 1 if args.no_vectorize or args.llm_codegen else args.vector_chunk
+        mapped = run_ordered(mapper, rows, args.workers)
+        winners = Counter()
+        while cases := list(islice(mapped, chunk)):
+            for record in run_ordered(worker, zip(cases, vectorize_cases(cases)), args.workers):
+                if record[4] is not None:
+                    results.append(record[4])
+                    if "portfolio" in record[4]:
+                        p = record[4]["portfolio"]
+                        winners[f"{p['logic']}/{p['winner']}"] += 1
+                yield record
+        paths = {"vector": 0, "fast": 0, "optimize": 0}
+        for batch in batches.values():
+            for path, n in batch.paths.items():
+                paths[path] += n
+        print(f"[Solver] mode={args.solve_mode} vector={paths['vector']} fast={paths['fast']} optimize={paths['optimize']}")
+        if winners:
+            print(f"[Portfolio] winners (logic/strategy): {dict(winners)}")
+    finally:
+        # 每一項都要關閉：某一項失敗時其餘照常關閉，最後再拋出第一個錯誤
+        errors = []
+        def closing(fn, *args):
+            try:
+                fn(*args)
+            except Exception as e:
+                errors.append(e)
+
+        # 先等背景寫入完成：其 on_done 會寫 manifest
+        closing(writer.close)
+        if executor is not None:
+            print(executor.report())
+            closing(executor.close)
+        if cache is not None:
+            print(cache.report())
+            closing(cache.close)
+        if rule_cache is not None:
+            print(rule_cache.report())
+        closing(results.close)
+        if store is not None:
+            closing(store.close)
+            print(f"[Store] run={store.run_id} → {store.root}")
+        closing(manifest.close)
+        if errors:
+            raise errors[0]
+
+def main(argv=None):
+    args = parse_args(argv)
+    for case_id, parser_messages, mapper_messages, resumed, result, _ in run_pipeline(args):
+        ### === 印出對話 log（--print-dialogs）===
+        if args.print_dialogs:
+            print_dialog_log(f"{case_id} / Parser 對話 Log", parser_messages)
+            if mapper_messages is not None:
+                print_dialog_log(f"{case_id} / Mapper 對話 Log", mapper_messages)
+        if resumed:
+            print(f"[RESUME] {case_id}: 沿用先前的 varspec_facts（manifest）")
+
+        if result is not None:
+            detail = result.get("penalty") if result["status"] == "sat" else \
+                result.get("unsat_core", result.get("error", result.get("reason")))
+            path = f" ({result['path']})" if "path" in result else ""
+            print(f"[Z3] {case_id}: {result['status']} {detail}{path}")
+            if "flips" in result:
+                print(f"[FLIP] {case_id}: {[f['atom'] for f in result['flips']]}")
+            if "diagnosis" in result:
+                d = result["diagnosis"]
+                print(f"[DIAG] {case_id}: {d['status']} violated={violated_rules(d)}"
+                      f"{'' if d.get('complete', True) else ' (budget exhausted)'}")
+        print(f"[OK] {case_id} → {args.out / case_id}.*")
 
 if __name__ == "__main__":
     main()
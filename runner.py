@@ -0,0 +1,140 @@
+import sys
+import glob
+import json
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+from collections import Counter
+from config import SOLVE_TIMEOUT, SOLVE_MEMORY_MB
+from core.sandbox import script_executor, run_scripts
+
+# 分片執行器：把語料切成 n 片，每片以獨立的 main.py 行程處理（輸出到 <root>/shard_i/），
+# 最後 merge 回單一 outputs/。多台機器共用檔案系統時，各自以 --only 認領部分分片，
+# 全部跑完後在任一台執行 `runner.py merge`。
+# `runner.py z3` 以常駐的沙箱 worker 批次執行 --llm-codegen 產生的 case_*.z3.py（core/sandbox.py）。
+
+SHARD_DIR = "shard_{i}"
+ARTIFACT_GLOBS = ("case_*.*", "statute_*.parse.json")
+
+def shard_dirs(root):
+    return sorted(Path(root).glob("shard_*"), key=lambda p: int(p.name.split("_")[1]))
+
+def launch(args, passthrough):
+    root = Path(args.root)
+    indices = args.only if args.only is not None else list(range(args.shards))
+    procs = []
+    for i in indices:
+        out = root / SHARD_DIR.format(i=i)
+        out.mkdir(parents=True, exist_ok=True)
+        cmd = [
+            sys.executable, str(Path(__file__).with_name("main.py")),
+            "--shard", f"{i}/{args.shards}", "--shard-by", args.shard_by,
+            "--out", str(out), *passthrough,
+        ]
+        log = (out / "run.log").open("w", encoding="utf-8")
+        procs.append((i, subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT), log))
+        print(f"[runner] shard {i}/{args.shards} → {out} (pid {procs[-1][1].pid})")
+
+    failed = []
+    for i, proc, log in procs:
+        code = proc.wait()
+        log.close()
+        print(f"[runner] shard {i} exited with {code}")
+        if code != 0:
+            failed.append(i)
+    return failed
+
+def merge(root, out):
+    root, out = Path(root), Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    summary = {"shards": {}, "status": Counter()}
+    results = (out / "results.jsonl").open("w", encoding="utf-8")
+    for d in shard_dirs(root):
+        copied = 0
+        for pattern in ARTIFACT_GLOBS:
+            for f in d.glob(pattern):
+                shutil.copy2(f, out / f.name)
+                copied += 1
+        # Parquet store（--store parquet）：part 檔加上分片前綴，避免各分片同名覆寫
+        for part in d.glob("store/*/run=*/*.parquet"):
+            dest = out / part.relative_to(d).parent / f"{d.name}-{part.name}"
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(part, dest)
+        # 狀態依合併進來的結果紀錄統計，不解析 run.log 的輸出格式
+        status = Counter()
+        if (d / "results.jsonl").exists():
+            for line in (d / "results.jsonl").read_text(encoding="utf-8").splitlines(keepends=True):
+                if line.strip():
+                    results.write(line)
+                    status[json.loads(line)["status"]] += 1
+        summary["shards"][d.name] = {"artifacts": copied, "status": dict(status)}
+        summary["status"].update(status)
+    results.close()
+    summary["status"] = dict(summary["status"])
+    (out / "run_summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return summary
+
+def run_z3(args):
+    # glob.glob 同時接受相對與絕對路徑（Path().glob 不接受絕對路徑的 pattern）
+    paths = sorted({Path(p) for pattern in args.scripts for p in glob.glob(pattern)})
+    status = Counter()
+    with script_executor(args.workers, timeout=args.timeout, memory_mb=args.memory) as executor, \
+            open(args.out, "w", encoding="utf-8") as f:
+        for record in run_scripts(paths, executor):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            status[record["status"]] += 1
+            detail = record.get("error", record.get("reason", record.get("penalty", "")))
+            print(f"[z3] {record['script']}: {record['status']} {detail}")
+        print(executor.report())
+    print(f"[runner] {len(paths)} scripts → {args.out}: {dict(status)}")
+    return 0
+
+def parse_only(spec):
+    return [int(x) for x in spec.split(",")]
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # `--` 之後的參數原封不動傳給每個 main.py 行程（如 --workers、--limit）
+    passthrough = []
+    if "--" in argv:
+        cut = argv.index("--")
+        argv, passthrough = argv[:cut], argv[cut + 1:]
+
+    ap = argparse.ArgumentParser(description="分片、多行程（可跨主機）執行 main.py 並合併產出")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="啟動各分片行程，結束後合併")
+    run.add_argument("--shards", type=int, required=True, help="分片總數 n")
+    run.add_argument("--only", type=parse_only, default=None, metavar="i,j,...",
+                     help="只跑指定的分片（多主機時各自認領）")
+    run.add_argument("--shard-by", choices=["index", "statute"], default="statute")
+    run.add_argument("--root", default="outputs/shards", help="各分片產出的共用根目錄")
+    run.add_argument("--out", default="outputs", help="合併後的產出目錄")
+    run.add_argument("--no-merge", action="store_true", help="只跑分片，不合併")
+    mg = sub.add_parser("merge", help="合併各分片產出並寫 run_summary.json")
+    mg.add_argument("--root", default="outputs/shards")
+    mg.add_argument("--out", default="outputs")
+    z3 = sub.add_parser("z3", help="以沙箱 worker 池批次執行產生的 .z3.py，結果寫成 JSONL")
+    z3.add_argument("scripts", nargs="*", default=["outputs/case_*.z3.py"], help="腳本路徑或 glob")
+    z3.add_argument("--workers", type=int, default=None, help="worker 數（預設為 CPU 核心數）")
+    z3.add_argument("--timeout", type=float, default=SOLVE_TIMEOUT,
+                    help="每次 check() 的秒數上限；整個腳本超過兩倍即強制結束")
+    z3.add_argument("--memory", type=int, default=SOLVE_MEMORY_MB, metavar="MB", help="每個 worker 的記憶體上限")
+    z3.add_argument("--out", default="outputs/z3_scripts.jsonl")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "z3":
+        return run_z3(args)
+
+    if args.cmd == "run":
+        failed = launch(args, passthrough)
+        if failed:
+            print(f"[runner] failed shards: {failed}（可直接重跑，manifest 會跳過已完成的階段）")
+        if args.no_merge:
+            return 1 if failed else 0
+    summary = merge(args.root, args.out)
+    print(f"[runner] merged {len(summary['shards'])} shards → {args.out}: {summary['status']}")
+    return 1 if args.cmd == "run" and failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import json
+import itertools
+from agents.stub import STUB_CONSTRAINTS, synthetic_mapping
+
+# 測試共用的案例：stub 後端（LLM_BACKEND=stub）的規則與合成 facts、規則邊界上的 facts 組合，
+# 以及回報過不一致的小例子。每筆為 (名稱, constraints, varspec_facts)
+
+# main.extract_atomic_vars 不含 VAR 引用的 plan_complete：stub 案例中它是自由變數
+STUB_VARS = ["CAR", "NWR", "NWR_prev", "penalty"]
+
+def stub_mapping(case_text):
+    # 與 main.py 送給 CaseMapper 的提示同格式
+    prompt = (f"【法律案例】\n{case_text}\n【需用到的變數】\n{', '.join(STUB_VARS)}\n"
+              "——請輸出 varspecs+facts（JSON 物件）。")
+    return json.loads(synthetic_mapping([{"role": "user", "content": prompt}]))
+
+def _boundary():
+    varspecs = [{"name": "CAR", "type": "Real"}, {"name": "NWR", "type": "Real"},
+                {"name": "NWR_prev", "type": "Real"}, {"name": "plan_complete", "type": "Bool"},
+                {"name": "penalty", "type": "Bool"}]
+    for car, nwr, prev, plan, penalty in itertools.product(
+            (150.0, 200.0, 250.0), (2.0, 3.0), (2.5, 3.5), (False, True), (False, True)):
+        yield {"varspecs": varspecs,
+               "facts": {"CAR": car, "NWR": nwr, "NWR_prev": prev, "plan_complete": plan, "penalty": penalty}}
+
+STUB_CASES = (
+    [(f"stub-{i}", STUB_CONSTRAINTS, stub_mapping(f"案例 {i}：保險業資本適足率與淨值比率")) for i in range(20)]
+    + [(f"boundary-{i}", STUB_CONSTRAINTS, vf) for i, vf in enumerate(_boundary())]
+)
+
+REPRO_CASES = [
+    # 被 VAR 引用的 EQ constraint 是定義，不是結論型變數（i1 仍以 fact 為準）
+    ("referenced-eq",
+     [{"id": "c0", "expr": ["NOT", ["GT", "r0", "i1"]]},
+      {"id": "c1", "expr": ["VAR", "c2"]},
+      {"id": "c2", "expr": ["EQ", "i1", ["PERCENT", 10.0]]},
+      {"id": "pen", "expr": ["EQ", "penalty", ["NOT", ["AND", ["VAR", "c0"], ["VAR", "c1"]]]]}],
+     {"varspecs": [{"name": "r0", "type": "Real"}, {"name": "i1", "type": "Real"},
+                   {"name": "penalty", "type": "Bool"}],
+      "facts": {"r0": 3, "i1": -1}}),
+    # facts 衝突時放寬結論型變數 penalty，而不是被引用的定義裡的 i1
+    ("relax-derived",
+     [{"id": "c0", "expr": ["EQ", "i1", ["ROUND", "i0", 1]]},
+      {"id": "pen", "expr": ["EQ", "penalty", ["NOT", ["VAR", "c0"]]]}],
+     {"varspecs": [{"name": "i0", "type": "Real"}, {"name": "i1", "type": "Real"},
+                   {"name": "penalty", "type": "Bool"}],
+      "facts": {"i0": 0, "i1": -1, "penalty": False}}),
+]
+
+ALL_CASES = STUB_CASES + REPRO_CASES
@@ -0,0 +1,68 @@
+import pytest
+from core.bdd import RuleBDD, atom_text
+from core.dsl import referenced_ids
+from core.solve import solve_case
+from cases import ALL_CASES
+
+def _rule_ids(constraints):
+    referenced = referenced_ids(constraints)
+    return [c["id"] for c in constraints if c["id"] not in referenced]
+
+def _vars(expr, ids):
+    if isinstance(expr, str):
+        return set() if expr in ids else {expr}
+    if isinstance(expr, list) and expr:
+        return set().union(*(_vars(e, ids) for e in expr[1:]))
+    return set()
+
+def _without(facts, names):
+    return {k: v for k, v in facts.items() if k not in names}
+
+@pytest.mark.parametrize("name, constraints, mapping", ALL_CASES, ids=[c[0] for c in ALL_CASES])
+def test_evaluate_matches_solve_case(name, constraints, mapping):
+    rules = RuleBDD(constraints, mapping["varspecs"])
+    assert rules.error is None
+    values = rules.evaluate(mapping["facts"])
+    out = solve_case(constraints, mapping)
+    assert out["status"] == "sat"
+    facts = mapping["facts"]
+    holds = [values[cid] for cid in _rule_ids(constraints)]
+    holds += [None if values[n] is None else values[n] == facts[n] for n in rules.derived if n in facts]
+    # 規則在 facts 下確定不成立時 Z3 必須放寬 facts；確定成立時不可放寬
+    relaxed = "relaxed" in out or out["path"] != "fast"
+    if False in holds:
+        assert relaxed
+    elif None not in holds:
+        assert not relaxed
+    if not relaxed:
+        # 不依賴缺值的 constraint 與 penalty 須與 model 相同
+        for key, value in values.items():
+            if value is not None and key in out["model"]:
+                assert value == out["model"][key], key
+
+@pytest.mark.parametrize("name, constraints, mapping", ALL_CASES, ids=[c[0] for c in ALL_CASES])
+def test_flips_match_solve_case(name, constraints, mapping):
+    # 每個原子：固定其餘 facts、只讓該原子的變數自由，Z3 能否同時讓原子與 penalty 翻轉。
+    # 變數也出現在其他原子中的原子，放開變數會連帶改變其他原子，不在此比較
+    rules = RuleBDD(constraints, mapping["varspecs"])
+    facts = mapping["facts"]
+    target = rules.derived["penalty"]
+    base = rules.evaluate(facts)["penalty"]
+    if base is None:
+        return
+    flips = {f["atom"] for f in rules.flips(facts)}
+    values = rules.values(facts)
+    kept = [c for c in constraints if not (c["expr"][:2] == ["EQ", "penalty"] and c["id"] in _rule_ids(constraints))]
+    atom_vars = [_vars(atom, rules.defs) for atom in rules.atoms]
+    for i, atom in enumerate(rules.atoms):
+        if values[i] is None or any(atom_vars[i] & other for j, other in enumerate(atom_vars) if j != i):
+            continue
+        atom_expr = ["VAR", atom] if isinstance(atom, str) else atom
+        probe = kept + [
+            {"id": "test:atom", "expr": ["NOT", atom_expr] if values[i] else atom_expr},
+            {"id": "test:target", "expr": ["NOT", target] if base else target},
+        ]
+        names = atom_vars[i] | set(rules.derived)
+        out = solve_case(probe, {**mapping, "facts": _without(facts, names)})
+        reachable = out["status"] == "sat" and "relaxed" not in out and out["path"] == "fast"
+        assert (atom_text(atom) in flips) == reachable, atom_text(atom)
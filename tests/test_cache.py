@@ -0,0 +1,134 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import agents.cache
+from agents.cache import LLMCache, CachedAgent, cache_key
+
+MESSAGES = [{"role": "user", "content": "法條"}]
+
+class _Agent:
+    # 假的 AssistantAgent：每次呼叫回傳不同內容，方便分辨回覆是否來自快取
+    def __init__(self, name="StatuteParser", system_message="sys"):
+        self.name = name
+        self.system_message = system_message
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_reply(self, messages=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            return f"reply {self.calls}"
+
+@pytest.fixture
+def cache(tmp_path):
+    c = LLMCache(tmp_path / "llm.sqlite", max_entries=100)
+    yield c
+    c.close()
+
+def test_key_is_stable():
+    # 既有的快取檔在升級後仍須命中：key 的算法改了就要換檔名
+    assert cache_key("StatuteParser", "sys", MESSAGES, "gpt-4o", 0) == \
+        "c16648f0ba34edf363eb9cc4109c62e88af6a29630582d5e7180a2d61d49f7b3"
+    reordered = [{"content": "法條", "role": "user"}]
+    assert cache_key("StatuteParser", "sys", reordered, "gpt-4o", 0) == cache_key("StatuteParser", "sys", MESSAGES, "gpt-4o", 0)
+
+@pytest.mark.parametrize("changed", [
+    ("CaseMapper", "sys", MESSAGES, "gpt-4o", 0),
+    ("StatuteParser", "sys2", MESSAGES, "gpt-4o", 0),
+    ("StatuteParser", "sys", [{"role": "user", "content": "法條 "}], "gpt-4o", 0),
+    ("StatuteParser", "sys", MESSAGES, "gpt-4o-mini", 0),
+    ("StatuteParser", "sys", MESSAGES, "gpt-4o", 0.7),
+])
+def test_key_depends_on_every_input(changed):
+    assert cache_key(*changed) != cache_key("StatuteParser", "sys", MESSAGES, "gpt-4o", 0)
+
+def test_hit_and_miss(cache):
+    agent = _Agent()
+    cached = CachedAgent(agent, cache, {"model": "gpt-4o", "temperature": 0})
+    assert cached.generate_reply(messages=MESSAGES) == "reply 1"
+    assert cached.generate_reply(messages=MESSAGES) == "reply 1"
+    assert cached.generate_reply(messages=[{"role": "user", "content": "其他"}]) == "reply 2"
+    assert agent.calls == 2
+    assert cache.hits["StatuteParser"] == 1 and cache.misses["StatuteParser"] == 2
+    assert "hit=1 miss=2" in cache.report()
+
+def test_bypass_and_none_not_cached(cache):
+    agent = _Agent()
+    cached = CachedAgent(agent, cache, {"model": "gpt-4o"})
+    cached.generate_reply(messages=MESSAGES, sender=None)  # 帶其他參數時不經過快取
+    assert cache.misses["StatuteParser"] == 0
+    agent.generate_reply = lambda messages=None: None
+    assert cached.generate_reply(messages=MESSAGES) is None
+    assert cache.get(cache_key("StatuteParser", "sys", MESSAGES, "gpt-4o", None), "StatuteParser") is None
+
+def test_persists_across_instances(tmp_path):
+    path = tmp_path / "llm.sqlite"
+    first = LLMCache(path)
+    first.put("k", "StatuteParser", {"content": "法條回覆"})
+    first.close()
+    second = LLMCache(path)
+    assert second.get("k", "StatuteParser") == {"content": "法條回覆"}
+    second.close()
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(agents.cache.time, "time", lambda: next(clock))
+    cache = LLMCache(tmp_path / "llm.sqlite", max_entries=2)
+    cache.put("a", "x", "A")
+    cache.put("b", "x", "B")
+    assert cache.get("a", "x") == "A"  # a 變成最近使用
+    cache.put("c", "x", "C")
+    assert cache.get("b", "x") is None
+    assert cache.get("a", "x") == "A" and cache.get("c", "x") == "C"
+    assert cache.evictions == 1
+    cache.close()
+
+def test_two_threads_write_same_key(cache):
+    barrier = threading.Barrier(2)
+
+    def write(value):
+        barrier.wait()
+        for _ in range(50):
+            cache.put("same", "StatuteParser", value)
+            assert cache.get("same", "StatuteParser") in ("A", "B")
+
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(write, ["A", "B"]))
+    assert cache.get("same", "StatuteParser") in ("A", "B")
+    assert "entries=1/" in cache.report()
+
+def test_two_connections_write_same_key(tmp_path):
+    # 分片行程各自開一個連線共用同一個檔
+    path = tmp_path / "llm.sqlite"
+    caches = [LLMCache(path), LLMCache(path)]
+    barrier = threading.Barrier(2)
+
+    def write(i):
+        barrier.wait()
+        for n in range(30):
+            caches[i].put("same", "x", f"{i}-{n}")
+            caches[i].put(f"own-{i}-{n}", "x", n)
+
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(write, [0, 1]))
+    assert caches[0].get("same", "x") in ("0-29", "1-29")
+    assert "entries=61/" in caches[1].report()
+    for c in caches:
+        c.close()
+
+def test_concurrent_agents_share_cache(cache):
+    # --workers 下每個案例有自己的 CachedAgent，共用同一個 LLMCache
+    agent = _Agent()
+    prompts = [[{"role": "user", "content": f"案例 {i % 5}"}] for i in range(40)]
+
+    def ask(messages):
+        return CachedAgent(agent, cache, {"model": "gpt-4o"}).generate_reply(messages=messages)
+
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(ask, prompts))
+    assert all(r.startswith("reply ") for r in replies)
+    assert "entries=5/" in cache.report()
+    # 之後同樣的 prompt 一律命中，回覆與快取中的一致
+    for messages in prompts[:5]:
+        key = cache_key("StatuteParser", "sys", messages, "gpt-4o", None)
+        assert ask(messages) == cache.get(key, "StatuteParser")
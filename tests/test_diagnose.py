@@ -0,0 +1,74 @@
+import time
+from itertools import combinations
+from z3 import Solver, unsat
+from core.dsl import RuleBase
+from core.diagnose import Diagnoser, diagnose, violated_rules
+
+# x = y = 5 與三條規則：x ≥ 10、y ≥ 10、x + y ≤ 12
+CONSTRAINTS = [
+    {"id": "x_ok", "expr": ["GE", "x", 10]},
+    {"id": "y_ok", "expr": ["GE", "y", 10]},
+    {"id": "sum_ok", "expr": ["LE", ["ADD", "x", "y"], 12]},
+]
+MAPPING = {"varspecs": [{"name": "x", "type": "Int"}, {"name": "y", "type": "Int"}], "facts": {"x": 5, "y": 5}}
+
+def _key(item):
+    return (item["kind"], item["id"] if item["kind"] == "rule" else item["name"])
+
+def _brute_force():
+    # 逐一檢查所有子集：MUS 為 unsat 且拿掉任一項即 sat；MCS 為極大可滿足子集的補集
+    rb = RuleBase(CONSTRAINTS, MAPPING["varspecs"])
+    terms = {("rule", cid): term for cid, term in rb.assertions}
+    terms.update({("fact", name): rb.fact(name, value) for name, value in MAPPING["facts"].items()})
+    keys = sorted(terms)
+
+    def is_sat(subset):
+        s = Solver()
+        s.add(*[terms[k] for k in subset])
+        return s.check() != unsat
+
+    subsets = [frozenset(c) for n in range(len(keys) + 1) for c in combinations(keys, n)]
+    sat_sets = [s for s in subsets if is_sat(s)]
+    muses = {s for s in subsets if not is_sat(s) and all(is_sat(s - {k}) for k in s)}
+    maximal = [s for s in sat_sets if not any(s < t for t in sat_sets)]
+    return muses, {frozenset(keys) - s for s in maximal}
+
+def test_enumerate_finds_every_mus_and_mcs():
+    expected_muses, expected_mcses = _brute_force()
+    assert len(expected_muses) == 5
+    d = Diagnoser(RuleBase(CONSTRAINTS, MAPPING["varspecs"]), MAPPING, budget=None)
+    muses, mcses = d.enumerate(limit=100)
+    assert d.complete
+    assert {frozenset(map(_key, m)) for m in muses} == expected_muses
+    assert {frozenset(map(_key, m)) for m in mcses} == expected_mcses
+    assert len(muses) == len(expected_muses) and len(mcses) == len(expected_mcses)
+
+def test_minimal_core_is_a_mus():
+    muses, _ = _brute_force()
+    out = diagnose(CONSTRAINTS, MAPPING, budget=None)
+    assert out["status"] == "unsat" and out["minimal"] and out["complete"]
+    assert frozenset(map(_key, out["core"])) in muses
+    assert set(violated_rules(out)) <= {"x_ok", "y_ok", "sum_ok"}
+
+def test_consistent_facts_are_sat():
+    # 三條規則本身互相衝突（{x_ok, y_ok, sum_ok} 也是一個 MUS），拿掉 y_ok
+    constraints = [CONSTRAINTS[0], CONSTRAINTS[2]]
+    mapping = {**MAPPING, "facts": {"x": 10, "y": 2}}
+    assert diagnose(constraints, mapping, budget=None)["status"] == "sat"
+
+def test_limit_stops_enumeration():
+    d = Diagnoser(RuleBase(CONSTRAINTS, MAPPING["varspecs"]), MAPPING, budget=None)
+    muses, mcses = d.enumerate(limit=1)
+    assert len(muses) == 1 and len(mcses) == 1
+
+def test_budget_exhaustion_is_reported():
+    out = diagnose(CONSTRAINTS, MAPPING, budget=1e-9)
+    assert out["status"] == "unknown" and out["complete"] is False
+
+    # 預算在列舉途中用盡：回傳目前為止的結果，標記不完整
+    d = Diagnoser(RuleBase(CONSTRAINTS, MAPPING["varspecs"]), MAPPING, budget=None)
+    assert d.minimal_core()["status"] == "unsat"
+    d.budget.deadline = time.perf_counter() - 1
+    muses, mcses = d.enumerate(limit=100)
+    assert d.complete is False
+    assert len(muses) < len(_brute_force()[0])
@@ -0,0 +1,82 @@
+import pytest
+from z3 import is_int
+from core.dsl import Env, RuleBase, compile_s_expr
+from core.solve import solve_case
+
+def _value(expr, facts=None, varspecs=(), extra=()):
+    # expr 綁定為定義 v（以另一條規則引用），求解後取 model 中 v 的值
+    constraints = [{"id": "v", "expr": expr}, *extra,
+                   {"id": "uses_v", "expr": ["EQ", ["VAR", "v"], ["VAR", "v"]]}]
+    out = solve_case(constraints, {"varspecs": list(varspecs), "facts": facts or {}})
+    assert out["status"] == "sat", out
+    return out["model"]["v"]
+
+@pytest.mark.parametrize("expr, expected", [
+    (["ROUND", 2.345, 2], 2.35),
+    (["ROUND", 2.5], 3.0),
+    (["ROUND", -2.5], -2.0),     # floor(x + 0.5)
+    (["ROUND", 1234.5, -2], 1200.0),
+    (["FLOOR", 2.7], 2),
+    (["FLOOR", -2.7], -3),
+    (["CEIL", 2.1], 3),
+    (["CEIL", -2.1], -2),
+    (["PERCENT", 0.25], 25.0),
+    (["IFNULL", None, 3], 3),
+    (["IFNULL", 1, 3], 1),
+    (["ABS", -4], 4),
+    (["MIN", 3, 1.5, 2], 1.5),
+    (["MAX", 3, 1.5, 2], 3.0),   # 混用 Int 與 Real 時為 Real
+    (["AVG", 1, 2], 1.5),
+    (["DIV", 7, 2], 3.5),        # Int 運算元先轉成 Real
+    (["SUB", 5], -5),
+    (["SUB", 10, 3, 2], 5),
+    (["POW", 2, 3], 8.0),        # Z3 的 Int ** Int 為 Real
+])
+def test_constant_ops(expr, expected):
+    value = _value(expr)
+    assert value == expected and type(value) is type(expected)
+
+@pytest.mark.parametrize("x, expected", [(10, "high"), (3, "mid"), (-1, "low")])
+def test_case_picks_first_true_branch(x, expected):
+    codes = {"high": 2, "mid": 1, "low": 0}
+    expr = ["CASE", ["GT", "x", 5], codes["high"], ["GT", "x", 0], codes["mid"], codes["low"]]
+    assert _value(expr, {"x": x}, [{"name": "x", "type": "Int"}]) == codes[expected]
+
+def test_case_requires_default():
+    with pytest.raises(ValueError, match="CASE"):
+        RuleBase([{"id": "v", "expr": ["CASE", True, 1]}])
+
+def test_floor_of_int_is_identity():
+    env = Env([{"name": "n", "type": "Int"}])
+    term = compile_s_expr(["FLOOR", "n"], env)
+    assert is_int(term) and term.eq(env["n"])
+
+def test_bare_string_resolves_constraint_definition():
+    # lim 以字串引用，與 ["VAR", "lim"] 一樣綁定到其定義（非自由變數）
+    extra = [{"id": "lim", "expr": 200.0}]
+    assert _value(["GE", "CAR", "lim"], {"CAR": 150.0}, extra=extra) is False
+    assert _value(["GE", "CAR", ["VAR", "lim"]], {"CAR": 250.0}, extra=extra) is True
+
+def test_default_sorts():
+    # 未宣告的變數：字串為 Real、VAR 為 Bool
+    env = Env()
+    assert compile_s_expr("x", env).sort().name() == "Real"
+    assert compile_s_expr(["VAR", "flag"], env).sort().name() == "Bool"
+
+def test_not_rejects_numeric_operand():
+    with pytest.raises(ValueError, match="NOT"):
+        RuleBase([{"id": "v", "expr": ["NOT", "x"]}])
+
+def test_cyclic_reference_rejected():
+    with pytest.raises(ValueError, match="Cyclic"):
+        RuleBase([{"id": "a", "expr": ["VAR", "b"]}, {"id": "b", "expr": ["NOT", ["VAR", "a"]]}])
+
+def test_shared_subexpression_compiled_once():
+    # 結構相同的子式（不同 list 物件、不同 constraint）共用同一個 Z3 term
+    env = Env()
+    term = compile_s_expr(["ADD", ["MUL", "x", 2], ["MUL", "x", 2]], env)
+    a, b = term.children()
+    assert a.get_id() == b.get_id()
+    n = len(env.dag.terms)
+    compile_s_expr(["GE", ["MUL", "x", 2], 1], env)
+    assert len(env.dag.terms) == n + 1  # 只多了 GE 節點
@@ -0,0 +1,85 @@
+import os
+import time
+import pytest
+from z3 import Z3Exception
+from core.executor import ProcessExecutor, is_memout, resource
+from core.solve import _failed
+
+# 工作函式須可 pickle：定義在模組層級，spawn 出的 worker 以模組名稱匯入
+
+def _pid():
+    return {"status": "ok", "pid": os.getpid()}
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return {"status": "ok"}
+
+def _exit():
+    os._exit(3)
+
+def _allocate():
+    return {"status": "ok", "size": len(bytearray(4 * 1024 ** 3))}
+
+def _z3_out_of_memory():
+    raise Z3Exception(b"out of memory")
+
+def _reports_memout():
+    # 例如 core/solve 在 worker 內攔下 Z3 的 out of memory
+    return _failed(Z3Exception(b"out of memory"))
+
+def _fails():
+    raise ValueError("bad rule")
+
+@pytest.fixture
+def executor():
+    ex = ProcessExecutor(1, memory_mb=512)
+    yield ex
+    ex.close()
+
+def _replaced(executor, fn, *args, status, **kwargs):
+    # 失敗的工作回傳 status，且之後的工作換到新的 worker
+    before = executor.call(_pid)["pid"]
+    out = executor.call(fn, *args, **kwargs)
+    assert out["status"] == status, out
+    assert executor.stats[status] == 1
+    after = executor.call(_pid)
+    assert after["status"] == "ok" and after["pid"] != before
+    return out
+
+def test_timeout_kills_worker(executor):
+    out = _replaced(executor, _sleep, 30, status="timeout", timeout=0.5)
+    assert out["elapsed"] < 10
+
+def test_crash_replaces_worker(executor):
+    out = _replaced(executor, _exit, status="crash")
+    assert "code 3" in out["error"]
+
+@pytest.mark.skipif(resource is None, reason="沒有 setrlimit 的平台不限制記憶體")
+def test_memory_error_is_memout(executor):
+    _replaced(executor, _allocate, status="memout")
+
+def test_z3_out_of_memory_is_memout(executor):
+    _replaced(executor, _z3_out_of_memory, status="memout")
+
+def test_reported_memout_recycles_worker(executor):
+    out = _replaced(executor, _reports_memout, status="memout")
+    assert "out of memory" in out["error"]
+
+def test_error_keeps_worker(executor):
+    before = executor.call(_pid)["pid"]
+    out = executor.call(_fails)
+    assert out["status"] == "error" and "bad rule" in out["error"]
+    assert executor.call(_pid)["pid"] == before
+
+def test_max_tasks_recycles_worker():
+    with ProcessExecutor(1, max_tasks=2) as ex:
+        pids = [ex.call(_pid)["pid"] for _ in range(4)]
+        assert pids[0] == pids[1] != pids[2] == pids[3]
+        assert ex.stats["recycled"] == 2
+
+def test_is_memout():
+    assert is_memout(MemoryError())
+    assert is_memout(Z3Exception(b"out of memory"))
+    assert is_memout(Z3Exception("max. memory exceeded"))
+    assert not is_memout(Z3Exception("sort mismatch"))
+    assert _failed(Z3Exception("sort mismatch"))["status"] == "error"
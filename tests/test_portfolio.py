@@ -0,0 +1,87 @@
+import threading
+import time
+from functools import partial
+import pytest
+from core.dsl import RuleBase
+from core.portfolio import PORTFOLIOS, STRATEGIES, Portfolio, Race, classify
+from core.results import case_record
+from core.solve import Z3_LOCK, _attempt, solve_case
+from cases import ALL_CASES
+
+class _Ctx:
+    def __init__(self):
+        self.interrupts = 0
+        self.stop = threading.Event()
+
+    def interrupt(self):
+        self.interrupts += 1
+        self.stop.set()
+
+class _Rules:
+    def __init__(self):
+        self.ctx = _Ctx()
+
+def _race(**behaviour):
+    # 策略名稱 → 行為；attempt 依 make_solver 認出是哪個策略
+    jobs = [(name, _Rules()) for name in behaviour]
+    makers = {id(STRATEGIES[name][0]): name for name in behaviour}
+
+    def attempt(rules, make, engine):
+        return behaviour[makers[id(make)]](rules.ctx)
+    return Race(jobs, "LRA"), jobs, attempt
+
+def _answer(status, delay=0.0):
+    def run(ctx):
+        time.sleep(delay)
+        return {"status": status}
+    return run
+
+def _until_interrupted(ctx):
+    # 模擬卡在 check() 裡的策略：直到 Context.interrupt() 才回 unknown
+    ctx.stop.wait(10)
+    return {"status": "unknown", "reason": "canceled"}
+
+def test_first_finished_wins_and_losers_are_interrupted():
+    race, jobs, attempt = _race(default=_answer("sat", 0.05), lra=_until_interrupted,
+                                **{"simplify-smt": _until_interrupted})
+    t0 = time.perf_counter()
+    out = race.run(attempt)
+    assert time.perf_counter() - t0 < 5
+    assert out["status"] == "sat"
+    assert out["portfolio"]["winner"] == "default"
+    assert out["portfolio"]["strategies"] == ["default", "lra", "simplify-smt"]
+    for name, rules in jobs:
+        if name != "default":
+            assert rules.ctx.interrupts >= 1
+
+def test_faster_strategy_beats_listed_order():
+    race, _, attempt = _race(default=_answer("sat", 0.5), lra=_answer("unsat", 0.0))
+    out = race.run(attempt)
+    assert out["portfolio"]["winner"] == "lra" and out["status"] == "unsat"
+
+def test_unknown_and_errors_do_not_win():
+    def broken(ctx):
+        raise RuntimeError("boom")
+    race, _, attempt = _race(default=broken, lra=_answer("unknown"), lia=_answer("sat", 0.2))
+    out = race.run(attempt)
+    assert out["portfolio"]["winner"] == "lia" and out["status"] == "sat"
+
+def test_no_winner_returns_first_finished():
+    race, _, attempt = _race(default=_answer("unknown", 0.2), lra=_answer("unknown"))
+    out = race.run(attempt)
+    assert out["portfolio"]["winner"] is None and out["status"] == "unknown"
+
+@pytest.mark.parametrize("name, constraints, mapping", ALL_CASES, ids=[c[0] for c in ALL_CASES])
+def test_every_strategy_agrees_with_plain_solve(name, constraints, mapping):
+    expected = case_record(name, solve_case(constraints, mapping), constraints, mapping)
+    with Z3_LOCK:
+        rb = RuleBase(constraints, mapping["varspecs"])
+        strategies = PORTFOLIOS[classify(rb)]
+        races = [Portfolio(rb, [s]).prepare(mapping) for s in strategies]
+    for strategy, race in zip(strategies, races):
+        raw = race.run(partial(_attempt, varspec_facts=mapping))
+        assert raw["portfolio"]["winner"] == strategy
+        out = case_record(name, raw, constraints, mapping)
+        assert out["status"] == expected["status"], strategy
+        # 放寬的 fact 個數（Optimize 的最佳值）相同；放寬哪一個在平手時不固定
+        assert len(out.get("relaxed", [])) == len(expected.get("relaxed", [])), strategy
@@ -0,0 +1,88 @@
+import pytest
+from core.results import py_value
+from core.sandbox import script_executor, run_scripts
+
+@pytest.fixture(scope="module")
+def executor():
+    ex = script_executor(1)
+    yield ex
+    ex.close()
+
+def _run(executor, tmp_path, code):
+    path = tmp_path / "case.z3.py"
+    path.write_text(code, encoding="utf-8")
+    return next(run_scripts([path], executor))
+
+@pytest.mark.parametrize("code, error", [
+    ('open("x.txt", "w").write("data")', "PermissionError: open() is not allowed"),
+    ('__import__("os").system("true")', "ImportError: import of 'os' is not allowed"),
+    ("import subprocess", "ImportError: import of 'subprocess' is not allowed"),
+    ("from os import path", "ImportError: import of 'os' is not allowed"),
+    ('eval("1 + 1")', "PermissionError: eval() is not allowed"),
+])
+def test_blocked(executor, tmp_path, code, error):
+    out = _run(executor, tmp_path, code)
+    assert out["status"] == "error"
+    assert out["error"].startswith(error)
+
+def test_file_write_fails_even_through_an_escape(executor, tmp_path):
+    # 受限的 builtins 可以繞過（json 模組裡就有 codecs.open）；RLIMIT_FSIZE = 0 讓實際寫入失敗
+    out = _run(executor, tmp_path, 'import json\nf = json.codecs.open("x.txt", "w")\nf.write("data" * 4096)\nf.close()')
+    assert out["status"] == "error"
+    assert "File too large" in out["error"]
+    assert not (tmp_path / "x.txt").exists()
+
+def test_no_check_and_output(executor, tmp_path):
+    out = _run(executor, tmp_path, 'print("hello")')
+    assert out["status"] == "no-check" and out["stdout"] == "hello\n"
+
+# --llm-codegen 的 solver agent 產生的腳本形式：Optimize + soft facts + assert_and_track，自己印結果
+SAT_SCRIPT = """from z3 import *
+CAR = Real('CAR')
+penalty = Bool('penalty')
+s = Optimize()
+s.add_soft(CAR == 150.0, 2)
+s.add_soft(penalty == False)
+s.assert_and_track(penalty == Not(CAR >= 200), 'meta:penalty')
+result = s.check()
+print('Result:', result)
+if result == sat:
+    m = s.model()
+    for d in m.decls():
+        print(f"{d.name()} =", m[d])
+"""
+UNSAT_SCRIPT = """from z3 import *
+x = Int('x')
+s = Solver()
+s.set(unsat_core=True)
+print(s.check(x > 0))
+s.assert_and_track(x >= 10, 'a')
+s.assert_and_track(x <= 5, 'b')
+print(s.check(), s.unsat_core())
+"""
+
+def _direct(code):
+    # 同一段程式以真正的 z3 在本行程執行，取最後一個 Solver / Optimize 的結果
+    scope = {}
+    exec(compile(code, "<direct>", "exec"), scope)
+    s = scope["s"]
+    return s, str(s.check())
+
+def test_generated_script_recorded(executor, tmp_path):
+    out = _run(executor, tmp_path, SAT_SCRIPT)
+    s, status = _direct(SAT_SCRIPT)
+    assert out["status"] == status == "sat" and out["checks"] == 1
+    m = s.model()
+    assert out["model"] == {d.name(): py_value(m[d]) for d in m.decls()}
+    assert out["model"]["CAR"] == 150.0 and out["penalty"] is True
+    assert "Result: sat" in out["stdout"]
+
+def test_last_check_wins(executor, tmp_path):
+    out = _run(executor, tmp_path, UNSAT_SCRIPT)
+    _, status = _direct(UNSAT_SCRIPT)
+    assert out["status"] == status == "unsat" and out["checks"] == 2
+    assert sorted(out["unsat_core"]) == ["a", "b"]
+
+def test_z3_out_of_memory_is_memout(executor, tmp_path):
+    out = _run(executor, tmp_path, 'from z3 import Z3Exception\nraise Z3Exception(b"out of memory")')
+    assert out["status"] == "memout"
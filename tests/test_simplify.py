@@ -0,0 +1,105 @@
+import random
+import pytest
+from core.results import case_record
+from core.simplify import simplify, prune_facts
+from core.solve import solve_case
+from cases import ALL_CASES
+
+# stub 合成的 facts 沒有 plan_complete，其 rules 取決於 Z3 替自由變數選的值，不在此比較
+DETERMINED = [case for case in ALL_CASES if not case[0].startswith("stub-")]
+
+@pytest.mark.parametrize("name, constraints, mapping", DETERMINED, ids=[c[0] for c in DETERMINED])
+def test_rules_same_with_and_without_simplify(name, constraints, mapping):
+    raw = case_record(name, solve_case(constraints, mapping), constraints, mapping)
+    simplified, report = simplify(constraints)
+    pruned = prune_facts(simplified, mapping)
+    out = case_record(name, solve_case(simplified, pruned), constraints, pruned, report["inlined"])
+    if raw["path"] != "fast":
+        pytest.skip("Optimize 放寬哪個 fact 在平手時不固定")
+    assert out["status"] == raw["status"]
+    assert out["penalty"] == raw["penalty"]
+    assert out["rules"] == raw["rules"]
+    assert out.get("violated") == raw.get("violated")
+
+def test_inlined_rule_reported_as_violated():
+    # plan_complete_ok 只是 ["VAR", "plan_complete"] 的轉接，化簡時被內聯
+    constraints = next(c for name, c, _ in ALL_CASES if name.startswith("boundary"))
+    mapping = {"varspecs": [{"name": "plan_complete", "type": "Bool"}, {"name": "penalty", "type": "Bool"}],
+               "facts": {"CAR": 150.0, "NWR": 2.0, "NWR_prev": 2.5, "plan_complete": False, "penalty": False}}
+    simplified, report = simplify(constraints)
+    assert "insurance:plan_complete_ok" not in {c["id"] for c in simplified}
+    out = case_record("case", solve_case(simplified, prune_facts(simplified, mapping)), constraints, mapping,
+                      report["inlined"])
+    assert "insurance:plan_complete_ok" in out["violated"]
+
+def test_bare_string_constant_reference():
+    # lim 以字串（非 VAR）引用；刪掉它會讓 lim 變成自由的 Real
+    constraints = [{"id": "lim", "expr": 200.0}, {"id": "car_ok", "expr": ["GE", "CAR", "lim"]}]
+    mapping = {"varspecs": [{"name": "CAR", "type": "Real"}], "facts": {"CAR": 150.0}}
+    simplified, _ = simplify(constraints)
+    assert solve_case(simplified, mapping)["relaxed"] == solve_case(constraints, mapping)["relaxed"] == ["CAR"]
+
+### === 隨機差分：化簡前後的求解結果相同 ===
+# 隨機產生互相引用（VAR 或直接寫 id）的定義與規則，所有變數都給 fact：
+# 不需放寬時 model 完全確定，可逐一比較定義的值
+
+def _random_case(rng):
+    constraints, nums, bools = [], [], []
+
+    def num():
+        r = rng.random()
+        if nums and r < 0.4:
+            ref = rng.choice(nums)
+            return rng.choice([ref, ["VAR", ref]])
+        if r < 0.7:
+            return rng.choice(["CAR", "NWR"])
+        return rng.choice([100, 150.0, 200.0, 2.5])
+
+    def cond(depth=0):
+        r = rng.random()
+        if bools and r < 0.3:
+            return ["VAR", rng.choice(bools)]
+        if depth < 2 and r < 0.5:
+            return [rng.choice(["AND", "OR"]), cond(depth + 1), cond(depth + 1)]
+        if depth < 2 and r < 0.6:
+            return ["NOT", cond(depth + 1)]
+        if r < 0.65:
+            return ["VAR", "ok"]
+        return [rng.choice(["GE", "LE", "GT", "EQ"]), num(), num()]
+
+    for i in range(rng.randint(2, 6)):
+        cid = f"d{i}"
+        if rng.random() < 0.3:
+            expr = rng.choice([100, 150.0, 200.0, ["ADD", num(), 50], ["MUL", num(), 0.5]])
+            nums.append(cid)
+        else:
+            expr = cond()
+            bools.append(cid)
+        constraints.append({"id": cid, "expr": expr})
+    constraints.append({"id": "penalty_rule", "expr": ["EQ", "penalty", ["NOT", cond()]]})
+    if rng.random() < 0.5:
+        constraints.append({"id": "extra_rule", "expr": cond()})
+    facts = {"CAR": rng.choice([100.0, 150.0, 200.0, 250.0]), "NWR": rng.choice([2.5, 100.0, 200.0]),
+             "ok": rng.random() < 0.5}
+    if rng.random() < 0.5:
+        facts["penalty"] = rng.random() < 0.5
+    varspecs = [{"name": "CAR", "type": "Real"}, {"name": "NWR", "type": "Real"},
+                {"name": "ok", "type": "Bool"}, {"name": "penalty", "type": "Bool"}]
+    return constraints, {"varspecs": varspecs, "facts": facts}
+
+@pytest.mark.parametrize("seed", range(300))
+def test_simplify_differential(seed):
+    constraints, mapping = _random_case(random.Random(seed))
+    raw = case_record("case", solve_case(constraints, mapping), constraints, mapping)
+    simplified, report = simplify(constraints)
+    out = case_record("case", solve_case(simplified, prune_facts(simplified, mapping)), constraints, mapping,
+                      report["inlined"])
+    assert out["status"] == raw["status"]
+    if raw["status"] != "sat":
+        return
+    # 放寬哪個 fact 在多個都可行時不固定，代價（放寬的個數）須相同
+    assert len(out["relaxed"]) == len(raw["relaxed"])
+    if not raw["relaxed"]:
+        assert out["penalty"] == raw["penalty"]
+        for cid, value in out["rules"].items():
+            assert raw["rules"][cid] == value, cid
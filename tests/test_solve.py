@@ -0,0 +1,21 @@
+import pytest
+from core.solve import BatchSolver, solve_case
+
+# 2·x = 3：x 宣告為 Int 時無解、為 Real 時有解；同一組規則的案例可能宣告不同型別
+CONSTRAINTS = [{"id": "half_ok", "expr": ["EQ", ["MUL", "x", 2], 3]}]
+INT = {"varspecs": [{"name": "x", "type": "Int"}], "facts": {}}
+REAL = {"varspecs": [{"name": "x", "type": "Real"}], "facts": {}}
+
+@pytest.mark.parametrize("vectorize", [True, False])
+@pytest.mark.parametrize("order", [(INT, REAL), (REAL, INT)], ids=["int-first", "real-first"])
+def test_batch_independent_of_case_order(order, vectorize):
+    batch = BatchSolver(CONSTRAINTS, vectorize=vectorize)
+    for mapping in order:
+        assert batch.solve(mapping)["status"] == solve_case(CONSTRAINTS, mapping)["status"]
+    assert len(batch.compiled) == 2
+
+def test_batch_shares_rules_per_typing():
+    batch = BatchSolver(CONSTRAINTS, vectorize=False)
+    for mapping in (REAL, INT, REAL, INT):
+        batch.solve(mapping)
+    assert len(batch.compiled) == 2
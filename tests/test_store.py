@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+from core.store import ParquetStore, StoreReader
+
+def test_null_weight_defaults_to_one(tmp_path):
+    # ConstraintSpec.weight 為 Optional[int]：LLM 給 "weight": null 也能通過驗證
+    store = ParquetStore(tmp_path, run_id="r1")
+    constraints = [{"id": "a", "expr": ["GE", "CAR", 200], "weight": None},
+                   {"id": "b", "expr": ["VAR", "ok"]},
+                   {"id": "c", "expr": ["VAR", "ok"], "weight": 0}]
+    store.add_case("case_0", constraints, {"varspecs": [], "facts": {"CAR": 150.0}})
+    store.close()
+    rows = StoreReader(tmp_path).table("constraints", columns=["id", "weight"]).to_pylist()
+    assert {r["id"]: r["weight"] for r in rows} == {"a": 1.0, "b": 1.0, "c": 0.0}
@@ -0,0 +1,14 @@
+import pytest
+from core.validate import validate
+from agents.stub import STUB_CONSTRAINTS
+from cases import stub_mapping
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_non_finite_fact_rejected(value):
+    mapping = stub_mapping("案例")
+    mapping["facts"]["CAR"] = value
+    errors = validate(STUB_CONSTRAINTS, mapping)
+    assert [e["where"] for e in errors] == ["facts CAR"]
+
+def test_stub_mapping_passes():
+    assert validate(STUB_CONSTRAINTS, stub_mapping("案例")) == []